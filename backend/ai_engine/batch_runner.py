@@ -2,20 +2,32 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import json
 import pathlib
 import re
 import time
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-import pandas as pd
-
-from ai_engine.planner       import generate_plan
+from ai_engine.planner       import generate_plan, generate_plans_async
 from ai_engine.pdf_generator import create_pdf          # or create_detailed_pdf
+from ai_engine.openai_client import PLAN_MODES, dish_selection_cache_stats
+from ai_engine.response_cache import get_plan_cache, set_plan_cache_enabled
+from ai_engine.token_accounting import token_usage_stats
+from ai_engine.streaming import set_streaming_enabled, streaming_enabled, streaming_stats
+from ai_engine.llm_backends import BACKENDS, set_llm_backend
+from ai_engine.metrics import metrics_summary
+from ai_engine.log import correlation_scope
+from ai_engine.run_journal import RunJournal
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # ╭─ SETTINGS ────────────────────────────────────────────────────────────╮
-MAX_CALLS_PER_MIN = 3                                   # OpenAI rate-limit
-SAFETY_DELAY      = 60 / MAX_CALLS_PER_MIN + 2          # sec between calls
+# OpenAI limits: OPENAI_TIER (or OPENAI_RPM / OPENAI_TPM) env vars (see ai_engine.rate_limiter)
 OUT_DIR           = pathlib.Path("generated_plans")     # PDFs output folder
+JOURNAL_FILE      = "run_journal.sqlite3"              # in OUT_DIR; see --resume
 # ╰─────────────────────────────────────────────────────────────────────────╯
 
 
@@ -33,6 +45,8 @@ def int_str(val, default: int | None = None) -> str:
     Convert float / int / str → clean integer string.
     Returns "" if conversion fails and default is None, else str(default).
     """
+    import pandas as pd      # rows come from a DataFrame, so already loaded
+
     if pd.isna(val):
         return str(default) if default is not None else ""
     try:
@@ -125,9 +139,104 @@ def display_menu(df: pd.DataFrame):
     print("\nChoose indices (e.g. 0 4 7),  'all', or ENTER to abort.\n")
 
 
+# ── generation loops ──────────────────────────────────────────────────────
+def _report(name_raw: str, status: str, elapsed: float):
+    print(f"{name_raw:<30} … {status:<25} {elapsed:>6.1f}s")
+    return name_raw, status, elapsed
+
+
+def _finish(journal: RunJournal, idx, name_raw: str, pdf_file, err, elapsed: float, ok: str = "OK"):
+    """Journal the row's outcome and print its progress line."""
+    if err is None:
+        journal.done(idx, pdf_file, elapsed)
+        return _report(name_raw, ok, elapsed)
+    journal.failed(idx, str(err), elapsed)
+    return _report(name_raw, f"FAILED ({err})", elapsed)
+
+
+def _render_planned(replay: dict, journal: RunJournal) -> dict:
+    """PDFs for rows whose plan the journal already holds – no API call."""
+    results = {}
+    for idx, (plan, name_raw, pdf_file) in replay.items():
+        t0, err = time.perf_counter(), None
+        try:
+            create_pdf(plan, str(pdf_file))
+        except Exception as e:
+            err = e
+        results[idx] = _finish(journal, idx, name_raw, pdf_file, err,
+                               time.perf_counter() - t0, ok="OK (plan from journal)")
+    return results
+
+
+def _run_sequential(jobs: dict, mode: str, journal: RunJournal) -> dict:
+    """One user at a time (API pacing is done by the shared rate limiter)."""
+    results = {}
+
+    for idx, (payload, name_raw, pdf_file) in jobs.items():
+        t0  = datetime.now()
+        err = None
+        journal.started(idx, name_raw)
+        try:
+            with correlation_scope(str(idx)):        # same ID as the concurrent path
+                plan = generate_plan(payload, mode=mode)
+                if plan is None:
+                    raise RuntimeError("No plan returned")
+                journal.planned(idx, plan)
+                create_pdf(plan, str(pdf_file))      # or create_detailed_pdf
+        except Exception as e:
+            err = e
+        elapsed = (datetime.now() - t0).total_seconds()
+
+        results[idx] = _finish(journal, idx, name_raw, pdf_file, err, elapsed)
+    return results
+
+
+async def _run_concurrent(jobs: dict, mode: str, concurrency: int, journal: RunJournal) -> dict:
+    """Submit every user at once; PDFs are written as plans complete. A row
+    is journalled as running only once it gets a slot."""
+    done = {}
+    users = [(idx, payload) for idx, (payload, _, _) in jobs.items()]
+
+    def on_start(idx):
+        journal.started(idx, jobs[idx][1])
+
+    async for idx, plan, err, elapsed in generate_plans_async(users, concurrency, mode, on_start):
+        _, name_raw, pdf_file = jobs[idx]
+        try:
+            if err is not None:
+                raise err
+            if plan is None:
+                raise RuntimeError("No plan returned")
+            journal.planned(idx, plan)
+            await asyncio.to_thread(create_pdf, plan, str(pdf_file))
+        except Exception as e:
+            err = e
+        done[idx] = _finish(journal, idx, name_raw, pdf_file, err, elapsed)
+    return done
+
+
 # ── main batch loop ───────────────────────────────────────────────────────
-def main(csv_path: pathlib.Path, rows: list[int] | None, force_all: bool):
+def main(csv_path: pathlib.Path, rows: list[int] | None, force_all: bool,
+         mode: str = "llm", concurrency: int = 1, use_cache: bool = True,
+         stream: bool = False, backend: str | None = None, resume: bool = False,
+         journal_path: pathlib.Path | None = None):
+    """
+    Generate a plan + PDF per selected row. Every row's progress is written
+    to a run journal (OUT_DIR/JOURNAL_FILE, keyed by the CSV's hash); with
+    resume=True rows that finished in an earlier run of the same CSV are
+    skipped, rows with a stored plan only get their PDF rendered, and the
+    rest (failed or interrupted) are generated again. Without rows / --all,
+    a resume picks up the rows of the earlier run.
+    """
+    import pandas as pd      # not at import: keeps --help and PDF-only use light
+
     OUT_DIR.mkdir(exist_ok=True)
+    if backend:
+        set_llm_backend(backend)
+    if not use_cache:
+        set_plan_cache_enabled(False)
+    if stream:
+        set_streaming_enabled(True)
     df = pd.read_csv(csv_path)
     df = df.rename(columns=COLUMN_MAP)     # ← ensure ‘Name’ etc. exist
 
@@ -136,6 +245,14 @@ def main(csv_path: pathlib.Path, rows: list[int] | None, force_all: bool):
     if yes_col in df.columns:
         df = df[df[yes_col].fillna("").str.strip().str.lower() == "yes"]
 
+    journal = RunJournal(journal_path or OUT_DIR / JOURNAL_FILE, csv_path)
+    known = journal.begin()
+    previous = journal.rows() if resume else {}
+    if resume and not known:
+        print("No journal for this CSV (new or changed file) – starting from scratch.")
+    if previous and not force_all and rows is None:
+        rows = [idx for idx in df.index if str(idx) in previous]
+
     # interactive row selection when run via CLI
     if not force_all and rows is None:
         display_menu(df)
@@ -152,39 +269,57 @@ def main(csv_path: pathlib.Path, rows: list[int] | None, force_all: bool):
         return
 
     print("\nGenerating …\n")
-    last_call = 0.0
-    results   = []
-
+    jobs, replay, done = {}, {}, {}
     for idx in rows:
-        row       = df.loc[idx]
-        payload   = row_to_user(row)
-        name_raw  = payload["profile"]["Name of the employee"] or f"user_{idx}"
+        payload   = row_to_user(df.loc[idx])
+        name_raw  = payload.get("Name of the employee") or f"user_{idx}"
         pdf_file  = OUT_DIR / f"{sanitise(name_raw)}.pdf"
-
-        # simple rate-limit guard
-        wait = SAFETY_DELAY - (time.time() - last_call)
-        if wait > 0:
-            time.sleep(wait)
-
-        t0     = datetime.now()
-        status = "OK"
-        try:
-            plan = generate_plan(payload)
-            if plan is None:
-                raise RuntimeError("No plan returned")
-            create_pdf(plan, str(pdf_file))          # or create_detailed_pdf
-        except Exception as err:
-            status = f"FAILED ({err})"
-        elapsed = (datetime.now() - t0).total_seconds()
-
-        print(f"{name_raw:<30} … {status:<25} {elapsed:>6.1f}s")
-        results.append((name_raw, status, elapsed))
-        last_call = time.time()
+        state     = previous.get(str(idx))
+        if state and state.completed():
+            done[idx] = _report(name_raw, "SKIPPED (done earlier)", 0.0)
+        elif state and state.status == "planned" and state.plan:
+            replay[idx] = (state.plan, name_raw, pdf_file)
+        else:
+            jobs[idx] = (payload, name_raw, pdf_file)
+    journal.queue({idx: name_raw for idx, (_, name_raw, _) in jobs.items()})
+
+    done.update(_render_planned(replay, journal))
+    if concurrency > 1:
+        done.update(asyncio.run(_run_concurrent(jobs, mode, concurrency, journal)))
+    else:
+        done.update(_run_sequential(jobs, mode, journal))
+    results = [done[idx] for idx in rows]         # summary in input order
 
     # summary
     print("\nSummary\n────────")
     for n, s, t in results:
         print(f"{n:<30} {s:<25} {t:>6.1f}s")
+    sel = dish_selection_cache_stats()
+    print(f"\nDish-selection cache: {sel['hits']} hits / {sel['misses']} misses "
+          f"({sel['hit_rate']:.0%} of filtering skipped)")
+    plans = get_plan_cache().stats()
+    if plans["enabled"]:
+        print(f"Plan response cache: {plans['hits']} hits / {plans['misses']} misses "
+              f"({plans['path']})")
+    usage = token_usage_stats()
+    if usage["calls"]:
+        print(f"Tokens: {usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion "
+              f"over {usage['calls']} calls (actual/estimated prompt: {usage['estimate_ratio']})")
+    if streaming_enabled():
+        st = streaming_stats()
+        print(f"Streams: {st['streams']} ({st['aborted']} aborted early), time to first valid day "
+              f"mean {st['time_to_first_valid_day_s']['mean']}s / median {st['time_to_first_valid_day_s']['median']}s")
+    metrics = metrics_summary()
+    print("\nStages (mean / p95 ms, count):")
+    for stage, st in metrics["stages"].items():
+        print(f"  {stage:<16} {st['mean_ms']:>10.1f} {st['p95_ms']:>10.1f} {st['count']:>6}")
+    metrics_file = OUT_DIR / "run_metrics.json"
+    metrics_file.write_text(json.dumps(metrics, indent=2))
+    print(f"Metrics: {json.dumps(metrics['counters'])} (full summary → {metrics_file})")
+    counts = journal.counts()
+    journal.close()
+    print(f"Journal: {counts['done']} done, {counts['failed']} failed, "
+          f"{counts['pending'] + counts['running'] + counts['planned']} unfinished ({journal.path}; rerun with --resume)")
     print(f"\nPDFs saved to → {OUT_DIR.resolve()}")
 
 
@@ -195,5 +330,25 @@ if __name__ == "__main__":
     argp.add_argument("--all",  action="store_true", help="process everyone")
     argp.add_argument("--rows", nargs="*", type=int,
                       help="specific row indices (0-based) to process")
+    argp.add_argument("--mode", choices=PLAN_MODES, default="llm",
+                      help="llm: model builds the plan; local: no API call; "
+                           "hybrid: local plan + LLM stylistic pass; "
+                           "ids: model returns dish ids + multipliers only; "
+                           "parallel: one concurrent request per day")
+    argp.add_argument("--concurrency", type=int, default=1,
+                      help="users generated in parallel (1 = sequential)")
+    argp.add_argument("--no-cache", action="store_true",
+                      help="ignore the on-disk plan cache (always call the API)")
+    argp.add_argument("--stream", action="store_true",
+                      help="stream completions and abort early on unusable days")
+    argp.add_argument("--backend", choices=BACKENDS,
+                      help="LLM backend (default: LLM_BACKEND env or openai); "
+                           "fake: offline stub, see ai_engine.llm_backends")
+    argp.add_argument("--resume", action="store_true",
+                      help="continue an earlier run of this CSV: skip finished users, "
+                           "retry failed / interrupted ones")
+    argp.add_argument("--journal", type=pathlib.Path,
+                      help=f"run journal file (default: {OUT_DIR / JOURNAL_FILE})")
     a = argp.parse_args()
-    main(pathlib.Path(a.csv), a.rows, a.all)
+    main(pathlib.Path(a.csv), a.rows, a.all, a.mode, a.concurrency, not a.no_cache, a.stream,
+         a.backend, a.resume, a.journal)
@@ -0,0 +1,323 @@
+# ─── ai_engine/dish_index.py ──────────────────────────────────────────────
+"""
+Columnar, pre-normalised view of the cuisine catalog.
+
+A DishIndex is built once per catalog load. It holds every column the
+filters look at in an already-lowercased / pre-parsed form, so that per
+request filtering is boolean numpy arithmetic only – no .str.lower(),
+.str.contains() or .apply() over the catalog on each call.
+
+pandas is only imported when an index is built (there is a DataFrame by
+then anyway); the record/JSON helpers work without it.
+"""
+from __future__ import annotations
+
+import json
+import re
+import weakref
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+NORTH_REGEX = r"north|punjab|delhi|haryana|uttar ?pradesh|western|maharashtra|gujarat|goa|rajasthaneastern|west ?bengal|odisha|assam|bihar|jharkhand|pan-india|universal"
+SOUTH_REGEX = r"south|tamil ?nadu|karnataka|kerala|andhra|telangana|pan-india|universal"
+PAN_INDIA_REGEX = r"pan-india|universal"
+
+# one bit per standard meal slot; a dish can carry several ("Breakfast/Snack")
+MEAL_BITS = {"breakfast": 1, "lunch": 2, "dinner": 4, "snack": 8}
+
+TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def word_forms(word: str) -> set[str]:
+    """word plus its simple plural / singular spellings (pea ↔ peas, leaf ↔ leaves)."""
+    forms = {word, word + "s", word + "es"}
+    if word.endswith("y"):
+        forms.add(word[:-1] + "ies")
+    if word.endswith("ies"):
+        forms.add(word[:-3] + "y")
+    if word.endswith("es"):
+        forms.add(word[:-2])
+    if word.endswith("f"):
+        forms.add(word[:-1] + "ves")
+    if word.endswith("ves"):
+        forms.add(word[:-3] + "f")
+    if word.endswith("s"):
+        forms.add(word[:-1])
+    return forms
+
+COMPACT_SEPARATORS = (",", ":")
+
+# tabular prompt encoding: one header per meal block, one row per dish
+TABLE_DELIMITER = "|"
+TABLE_FIELDS = ("name", "cal", "p", "c", "f", "quantity")
+TABLE_HEADER = TABLE_DELIMITER.join(TABLE_FIELDS)
+
+
+class CompactDish(dict):
+    """
+    Prompt record {'name','cal','p','c','f','quantity'} that also carries its
+    pre-serialised JSON and table row, so prompts can be assembled by
+    joining strings.
+    Shared between selections – treat as read-only.
+    """
+    __slots__ = ("json", "row")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.json = json.dumps(self, separators=COMPACT_SEPARATORS)
+        self.row = _table_row(self)
+
+
+def dish_json(dish: dict) -> str:
+    """Compact JSON for one dish record, reusing the cached fragment if any."""
+    cached = getattr(dish, "json", None)
+    return cached if cached is not None else json.dumps(dish, separators=COMPACT_SEPARATORS)
+
+
+def _table_cell(value) -> str:
+    if value is None or value != value:          # None / NaN
+        return ""
+    return str(value).replace(TABLE_DELIMITER, "/").replace("\n", " ").strip()
+
+
+def _table_row(dish: dict) -> str:
+    return TABLE_DELIMITER.join(_table_cell(dish.get(k)) for k in TABLE_FIELDS)
+
+
+def dish_row(dish: dict) -> str:
+    """TABLE_HEADER-ordered, delimited row for one dish record (cached if any)."""
+    cached = getattr(dish, "row", None)
+    return cached if cached is not None else _table_row(dish)
+
+
+def compact_columns(df: pd.DataFrame) -> tuple[list, ...]:
+    """
+    Whole-column conversion of the fields used in prompts:
+    (names, cal:int, p:float, c:float, f:float, quantity) as Python lists.
+    """
+    quantity = (df["Quantity (g)"].tolist() if "Quantity (g)" in df.columns
+                else [""] * len(df))
+    return (
+        df["Name"].tolist(),
+        df["Calories (kcal)"].astype(int).tolist(),
+        df["Protein (g)"].astype(float).tolist(),
+        df["Carbs (g)"].astype(float).tolist(),
+        df["Fat (g)"].astype(float).tolist(),
+        quantity,
+    )
+
+
+def compact_records(columns: tuple[list, ...], positions=None) -> list[CompactDish]:
+    """Build CompactDish records from compact_columns() output."""
+    names, cal, p, c, f, qty = columns
+    rows = range(len(names)) if positions is None else positions
+    return [
+        CompactDish(name=names[i], cal=cal[i], p=p[i], c=c[i], f=f[i], quantity=qty[i])
+        for i in rows
+    ]
+
+
+def _lower_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Lower-cased column as an object array ('' for missing cells/columns)."""
+    if col not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    return df[col].fillna("").astype(str).str.lower().to_numpy(dtype=object)
+
+
+class DishIndex:
+    """
+    Pre-computed lookup columns for one catalog DataFrame (row-aligned with it).
+
+        diet_codes / diet_labels   factorised lower-case 'Veg/Non-Veg'
+        meal_bits                  uint8 MEAL_BITS mask per dish
+        north / south / pan_india  region flags (same regexes the filter used)
+        approved_for_both          ApprovedForBoth == "yes"
+        ingredients_lc             lower-cased Ingredients strings
+        postings                   inverted index: ingredient token → sorted
+                                   dish ids (row positions) containing it
+        compact_dishes()           cached prompt records (+ JSON) per dish
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        import pandas as pd
+
+        self.size = len(df)
+
+        diet = _lower_column(df, "Veg/Non-Veg")
+        codes, labels = pd.factorize(diet)
+        self.diet_codes = codes
+        self.diet_labels = list(labels)
+
+        # Meal type: parse each distinct cell once, then broadcast via codes
+        meal_cells = (df["Meal Type"].astype(str) if "Meal Type" in df.columns
+                      else pd.Series(["nan"] * len(df)))
+        meal_codes, meal_uniques = pd.factorize(meal_cells)
+        self._meal_codes = meal_codes
+        self._meal_parts = [
+            frozenset(p.strip().lower() for p in str(cell).split("/"))
+            for cell in meal_uniques
+        ]
+        per_unique = np.array(
+            [sum(bit for name, bit in MEAL_BITS.items() if name in parts)
+             for parts in self._meal_parts],
+            dtype=np.uint8,
+        )
+        self.meal_bits = per_unique[meal_codes] if len(per_unique) else np.zeros(0, np.uint8)
+
+        region = (df["State/Region"] if "State/Region" in df.columns
+                  else pd.Series([None] * len(df)))
+        self.north = region.str.contains(NORTH_REGEX, case=False, na=False).to_numpy(dtype=bool)
+        self.south = region.str.contains(SOUTH_REGEX, case=False, na=False).to_numpy(dtype=bool)
+        self.pan_india = region.str.contains(PAN_INDIA_REGEX, case=False, na=False).to_numpy(dtype=bool)
+
+        self.approved_for_both = _lower_column(df, "ApprovedForBoth") == "yes"
+
+        self.ingredients_lc = _lower_column(df, "Ingredients")
+        self.postings = _build_postings(self.ingredients_lc)
+
+        self._ingredient_masks: dict[str, np.ndarray] = {}
+        self._term_postings: dict[str, np.ndarray] = {}
+        self._word_postings: dict[str, np.ndarray] = {}
+
+        # prompt records are built lazily per dish and then reused
+        self._compact_columns = compact_columns(df) if self.size else None
+        self._compact: dict[int, CompactDish] = {}
+
+    # ── primitive masks ─────────────────────────────────────────────────────
+    def all(self) -> np.ndarray:
+        return np.ones(self.size, dtype=bool)
+
+    def diet_in(self, labels) -> np.ndarray:
+        """Rows whose lower-cased Veg/Non-Veg value is one of labels."""
+        wanted = [i for i, lab in enumerate(self.diet_labels) if lab in labels]
+        return np.isin(self.diet_codes, wanted)
+
+    def meal_mask(self, meal_type: str) -> np.ndarray:
+        """Rows whose '/'-separated Meal Type contains meal_type."""
+        mt = meal_type.lower()
+        bit = MEAL_BITS.get(mt)
+        if bit is not None:
+            return (self.meal_bits & bit) != 0
+        # non-standard slot ("dessert", "side dish") – still per distinct cell only
+        hit = np.array([mt in parts for parts in self._meal_parts], dtype=bool)
+        return hit[self._meal_codes] if len(hit) else np.zeros(self.size, dtype=bool)
+
+    def ingredient_mask(self, term: str) -> np.ndarray:
+        """Rows whose Ingredients contain term (substring, case-insensitive).
+        Memoised per term, so repeated requests do no string work."""
+        term = term.lower()
+        mask = self._ingredient_masks.get(term)
+        if mask is None:
+            mask = np.fromiter((term in s for s in self.ingredients_lc),
+                               dtype=bool, count=self.size)
+            self._ingredient_masks[term] = mask
+        return mask
+
+    def term_postings(self, term: str) -> np.ndarray:
+        """
+        Dish ids whose Ingredients contain term, answered from the inverted
+        index. A single word matches every token it is a substring of (so
+        'ginger' also hits 'gingerly'), which is exactly what a substring
+        search over the raw text returns. Multi-word terms fall back to the
+        memoised substring mask. Results are memoised per term.
+        """
+        term = term.strip().lower()
+        ids = self._term_postings.get(term)
+        if ids is not None:
+            return ids
+
+        if term and not TOKEN_SPLIT.search(term):
+            hits = [p for tok, p in self.postings.items() if term in tok]
+            ids = np.unique(np.concatenate(hits)) if hits else np.zeros(0, np.int64)
+        else:
+            ids = np.flatnonzero(self.ingredient_mask(term))
+        self._term_postings[term] = ids
+        return ids
+
+    def word_postings(self, term: str) -> np.ndarray:
+        """
+        Dish ids whose Ingredients contain term as whole words, allowing
+        simple plurals: 'pea' hits 'peas' but not 'peanut' or 'chickpea',
+        'oil' does not hit 'boiled'. A single word is a few dict lookups in
+        the inverted index; multi-word terms use a memoised word-boundary
+        match over the text. Results are memoised per term.
+        """
+        term = term.strip().lower()
+        ids = self._word_postings.get(term)
+        if ids is not None:
+            return ids
+
+        if term and not TOKEN_SPLIT.search(term):
+            hits = [p for p in map(self.postings.get, word_forms(term)) if p is not None]
+            ids = np.unique(np.concatenate(hits)) if hits else np.zeros(0, np.int64)
+        elif term:
+            words = TOKEN_SPLIT.split(term.strip(" -"))
+            last = "(?:" + "|".join(sorted(map(re.escape, word_forms(words[-1])))) + ")"
+            pattern = re.compile(r"\b" + r"[^0-9a-z]+".join([*map(re.escape, words[:-1]), last]) + r"\b")
+            ids = np.flatnonzero(np.fromiter((pattern.search(s) is not None for s in self.ingredients_lc),
+                                             dtype=bool, count=self.size))
+        else:
+            ids = np.zeros(0, np.int64)
+        self._word_postings[term] = ids
+        return ids
+
+    def compact_dishes(self, positions) -> list[CompactDish]:
+        """CompactDish records for the given row positions, cached per dish."""
+        cache = self._compact
+        missing = [int(i) for i in positions if int(i) not in cache]
+        if missing:
+            for i, rec in zip(missing, compact_records(self._compact_columns, missing)):
+                cache[i] = rec
+        return [cache[int(i)] for i in positions]
+
+    def exclusion_mask(self, terms, whole_words: bool = False) -> np.ndarray:
+        """Rows containing ANY of terms – a union of posting lists
+        (substring matches, or word_postings() with whole_words)."""
+        postings = self.word_postings if whole_words else self.term_postings
+        mask = np.zeros(self.size, dtype=bool)
+        for term in terms:
+            mask[postings(term)] = True
+        return mask
+
+
+def _build_postings(ingredients_lc: np.ndarray) -> dict[str, np.ndarray]:
+    """token → sorted, de-duplicated row positions, built without a Python row loop."""
+    if len(ingredients_lc) == 0:
+        return {}
+    import pandas as pd
+
+    tokens = pd.Series(ingredients_lc).str.split(TOKEN_SPLIT.pattern, regex=True).explode()
+    pairs = pd.DataFrame({"tok": tokens.to_numpy(), "row": tokens.index.to_numpy()})
+    pairs = pairs[pairs["tok"].notna() & (pairs["tok"] != "")].drop_duplicates()
+    rows = pairs["row"].to_numpy(dtype=np.int64)
+    return {tok: np.sort(rows[pos]) for tok, pos in pairs.groupby("tok", sort=False).indices.items()}
+
+
+# ── one index per live DataFrame ──────────────────────────────────────────
+_INDEXES: dict[int, tuple[weakref.ref, DishIndex]] = {}
+
+
+def dish_index_for(df: pd.DataFrame) -> DishIndex:
+    """
+    Return the DishIndex for df, building it on first use.
+
+    Indexes are remembered for as long as the DataFrame object is alive, so
+    the catalog served by load_cuisine_database() is only indexed once.
+    The frame must not be mutated in place after indexing.
+    """
+    key = id(df)
+    hit = _INDEXES.get(key)
+    if hit is not None and hit[0]() is df:
+        return hit[1]
+
+    def _forget(ref, k=key):
+        if _INDEXES.get(k, (None,))[0] is ref:
+            del _INDEXES[k]
+
+    index = DishIndex(df)
+    _INDEXES[key] = (weakref.ref(df, _forget), index)
+    return index
@@ -0,0 +1,126 @@
+# ─── ai_engine/dish_protocol.py ───────────────────────────────────────────
+"""
+Dish-ID response protocol.
+
+Instead of asking the model to echo name / quantity / calories / macros for
+every dish of every day, the prompt numbers the dishes and the model only
+answers with [dish_id, multiplier] pairs per meal:
+
+    {"days": [{"Breakfast": [[3, 1.5], [11, 1]], "Lunch": [[27, 2]], ...}, ...]}
+
+expand() turns that into the usual {"7DayPlan": [...], "Summary": {...}}
+plan, taking quantities and nutrition from the catalog via scale_dish(), so
+the numbers in the PDF are exact and the completion is a few hundred
+tokens instead of several thousand.
+"""
+from __future__ import annotations
+
+import json
+
+from ai_engine.log import get_logger
+from ai_engine.portion_optimizer import meal_key, plan_summary, scale_dish
+
+log = get_logger(__name__)
+
+ID_MAX_TOKENS = 1500            # 7 days × ≤5 meals × a few pairs, with slack
+MAX_ID_MULTIPLIER = 4.0         # anything above is treated as a typo
+
+
+class DishIdProtocol:
+    """
+    Numbered view of one dish_selection for one meal structure.
+
+        dishes    id - 1 → compact dish record (ids start at 1)
+        meal_ids  dish_selection key → ids offered for that meal
+    """
+
+    def __init__(self, dish_selection: dict[str, list[dict]], meal_targets: dict[str, int]):
+        self.meal_targets = meal_targets
+        self.dishes: list[dict] = []
+        self.meal_ids: dict[str, list[int]] = {}
+        seen: dict[str, int] = {}
+        for meal, dishes in dish_selection.items():
+            ids = []
+            for d in dishes:
+                name = str(d["name"]).strip().lower()
+                if name not in seen:
+                    self.dishes.append(d)
+                    seen[name] = len(self.dishes)
+                ids.append(seen[name])
+            self.meal_ids[meal] = ids
+
+    # ── request side ──────────────────────────────────────────────────────
+    def _meal_block(self, meal: str) -> str:
+        ids = self.meal_ids.get(meal_key(meal), [])
+        rows = []
+        for i in ids:
+            d = self.dishes[i - 1]
+            rows.append(json.dumps([i, d["name"], d["cal"], d["p"], d["c"], d["f"], d.get("quantity", "")],
+                                   separators=(",", ":"), ensure_ascii=False))
+        return f"{meal.upper()} ({len(ids)} options):\n" + "\n".join(rows)
+
+    def prompt(self, target_calories: int) -> str:
+        meals = list(self.meal_targets)
+        meal_blocks = "\n\n".join(self._meal_block(meal) for meal in meals)
+        target_block = "\n".join(f"- {meal}: {kcal} kcal" for meal, kcal in self.meal_targets.items())
+        day_format = "{" + ",".join(f'"{meal}":[[id,multiplier],...]' for meal in meals) + "}"
+
+        return f"""Create a 7-day diet plan. Each day MUST total exactly {target_calories} kcal.
+
+AVAILABLE DISHES [id,name,cal,p,c,f,quantity] – nutrition is per listed quantity:
+
+{meal_blocks}
+
+TARGET CALORIES PER MEAL:
+{target_block}
+
+RULES:
+- For each meal pick 1‒4 dishes from THAT meal's list, by id.
+- Give each dish a portion multiplier (e.g. 0.5, 1, 1.5, 2); calories scale linearly.
+- sum(cal × multiplier) of a meal must be as close as possible to its target.
+- **A dish may appear max 2 times in the entire week and never on two consecutive days.**
+- **Do NOT use a multiplier that would give < 25 g / 25 ml / ½ roti / ½ piece.**
+- Return valid JSON only, no extra text, no names or nutrition.
+
+JSON FORMAT (exactly 7 day objects):
+{{"days":[{day_format}, ... Day 2 ..., ... Day 7 ...]}}
+"""
+
+    # ── response side ─────────────────────────────────────────────────────
+    def _pair(self, pair) -> tuple[dict, float] | None:
+        try:
+            dish_id, factor = int(pair[0]), float(pair[1])
+        except (TypeError, ValueError, IndexError, KeyError):
+            return None
+        if not 1 <= dish_id <= len(self.dishes) or not 0 < factor <= MAX_ID_MULTIPLIER:
+            return None
+        return self.dishes[dish_id - 1], factor
+
+    def expand(self, response: dict) -> dict:
+        """[dish_id, multiplier] response → full plan with catalog nutrition.
+        Raises ValueError if the response is not in the ID format."""
+        days = response.get("days") if isinstance(response, dict) else None
+        if not isinstance(days, list):
+            raise ValueError("ID response has no 'days' list")
+
+        plan_days, dropped = [], 0
+        for n, day in enumerate(days, 1):
+            day = day if isinstance(day, dict) else {}
+            by_key = {str(k).strip().lower(): v for k, v in day.items()}
+            entry = {"Day": f"Day {n}"}
+            for meal in self.meal_targets:
+                pairs = by_key.get(meal.lower())
+                dishes = {}
+                for pair in pairs if isinstance(pairs, list) else []:
+                    hit = self._pair(pair)
+                    if hit is None:
+                        dropped += 1
+                        continue
+                    dishes[f"Dish{len(dishes) + 1}"] = scale_dish(*hit)
+                entry[meal] = dishes
+            plan_days.append(entry)
+
+        if dropped:
+            log.warning("ID response: dropped %d unknown/invalid [id, multiplier] pair(s)", dropped,
+                        extra={"dropped": dropped})
+        return {"7DayPlan": plan_days, "Summary": plan_summary(plan_days)}
@@ -0,0 +1,313 @@
+# ─── ai_engine/json_repair.py ─────────────────────────────────────────────
+"""
+Lenient, single-pass JSON parser for model output.
+
+repair_json() first tries the strict C parser (the common case costs one
+json.loads). If that fails it walks the text once with a small recursive
+descent parser that accepts what models typically get wrong and records
+every fix it makes, with its line:column:
+
+    • markdown fences / prose before the first { or [ and after the value
+    • // … , # … and /* … */ comments
+    • trailing, leading or doubled commas; missing commas between members
+    • single-quoted strings, bare-word keys, raw newlines inside strings
+    • placeholders such as X / XX / NaN left where a number belongs (→ 0)
+    • numbers with a unit glued on ("250kcal" → 250)
+    • stray characters where a value belongs ("...", ":", "=", ";") are
+      skipped, so the "[{...}, ... ]" elisions models copy from our
+      prompt examples parse as the members that are actually there
+    • truncation: unterminated strings and unclosed objects/arrays are
+      closed, a key without a value is dropped
+
+Because truncation is repaired, any prefix of a response parses too, which
+is what the streaming path relies on.
+"""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+
+_WS = re.compile(r"[ \t\r\n]+")
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_UNIT = re.compile(r"[A-Za-z%]+")
+_WORD = re.compile(r"[A-Za-z_$][\w$]*")
+_JUNK = re.compile(r"[^\s{}\[\],\"'\w$]+")      # cannot start a value, not structural
+_STRING = re.compile(r'"(?:[^"\\\n\r]|\\.)*"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_CONSTANTS = {"true": True, "false": False, "null": None,
+              "True": True, "False": False, "None": None}
+
+
+_MISSING = object()             # value() found nothing to parse at this position
+
+
+class JSONRepairError(json.JSONDecodeError):
+    """Raised when the text contains no JSON object or array at all."""
+
+
+@dataclass
+class RepairResult:
+    value: object
+    repairs: list[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        """The repaired document as strict JSON."""
+        return json.dumps(self.value, ensure_ascii=False)
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.s = text
+        self.n = len(text)
+        self.i = 0
+        self.repairs: list[str] = []
+
+    # ── bookkeeping ───────────────────────────────────────────────────────
+    def note(self, what: str, pos: int | None = None):
+        pos = self.i if pos is None else pos
+        line = self.s.count("\n", 0, pos) + 1
+        col = pos - (self.s.rfind("\n", 0, pos) + 1) + 1
+        self.repairs.append(f"{what} at {line}:{col}")
+
+    def skip(self):
+        """Whitespace and comments."""
+        s = self.s
+        while self.i < self.n:
+            m = _WS.match(s, self.i)
+            if m:
+                self.i = m.end()
+                continue
+            if s.startswith("//", self.i) or s[self.i] == "#":
+                end = s.find("\n", self.i)
+                self.note("removed comment")
+                self.i = self.n if end < 0 else end
+            elif s.startswith("/*", self.i):
+                end = s.find("*/", self.i + 2)
+                self.note("removed comment")
+                self.i = self.n if end < 0 else end + 2
+            else:
+                return
+
+    # ── values ────────────────────────────────────────────────────────────
+    def value(self):
+        """The next value, or _MISSING (with the position at ',', '}', ']' or
+        the end) when there is none; stray characters are skipped."""
+        while True:
+            self.skip()
+            if self.i >= self.n:
+                self.note("missing value")
+                return _MISSING
+            c = self.s[self.i]
+            if c == "{":
+                return self.obj()
+            if c == "[":
+                return self.arr()
+            if c in "\"'":
+                return self.string()
+            m = _NUMBER.match(self.s, self.i)
+            if m:
+                return self.number(m)
+            m = _WORD.match(self.s, self.i)
+            if m:
+                word = m.group()
+                self.i = m.end()
+                if word in _CONSTANTS:
+                    if word[0].isupper():
+                        self.note(f"{word} → {json.dumps(_CONSTANTS[word])}", m.start())
+                    return _CONSTANTS[word]
+                self.note(f"placeholder {word} → 0", m.start())
+                return 0
+            m = _JUNK.match(self.s, self.i)
+            if not m:
+                break
+            self.note(f"skipped unexpected {m.group()!r}")
+            self.i = m.end()
+        self.note(f"missing value before {c!r}")
+        return _MISSING
+
+    def number(self, m: re.Match):
+        text = m.group()
+        self.i = m.end()
+        unit = _UNIT.match(self.s, self.i)
+        if unit:
+            self.note(f"dropped unit {unit.group()!r} after number", self.i)
+            self.i = unit.end()
+        if text[0] == "+" or text[0] == "." or text.endswith(".") or text.startswith("-."):
+            self.note(f"normalised number {text!r}", m.start())
+        return float(text) if any(ch in text for ch in ".eE") else int(text)
+
+    def string(self) -> str:
+        s, start = self.s, self.i
+        if s[start] == '"':
+            m = _STRING.match(s, start)
+            if m:
+                try:
+                    value = json.loads(m.group())
+                    self.i = m.end()
+                    return value
+                except json.JSONDecodeError:
+                    pass                    # odd escape – slow path below
+        quote = s[start]
+        if quote == "'":
+            self.note("single-quoted string", start)
+        out = []
+        i = start + 1
+        while i < self.n:
+            c = s[i]
+            if c == quote:
+                self.i = i + 1
+                return "".join(out)
+            if c == "\\" and i + 1 < self.n:
+                nxt = s[i + 1]
+                if nxt == "u" and re.fullmatch(r"[0-9a-fA-F]{4}", s[i + 2:i + 6]):
+                    out.append(chr(int(s[i + 2:i + 6], 16)))
+                    i += 6
+                    continue
+                out.append(_ESCAPES.get(nxt, nxt))
+                i += 2
+                continue
+            if c in "\r\n":
+                self.note("raw newline in string", i)
+            out.append(c)
+            i += 1
+        self.note("closed unterminated string", start)
+        self.i = self.n
+        return "".join(out)
+
+    def key(self) -> str | None:
+        c = self.s[self.i]
+        if c in "\"'":
+            return self.string()
+        m = _WORD.match(self.s, self.i) or _NUMBER.match(self.s, self.i)
+        if m:
+            self.note(f"quoted bare key {m.group()!r}")
+            self.i = m.end()
+            return m.group()
+        return None
+
+    # ── containers ────────────────────────────────────────────────────────
+    def _separator(self) -> bool:
+        """After a member: consume ',' (noting a trailing one). Returns False
+        once the container is finished (closed or truncated)."""
+        self.skip()
+        if self.i >= self.n:
+            return False
+        c = self.s[self.i]
+        if c == ",":
+            self.i += 1
+            self.skip()
+            if self.i < self.n and self.s[self.i] in "}]":
+                self.note("removed trailing comma", self.i - 1)
+            return True
+        if c not in "}]":
+            self.note("inserted missing comma")
+        return True
+
+    def _close(self, close: str) -> bool:
+        """At a closing bracket? Consume it (tolerating the wrong kind)."""
+        c = self.s[self.i]
+        if c not in "}]":
+            return False
+        if c != close:
+            self.note(f"replaced {c!r} with {close!r}")
+        self.i += 1
+        return True
+
+    def obj(self) -> dict:
+        start = self.i
+        self.i += 1
+        result = {}
+        while True:
+            self.skip()
+            if self.i >= self.n:
+                self.note("closed unterminated object", start)
+                return result
+            if self._close("}"):
+                return result
+            if self.s[self.i] == ",":
+                self.note("removed extra comma")
+                self.i += 1
+                continue
+            key = self.key()
+            if key is None:
+                self.note(f"skipped unexpected {self.s[self.i]!r}")
+                self.i += 1
+                continue
+            self.skip()
+            if self.i < self.n and self.s[self.i] == ":":
+                self.i += 1
+            elif self.i < self.n and self.s[self.i] not in ",}]":
+                self.note(f"inserted ':' after key {key!r}")
+            self.skip()
+            if self.i >= self.n or self.s[self.i] in ",}]":
+                self.note(f"dropped key {key!r} without a value")
+                continue
+            value = self.value()
+            if value is _MISSING:
+                self.note(f"dropped key {key!r} without a value")
+            else:
+                result[key] = value
+            if not self._separator():
+                self.note("closed unterminated object", start)
+                return result
+
+    def arr(self) -> list:
+        start = self.i
+        self.i += 1
+        result = []
+        while True:
+            self.skip()
+            if self.i >= self.n:
+                self.note("closed unterminated array", start)
+                return result
+            if self._close("]"):
+                return result
+            if self.s[self.i] == ",":
+                self.note("removed extra comma")
+                self.i += 1
+                continue
+            pos = self.i
+            value = self.value()
+            if value is not _MISSING:
+                result.append(value)
+            elif self.i == pos:         # not expected (value() skips junk), but never spin
+                self.note(f"skipped unexpected {self.s[self.i]!r}")
+                self.i += 1
+                continue
+            if not self._separator():
+                self.note("closed unterminated array", start)
+                return result
+
+    def document(self):
+        starts = [p for p in (self.s.find("{"), self.s.find("[")) if p >= 0]
+        if not starts:
+            raise JSONRepairError("no JSON object or array found", self.s, 0)
+        first = min(starts)
+        if self.s[:first].strip():
+            self.note(f"skipped {first} chars of leading text", 0)
+        self.i = first
+        value = self.value()
+        if value is _MISSING:
+            value = None
+        self.skip()
+        if self.i < self.n:
+            self.note(f"ignored {self.n - self.i} chars of trailing text")
+        return value
+
+
+def repair_json(text: str) -> RepairResult:
+    """Parse model output leniently; .repairs lists what had to be fixed."""
+    try:
+        return RepairResult(json.loads(text))
+    except (json.JSONDecodeError, TypeError):
+        pass
+    parser = _Parser(text or "")
+    value = parser.document()
+    return RepairResult(value, parser.repairs)
+
+
+def loads_lenient(text: str):
+    """json.loads that applies repair_json's fixes silently."""
+    return repair_json(text).value
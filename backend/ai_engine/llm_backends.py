@@ -0,0 +1,281 @@
+# ─── ai_engine/llm_backends.py ────────────────────────────────────────────
+"""
+Pluggable chat-completion backends.
+
+openai_client never calls openai.ChatCompletion directly; it goes through
+get_llm_backend(), whose create() / acreate() take the same keyword
+arguments and return the same response shapes (a response dict, or with
+stream=True an iterator of delta chunks):
+
+    openai   OpenAIBackend – the real API (needs OPENAI_API_KEY on first call)
+    fake     FakeBackend   – offline, deterministic stub for load tests
+
+The fake reads the dish lists, per-meal targets and requested days out of
+the prompt (compact json/table prompts, day-subset prompts and the dish-ID
+protocol) and answers with schema-valid plan JSON that hits the targets.
+Latency, transient errors and 429s can be injected. Settings (environment):
+
+    LLM_BACKEND=openai|fake
+    FAKE_LLM_LATENCY_MS=0          mean latency per call
+    FAKE_LLM_JITTER_MS=0           ± uniform jitter
+    FAKE_LLM_ERROR_RATE=0          fraction of calls failing with a connection error
+    FAKE_LLM_429_RATE=0            fraction of calls failing with RateLimitError
+    FAKE_LLM_SEED=0
+
+The openai package is imported on the first real API call (or the first
+injected fake error), never at import time.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+from ai_engine.dish_index import TABLE_DELIMITER, TABLE_HEADER
+from ai_engine.portion_optimizer import (
+    MAX_DISHES_PER_MEAL,
+    MAX_MULTIPLIER,
+    MIN_MULTIPLIER,
+    meal_key,
+    plan_summary,
+    scale_dish,
+)
+from ai_engine.settings import env
+from ai_engine.token_accounting import chat_prompt_tokens, count_tokens
+
+BACKENDS = ("openai", "fake")
+STREAM_CHUNK_CHARS = 48         # fake stream delta size (a few tokens)
+
+
+class LLMBackend:
+    """create(**request) / await acreate(**request), ChatCompletion-style."""
+
+    name = "base"
+    rate_limited = True             # calls go through the shared rate limiter
+
+    def create(self, **request):
+        raise NotImplementedError
+
+    async def acreate(self, **request):
+        return await asyncio.to_thread(self.create, **request)
+
+
+# ── OpenAI ────────────────────────────────────────────────────────────────
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, api_key: str | None = None):
+        self.api_key = api_key
+
+    def _api(self):
+        import openai
+
+        if not openai.api_key:
+            key = self.api_key or env("OPENAI_API_KEY")
+            if not key:
+                raise RuntimeError("Set OPENAI_API_KEY in your .env file")
+            openai.api_key = key        # 0.28.x → set key on module
+        return openai.ChatCompletion
+
+    def create(self, **request):
+        return self._api().create(**request)
+
+    async def acreate(self, **request):
+        return await self._api().acreate(**request)
+
+
+# ── offline fake ──────────────────────────────────────────────────────────
+_TARGET = re.compile(r"MUST total exactly (\d+) kcal|Each day must total (\d+) kcal")
+_MEAL_TARGET = re.compile(r"^- (\w+): (\d+) kcal$", re.M)
+_DAY_SUBSET = re.compile(r"^Create ((?:Day \d+)(?: and Day \d+)*) of a 7-day", re.M)
+_MEAL_BLOCK = re.compile(r"^([A-Z][A-Z0-9]*) \(\d+ options\):\n(.*?)(?=\n\n|\Z)", re.M | re.S)
+_ID_HEADER = "AVAILABLE DISHES [id,"
+
+
+def _parse_block(body: str) -> list[dict]:
+    """One meal block (JSON array, table or ID rows) → compact dish records."""
+    lines = body.strip().splitlines()
+    if not lines:
+        return []
+    if lines[0].startswith("[{"):
+        return json.loads(lines[0])
+    if lines[0] == TABLE_HEADER:
+        fields = TABLE_HEADER.split(TABLE_DELIMITER)
+        dishes = []
+        for row in lines[1:]:
+            d = dict(zip(fields, row.split(TABLE_DELIMITER)))
+            for k in ("cal", "p", "c", "f"):
+                d[k] = float(d.get(k) or 0)
+            dishes.append(d)
+        return dishes
+    dishes = []
+    for row in lines:
+        i, name, cal, p, c, f, quantity = json.loads(row)
+        dishes.append({"id": i, "name": name, "cal": cal, "p": p, "c": c, "f": f, "quantity": quantity})
+    return dishes
+
+
+def _placeholder_dish(meal: str, kcal: int) -> dict:
+    """Stand-in dish for prompts that carry no dish list (legacy full prompt)."""
+    return {"name": f"{meal} Plate", "cal": kcal, "p": kcal * 0.075, "c": kcal * 0.1,
+            "f": kcal * 0.033, "quantity": "1 plate (300g)"}
+
+
+def _meal_dishes(options: list[dict], start: int, kcal: float) -> list[dict]:
+    """options[start], plus the following ones while the meal target is out of
+    reach at MAX_MULTIPLIER (at most MAX_DISHES_PER_MEAL distinct dishes)."""
+    dishes = []
+    for k in range(min(MAX_DISHES_PER_MEAL, len(options))):
+        dishes.append(options[(start + k) % len(options)])
+        if sum(max(float(d["cal"]), 1.0) for d in dishes) * MAX_MULTIPLIER >= kcal:
+            break
+    return dishes
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic stand-in for the API. Day n starts from dish n of each
+    meal's list (wrapping around), so with enough options no dish lands on
+    consecutive days or more than twice a week; portions are scaled to the
+    meal target.
+    """
+
+    name = "fake"
+    rate_limited = False            # no provider quota to respect
+
+    def __init__(self, latency_s: float = 0.0, jitter_s: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: int = 0):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeBackend":
+        return cls(latency_s=float(env("FAKE_LLM_LATENCY_MS", "0")) / 1000,
+                   jitter_s=float(env("FAKE_LLM_JITTER_MS", "0")) / 1000,
+                   error_rate=float(env("FAKE_LLM_ERROR_RATE", "0")),
+                   rate_limit_rate=float(env("FAKE_LLM_429_RATE", "0")),
+                   seed=int(env("FAKE_LLM_SEED", "0")))
+
+    # ── call outcome ──────────────────────────────────────────────────────
+    def _draw(self) -> tuple[float, Exception | None]:
+        """(delay in seconds, exception to raise or None) for the next call."""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_s + self._rng.uniform(-self.jitter_s, self.jitter_s))
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate + self.error_rate:
+            # the real client's error types, so retry handling is exercised as-is
+            from openai.error import APIConnectionError, RateLimitError
+        if roll < self.rate_limit_rate:
+            return delay, RateLimitError("Rate limit reached (fake backend)", http_status=429)
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, APIConnectionError("Connection reset (fake backend)")
+        return delay, None
+
+    # ── answer ────────────────────────────────────────────────────────────
+    def plan_for(self, prompt: str) -> dict:
+        """The JSON object this backend answers prompt with."""
+        m = _TARGET.search(prompt)
+        target = int(m.group(1) or m.group(2)) if m else 1800
+        meal_targets = {meal: int(kcal) for meal, kcal in _MEAL_TARGET.findall(prompt)}
+        if not meal_targets:
+            meal_targets = {"Breakfast": target // 4, "Lunch": target * 35 // 100,
+                            "Dinner": target - target // 4 - target * 35 // 100}
+        blocks = {meal_key(name): _parse_block(body) for name, body in _MEAL_BLOCK.findall(prompt)}
+        subset = _DAY_SUBSET.search(prompt)
+        day_numbers = [int(n) for n in re.findall(r"\d+", subset.group(1))] if subset else list(range(1, 8))
+
+        ids = _ID_HEADER in prompt
+        plan_days = []
+        for n in day_numbers:
+            day = {} if ids else {"Day": f"Day {n}"}
+            for meal, kcal in meal_targets.items():
+                options = blocks.get(meal_key(meal)) or [_placeholder_dish(meal, kcal)]
+                dishes = _meal_dishes(options, n - 1, kcal)
+                factor = min(MAX_MULTIPLIER, max(MIN_MULTIPLIER, kcal / sum(float(d["cal"]) for d in dishes)))
+                if ids:
+                    day[meal] = [[d["id"], round(factor, 2)] for d in dishes]
+                else:
+                    day[meal] = {f"Dish{k}": scale_dish(d, factor) for k, d in enumerate(dishes, 1)}
+            plan_days.append(day)
+        if ids:
+            return {"days": plan_days}
+        if subset:
+            return {"7DayPlan": plan_days}
+        return {"7DayPlan": plan_days, "Summary": plan_summary(plan_days)}
+
+    def _response(self, request: dict) -> tuple[dict, str]:
+        prompt = request["messages"][-1]["content"]
+        content = json.dumps(self.plan_for(prompt), ensure_ascii=False)
+        usage = {"prompt_tokens": chat_prompt_tokens(request["messages"]),
+                 "completion_tokens": count_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        resp = {"object": "chat.completion", "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage}
+        return resp, content
+
+    @staticmethod
+    def _chunks(content: str):
+        for i in range(0, len(content), STREAM_CHUNK_CHARS):
+            yield {"choices": [{"index": 0, "delta": {"content": content[i:i + STREAM_CHUNK_CHARS]}}]}
+
+    def create(self, stream: bool = False, **request):
+        delay, error = self._draw()
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        resp, content = self._response(request)
+        return self._chunks(content) if stream else resp
+
+    async def acreate(self, stream: bool = False, **request):
+        delay, error = self._draw()
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        resp, content = self._response(request)
+        if not stream:
+            return resp
+
+        async def chunks():
+            for chunk in self._chunks(content):
+                yield chunk
+        return chunks()
+
+
+# ── selection ─────────────────────────────────────────────────────────────
+_BACKEND: LLMBackend | None = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def make_backend(name: str) -> LLMBackend:
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "fake":
+        return FakeBackend.from_env()
+    raise ValueError(f"Unknown LLM backend {name!r}; expected one of {BACKENDS}")
+
+
+def get_llm_backend() -> LLMBackend:
+    """The process-wide backend, chosen by LLM_BACKEND on first use."""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            _BACKEND = make_backend(env("LLM_BACKEND", "openai").lower())
+        return _BACKEND
+
+
+def set_llm_backend(backend: LLMBackend | str | None):
+    """Install a backend (instance or name); None re-reads LLM_BACKEND."""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        _BACKEND = make_backend(backend) if isinstance(backend, str) else backend
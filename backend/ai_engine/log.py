@@ -0,0 +1,175 @@
+# ─── ai_engine/log.py ─────────────────────────────────────────────────────
+"""
+Leveled, structured logging for the plan pipeline.
+
+    from ai_engine.log import get_logger
+    log = get_logger(__name__)
+
+    log.info("Dish selection: %d dishes", total, extra={"dishes": total})
+    if log.isEnabledFor(logging.DEBUG):         # expensive dumps only
+        log.debug("Sample dishes: %s", [...])
+
+Every line carries the correlation ID of the user being planned, so one
+user's lines can be picked out of a concurrent Flask worker or batch run:
+
+    with correlation_scope("row-143"):
+        generate_plan(user)
+
+correlation_scope() without an ID keeps an enclosing one and otherwise
+mints a fresh one; the ID lives in a contextvar, so asyncio tasks and
+asyncio.to_thread() calls inherit it from the code that started them.
+
+Configured lazily, from the environment, when the first record is logged
+(importing a module that calls get_logger() reads nothing):
+
+    LOG_LEVEL   DEBUG | INFO (default) | WARNING | ERROR
+    LOG_FORMAT  json (default, one object per line) | text
+
+Lines go to stderr through a handler on the "ai_engine" logger, which does
+not propagate – call configure_logging() to change level, format or stream
+at runtime. Messages use %-style arguments, so a disabled level costs a
+single isEnabledFor() check and never formats anything.
+
+JSON lines look like
+
+    {"ts": "2026-10-18T09:12:03.441Z", "level": "INFO", "logger":
+     "ai_engine.openai_client", "msg": "…", "correlation_id": "row-143",
+     "dishes": 86}
+
+with any extra={…} fields merged in at the top level.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+
+from ai_engine.settings import env
+
+ROOT_LOGGER = "ai_engine"
+LOG_FORMATS = ("json", "text")
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(correlation_id)s] %(name)s: %(message)s"
+
+_correlation_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("correlation_id", default=None)
+_configured = False
+_config_lock = threading.Lock()
+
+# attributes every LogRecord has; anything else came in through extra={…}
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "correlation_id", "taskName",
+}
+
+
+# ── correlation IDs ───────────────────────────────────────────────────────
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def get_correlation_id() -> str | None:
+    return _correlation_id.get()
+
+
+@contextlib.contextmanager
+def correlation_scope(correlation_id: str | None = None):
+    """Tag every log line of the with-block with correlation_id."""
+    cid = correlation_id or _correlation_id.get() or new_correlation_id()
+    token = _correlation_id.set(str(cid))
+    try:
+        yield cid
+    finally:
+        _correlation_id.reset(token)
+
+
+class _CorrelationFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = _correlation_id.get() or "-"
+        return True
+
+
+# ── formatters ────────────────────────────────────────────────────────────
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; extra={…} fields become top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        ms = int(record.msecs)
+        out = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{ms:03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", None) or _correlation_id.get(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+def _formatter(fmt: str) -> logging.Formatter:
+    return JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+
+
+class _ConfigureOnFirstRecord(logging.Handler):
+    """Placeholder handler: configures logging, then passes the record on."""
+
+    def emit(self, record: logging.LogRecord):
+        configure_logging()
+        root = logging.getLogger(ROOT_LOGGER)
+        if record.levelno >= root.level:
+            for handler in root.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+# ── configuration ─────────────────────────────────────────────────────────
+def configure_logging(level: str | int | None = None, fmt: str | None = None, stream=None):
+    """(Re)configure the "ai_engine" logger; unset arguments come from the environment."""
+    global _configured
+    level = level or env("LOG_LEVEL", "INFO")
+    if isinstance(level, str):
+        level = logging.getLevelName(level.strip().upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    fmt = (fmt or env("LOG_FORMAT", "json")).strip().lower()
+    if fmt not in LOG_FORMATS:
+        fmt = "json"
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler._ai_engine = True
+    handler.addFilter(_CorrelationFilter())
+    handler.setFormatter(_formatter(fmt))
+    with _config_lock:
+        root = logging.getLogger(ROOT_LOGGER)
+        # a fresh list: a record being dispatched keeps iterating the old one
+        root.handlers = [h for h in root.handlers if not getattr(h, "_ai_engine", False)] + [handler]
+        root.setLevel(level)
+        root.propagate = False
+        _configured = True
+
+
+def _install_placeholder():
+    with _config_lock:
+        root = logging.getLogger(ROOT_LOGGER)
+        if _configured or any(getattr(h, "_ai_engine", False) for h in root.handlers):
+            return
+        placeholder = _ConfigureOnFirstRecord()
+        placeholder._ai_engine = True
+        root.addHandler(placeholder)
+        root.setLevel(logging.DEBUG)        # real level is set with the first record
+        root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under "ai_engine" (configured when the first record is logged)."""
+    if not _configured:
+        _install_placeholder()
+    if name != ROOT_LOGGER and not name.startswith(ROOT_LOGGER + "."):
+        name = f"{ROOT_LOGGER}.{name}"
+    return logging.getLogger(name)
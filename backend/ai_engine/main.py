@@ -1,6 +1,9 @@
-import sys, json
+import sys, json, logging
 from ai_engine.planner import generate_plan
 from ai_engine.pdf_generator import create_pdf, create_detailed_pdf
+from ai_engine.log import correlation_scope, get_logger
+
+log = get_logger(__name__)
 
 def load_input(path: str) -> dict:
     with open(path, "r") as f:
@@ -8,23 +11,20 @@ def load_input(path: str) -> dict:
 
 def validate_plan_format(plan):
     """Validate that the plan has the expected format"""
-    print("\n=== Plan Validation ===")
-    
     if not isinstance(plan, dict):
-        print("X Plan is not a dictionary")
+        log.error("Plan is not a dictionary")
         return False
     
     if "7DayPlan" not in plan:
-        print("X Missing '7DayPlan' key")
+        log.error("Missing '7DayPlan' key")
         return False
     
     days = plan["7DayPlan"]
     if not isinstance(days, list) or len(days) != 7:
-        print(f"X '7DayPlan' should be a list of 7 days, got {len(days) if isinstance(days, list) else 'not a list'}")
+        log.error("'7DayPlan' should be a list of 7 days, got %s",
+                  len(days) if isinstance(days, list) else "not a list")
         return False
     
-    print(f"OK Found 7 days")
-    
     # Check meal structure
     meal_count = 0
     for i, day in enumerate(days):
@@ -33,14 +33,13 @@ def validate_plan_format(plan):
             if meal_name != "Day":
                 meal_count += 1
                 if isinstance(meal_data, dict):
-                    print(f"OK {day_name} - {meal_name}: Dictionary format with {len(meal_data)} items")
+                    log.debug("%s - %s: dictionary format with %d items", day_name, meal_name, len(meal_data))
                 elif isinstance(meal_data, str):
-                    print(f"OK {day_name} - {meal_name}: String format")
+                    log.debug("%s - %s: string format", day_name, meal_name)
                 else:
-                    print(f"! {day_name} - {meal_name}: Unexpected format - {type(meal_data)}")
+                    log.warning("%s - %s: unexpected format - %s", day_name, meal_name, type(meal_data).__name__)
     
-    print(f"OK Total meals found: {meal_count}")
-    print("======================\n")
+    log.info("Plan format OK: 7 days, %d meals", meal_count, extra={"meals": meal_count})
     return True
 
 def run(input_path: str, output_pdf: str, format_type: str = "table"):
@@ -105,44 +104,38 @@ def run(input_path: str, output_pdf: str, format_type: str = "table"):
         output_pdf: Path for output PDF
         format_type: "table" for table format, "detailed" for detailed format
     """
-    print(f"Loading input from: {input_path}")
-    data = load_input(input_path)
-    
-    print("Generating diet plan...")
-    plan = generate_plan(data)
-    
-    # Debug: Print the plan structure
-    print("\n=== Plan Structure Preview ===")
-    if "7DayPlan" in plan and len(plan["7DayPlan"]) > 0:
-        first_day = plan["7DayPlan"][0]
-        print(f"First day structure: {first_day.get('Day', 'Unknown')}")
-        for meal_name, meal_data in first_day.items():
-            if meal_name != "Day":
-                preview = str(meal_data)[:100] + "..." if len(str(meal_data)) > 100 else str(meal_data)
-                print(f"  {meal_name}: {preview}")
-    print("===============================\n")
-    
-    # Validate format
-    validate_plan_format(plan)
-    
-    # Create PDF based on format type
-    print(f"Creating {format_type} format PDF...")
-    if format_type.lower() == "detailed":
-        create_detailed_pdf(plan, output_pdf)
-    else:
-        create_pdf(plan, output_pdf)
-    
-    print(f"OK Generated {output_pdf}")
-    
-    # Print summary if available
-    if "Summary" in plan:
-        print(f"\nPlan Summary:")
-        summary = plan["Summary"]
-        if "AverageCalories" in summary:
-            print(f"   Average Calories: {summary['AverageCalories']}")
-        if "AverageMacros" in summary:
-            macros = summary["AverageMacros"]
-            print(f"   Average Macros: P:{macros.get('Protein', 'N/A')} | C:{macros.get('Carbs', 'N/A')} | F:{macros.get('Fats', 'N/A')}")
+    with correlation_scope():
+        log.info("Loading input from: %s", input_path)
+        data = load_input(input_path)
+        
+        log.info("Generating diet plan...")
+        plan = generate_plan(data)
+        
+        # Debug: preview of the plan structure (only built when DEBUG is on)
+        if log.isEnabledFor(logging.DEBUG) and plan.get("7DayPlan"):
+            first_day = plan["7DayPlan"][0]
+            for meal_name, meal_data in first_day.items():
+                if meal_name != "Day":
+                    preview = str(meal_data)[:100] + "..." if len(str(meal_data)) > 100 else str(meal_data)
+                    log.debug("%s %s: %s", first_day.get("Day", "Unknown"), meal_name, preview)
+        
+        # Validate format
+        validate_plan_format(plan)
+        
+        # Create PDF based on format type
+        log.info("Creating %s format PDF...", format_type)
+        if format_type.lower() == "detailed":
+            create_detailed_pdf(plan, output_pdf)
+        else:
+            create_pdf(plan, output_pdf)
+        
+        # Summary if available
+        summary = plan.get("Summary", {})
+        macros = summary.get("AverageMacros", {})
+        log.info("Generated %s (average %s kcal; P:%s | C:%s | F:%s)", output_pdf,
+                 summary.get("AverageCalories", "N/A"), macros.get("Protein", "N/A"),
+                 macros.get("Carbs", "N/A"), macros.get("Fats", "N/A"),
+                 extra={"output": output_pdf, "average_calories": summary.get("AverageCalories")})
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
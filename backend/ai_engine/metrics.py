@@ -0,0 +1,197 @@
+# ─── ai_engine/metrics.py ─────────────────────────────────────────────────
+"""
+Lightweight stage timings and counters for plan generation.
+
+    with span("filtering"):
+        ...
+    incr("retries")
+
+    @timed("pdf_render")
+    def create_pdf(...): ...
+
+Every span feeds a latency histogram per stage (plus a bounded sample of
+recent durations for percentiles); counters are plain monotonic totals,
+optionally labelled. Both are process-wide and thread/async safe (a span
+only reads perf_counter, so concurrent tasks each time their own stage).
+
+Stages recorded by the pipeline:
+
+    plan            get_diet_plan_via_gpt / get_diet_plan_async, end to end
+    catalog_load    load_cuisine_database
+    filtering       create_dish_selection_from_csv
+    prompt_assembly prompt for the chosen mode
+    api_call        one completion request (each attempt, streamed or not)
+    json_parse      repair_json on a completion
+    validation      calorie check + local repair of a parsed plan
+    pdf_render      create_pdf
+
+Counters: plans{mode}, api_attempts, retries, rate_limited (429s),
+api_errors{kind}, decode_failures{reason}, stream_aborts, plan_cache_hits,
+partial_plans (accepted with some days off target), local_fallbacks.
+
+Exported as Prometheus text (prometheus_text(), served on /metrics by the
+Flask app) and as a JSON summary (metrics_summary(), printed at the end of
+a batch run).
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import functools
+import inspect
+import statistics
+import threading
+import time
+from collections import deque
+
+PREFIX = "dietplan"
+# seconds; API calls dominate the upper buckets, local stages the lower ones
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SAMPLE_SIZE = 2048              # recent durations kept per stage for percentiles
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "recent")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)      # last slot: > BUCKETS[-1]
+        self.total = 0.0
+        self.count = 0
+        self.recent: deque[float] = deque(maxlen=SAMPLE_SIZE)
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict[str, _Histogram] = {}
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self.started = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = _Histogram()
+            hist.observe(seconds)
+
+    @contextlib.contextmanager
+    def span(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def incr(self, name: str, n: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    # ── export ────────────────────────────────────────────────────────────
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {k: (h.count, h.total, sorted(h.recent)) for k, h in self._stages.items()}
+            counters = dict(self._counters)
+        out_stages = {}
+        for stage, (count, total, recent) in sorted(stages.items()):
+            out_stages[stage] = {
+                "count": count,
+                "total_s": round(total, 4),
+                "mean_ms": round(total / count * 1000, 3) if count else None,
+                "p50_ms": round(statistics.median(recent) * 1000, 3) if recent else None,
+                "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 3)
+                          if recent else None,
+                "max_ms": round(recent[-1] * 1000, 3) if recent else None,
+            }
+        out_counters: dict[str, float | dict] = {}
+        for (name, labels), value in sorted(counters.items()):
+            if labels:
+                out_counters.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+            else:
+                out_counters[name] = value
+        return {"uptime_s": round(time.time() - self.started, 1),
+                "stages": out_stages, "counters": out_counters}
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            stages = {k: (list(h.counts), h.total, h.count) for k, h in self._stages.items()}
+            counters = dict(self._counters)
+
+        lines = [f"# HELP {PREFIX}_stage_seconds Wall time of plan-generation stages.",
+                 f"# TYPE {PREFIX}_stage_seconds histogram"]
+        for stage, (counts, total, count) in sorted(stages.items()):
+            cumulative = 0
+            for le, c in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += c
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        by_name: dict[str, list] = {}
+        for (name, labels), value in sorted(counters.items()):
+            by_name.setdefault(name, []).append((labels, value))
+        for name, series in by_name.items():
+            metric = f"{PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in series:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{metric}{{{label_text}}} {value:g}" if labels else f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = Metrics()
+
+
+def span(stage: str):
+    """Time the with-block as one observation of stage."""
+    return METRICS.span(stage)
+
+
+def incr(name: str, n: float = 1, **labels):
+    METRICS.incr(name, n, **labels)
+
+
+def metrics_summary() -> dict:
+    return METRICS.summary()
+
+
+def prometheus_text() -> str:
+    return METRICS.prometheus_text()
+
+
+def reset_metrics():
+    METRICS.reset()
+
+
+def timed(stage: str):
+    """Decorator: every call of the function (sync or async) is one span."""
+    def wrap(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
@@ -1,55 +1,183 @@
 
+from __future__ import annotations
+
 import os
 import json
+import logging
+import math
+import asyncio
+import contextlib
 import time
 import random
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
 from json import JSONDecodeError
 
-import openai
-from openai.error import (
-    OpenAIError,
-    RateLimitError,
-    APIConnectionError,
-    Timeout as APITimeoutError,          # alias for backward‑compat
-    InvalidRequestError as APIStatusError,  # alias for 1.x APIStatusError
-)
-import pandas as pd
-from dotenv import load_dotenv
+import numpy as np
 
 from pathlib import Path
 
+from ai_engine.portion_optimizer import build_local_plan, enforce_weekly_rules, plan_summary, repair_plan
+from ai_engine.dish_protocol import ID_MAX_TOKENS, DishIdProtocol
+from ai_engine.json_repair import JSONRepairError, loads_lenient, repair_json
+from ai_engine.llm_backends import get_llm_backend
+from ai_engine.log import get_logger
+from ai_engine.metrics import incr, span, timed
+from ai_engine.rate_limiter import get_rate_limiter
+from ai_engine.response_cache import get_plan_cache, request_key
+from ai_engine.settings import env
+from ai_engine.streaming import StreamAborted, StreamMonitor, streaming_enabled
+from ai_engine.token_accounting import (
+    chat_prompt_tokens,
+    count_tokens,
+    dish_tokens,
+    record_usage,
+    trim_to_budget,
+)
+from ai_engine.dish_index import (
+    TABLE_HEADER,
+    DishIndex,
+    compact_columns,
+    compact_records,
+    dish_index_for,
+    dish_json,
+    dish_row,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
 # project root …/Wellnetic
 BASE_DIR = Path(__file__).resolve().parent       # .../backend/ai_engine
 CSV_DEFAULT = BASE_DIR.parent / "samples" / "CuisineList.csv"
+log = get_logger(__name__)
 # -----------------------------------------------------------------
 
-# ─── 1. Load your API key ────────────────────────────────────────────────────
-load_dotenv()
-API_KEY = os.getenv("OPENAI_API_KEY")   
-if not API_KEY:
-    raise RuntimeError("Set OPENAI_API_KEY in your .env file")
-
-# 0.28.x → set key on module
-openai.api_key = API_KEY
+# ─── 1. Configuration ────────────────────────────────────────────────────────
+# Nothing is read at import: .env is loaded by ai_engine.settings on the first
+# env() call, OPENAI_API_KEY is checked by OpenAIBackend on the first API call,
+# and pandas / openai are imported where first needed. The module imports
+# (and runs with LLM_BACKEND=fake) without a key.
 
 
 # ─── 2. Load Indian Cuisine Database ─────────────────────────────────────────
+@dataclass
+class CatalogEntry:
+    """One parsed catalog plus the file signature it was parsed from."""
+    df: pd.DataFrame
+    index: DishIndex
+    mtime_ns: int
+    size: int
+    version: int
+
+
+class CuisineCatalogCache:
+    """
+    Process-wide cache of parsed cuisine catalogs.
+
+    Entries are keyed on the resolved CSV path and are only re-parsed when the
+    file's mtime or size changes, so a batch of N users parses the CSV once.
+    Every (re)load gets a new `version`, which downstream caches use as part
+    of their keys.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, CatalogEntry] = {}
+        self._next_version = 1
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, csv_path: str | Path) -> CatalogEntry:
+        """Return the cached entry for csv_path, (re)loading it if stale.
+        Raises whatever pd.read_csv / os.stat raise."""
+        import pandas as pd
+
+        key = str(Path(csv_path).resolve())
+        st = os.stat(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        df = pd.read_csv(key)
+        index = dish_index_for(df)
+
+        with self._lock:
+            entry = CatalogEntry(df, index, st.st_mtime_ns, st.st_size, self._next_version)
+            self._next_version += 1
+            self._entries[key] = entry
+        log.info("Loaded %d dishes from cuisine database (v%d)", len(df), entry.version,
+                 extra={"dishes": len(df), "catalog_version": entry.version})
+        return entry
+
+    def version_of(self, df) -> int | None:
+        """Catalog version if df is a frame served by this cache, else None."""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.df is df:
+                    return entry.version
+        return None
+
+    def invalidate(self, csv_path: str | Path | None = None):
+        """Drop one catalog (or all of them when csv_path is None)."""
+        with self._lock:
+            if csv_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(Path(csv_path).resolve()), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+CATALOG_CACHE = CuisineCatalogCache()
+
+
+def invalidate_cuisine_database(csv_path: str | Path | None = None):
+    """Force the next load_cuisine_database() call to re-read the CSV."""
+    CATALOG_CACHE.invalidate(csv_path)
+
+
+def cuisine_cache_stats() -> dict:
+    return CATALOG_CACHE.stats()
+
+
+@timed("catalog_load")
 def load_cuisine_database(csv_path :str | Path = CSV_DEFAULT)->pd.DataFrame | None:
     """
     Load the Indian cuisine database from CSV file
     Expected columns: Name, State/Region, Quantity, Calories (kcal), Protein (g), Carbs (g), Fat (g), Veg/Non-Veg, Meal Type, Ingredients
+
+    The parsed DataFrame is served from CATALOG_CACHE and shared between
+    callers – treat it as read-only.
     """
     try:
-        df = pd.read_csv(csv_path)
-        print(f"Loaded {len(df)} dishes from cuisine database")
-        return df
+        return CATALOG_CACHE.get(csv_path).df
     except FileNotFoundError:
-        print(f"Warning: {csv_path} not found. Using fallback dish generation.")
+        log.warning("%s not found. Using fallback dish generation.", csv_path)
         return None
     except Exception as e:
-        print(f"Error loading cuisine database: {e}")
+        log.error("Error loading cuisine database: %s", e)
         return None
 
+JAIN_EXCLUDE = ['onion', 'garlic', 'potato', 'carrot', 'radish',
+                'beetroot', 'ginger']
+
+
 def filter_dishes_by_preferences(
     df,
     diet_type,
@@ -68,145 +196,292 @@ def filter_dishes_by_preferences(
         • PLUS only those South-Indian rows whose ApprovedForBoth == "yes"
 
     All other logic unchanged.
+
+    Lookups go through the catalog's DishIndex (built once per catalog), so
+    every predicate below is a boolean-array operation.
     """
     if df is None:
+        import pandas as pd
         return pd.DataFrame()
 
-    filtered = df.copy()
+    index = dish_index_for(df)
+    keep = preference_mask(index, diet_type, region, health_conditions, dislikes, lab_values)
+
+    # ── meal-type filter (breakfast / lunch / …) ───────────────────────────
+    if meal_type:
+        keep &= index.meal_mask(meal_type)
+
+    return df[keep]
+
+
+def preference_mask(
+    index,
+    diet_type,
+    region=None,
+    health_conditions=None,
+    dislikes=None,
+    lab_values=None
+):
+    """
+    Boolean row mask for every meal-independent predicate (diet type, Jain
+    exclusions, region, dislikes). Health conditions and lab values are not
+    filtered on – the catalog has no columns for them; they reach the model
+    as prompt rules (build_health_avoidance, build_lab_value_adjustments).
+    """
+    keep = index.all()
 
     # ── 1. diet-type filter ────────────────────────────────────────────────
     if diet_type.lower() == "vegetarian":
-        filtered = filtered[filtered['Veg/Non-Veg'].str.lower() == 'veg']
+        keep &= index.diet_in(['veg'])
     elif diet_type.lower() == "eggetarian":
-        filtered = filtered[filtered['Veg/Non-Veg'].str.lower().isin(['veg', 'eggetarian'])]
+        keep &= index.diet_in(['veg', 'eggetarian'])
     elif diet_type.lower() == "jain":
-        filtered = filtered[filtered['Veg/Non-Veg'].str.lower() == 'veg']
-        jain_exclude = ['onion', 'garlic', 'potato', 'carrot', 'radish',
-                        'beetroot', 'ginger']
-        for ing in jain_exclude:
-            filtered = filtered[~filtered['Ingredients'].str.lower().str.contains(ing, na=False)]
+        keep &= index.diet_in(['veg'])
+        keep &= ~index.exclusion_mask(JAIN_EXCLUDE)
     # (non-vegetarian ⇒ no action)
 
-    # ── 2. meal-type filter (breakfast / lunch / …) ────────────────────────
-    if meal_type:
-        mt = meal_type.lower()
-
-        def _has_meal(cell: str) -> bool:
-            parts = [p.strip().lower() for p in str(cell).split('/')]
-            return mt in parts
-
-        filtered = filtered[filtered['Meal Type'].apply(_has_meal)]
-
-    # ── 3. REGION filter (North / South / Both) ────────────────────────────
+    # ── 2. REGION filter (North / South / Both) ────────────────────────────
     if region:
         r = region.lower()
 
-        north_regex = r"north|punjab|delhi|haryana|uttar ?pradesh|western|maharashtra|gujarat|goa|rajasthaneastern|west ?bengal|odisha|assam|bihar|jharkhand|pan-india|universal"
-        south_regex = r"south|tamil ?nadu|karnataka|kerala|andhra|telangana|pan-india|universal"
-
         if "both" in r:
-            north_mask  = filtered['State/Region'].str.contains(north_regex,
-                                                                case=False, na=False)
+            # keep: north  ∪  ( south ∩ approved )
+            keep &= index.north | (index.south & index.approved_for_both)
 
-            south_mask  = filtered['State/Region'].str.contains(south_regex,
-                                                                case=False, na=False)
+        elif "north" in r:
+            keep &= index.north
 
-            approved    = filtered['ApprovedForBoth'].fillna("").str.lower() == "yes"
+        elif "south" in r:
+            keep &= index.south
 
-            # keep: north  ∪  ( south ∩ approved )
-            keep_mask   = north_mask | (south_mask & approved)
+    # ── 3. dislikes: drop dishes containing any disliked ingredient ───────
+    # whole words only – a dislike of "egg" must not drop eggplant dishes
+    disliked = normalize_dislikes(dislikes)
+    if disliked:
+        keep &= ~index.exclusion_mask(disliked, whole_words=True)
 
-            filtered = filtered[keep_mask]
+    return keep
 
-        elif "north" in r:
-            filtered = filtered[filtered['State/Region']
-                                .str.contains(north_regex, case=False, na=False)]
 
-        elif "south" in r:
-            filtered = filtered[filtered['State/Region']
-                                .str.contains(south_regex, case=False, na=False)]
+NO_DISLIKES = {"", "no", "none", "nil", "na", "n/a", "nothing", "nan"}
 
- 
- 
 
-    # ── 4-6.  health-conditions / dislikes / lab-values filters ────────────
-    # (unchanged – keep your existing code here)
+def normalize_dislikes(dislikes) -> list[str]:
+    """
+    "Brinjal, Karela" / ["brinjal", "No"] → ["brinjal", "karela"]
+    Survey placeholders ("no", "none", …) are dropped.
+    """
+    if not dislikes:
+        return []
+    if isinstance(dislikes, str):
+        dislikes = [dislikes]
+    terms = []
+    for item in dislikes:
+        for part in re.split(r"[;,/]", str(item)):
+            part = part.strip().lower()
+            if part not in NO_DISLIKES and part not in terms:
+                terms.append(part)
+    return terms
+
+
+def filter_dish_positions_for_meals(
+    df,
+    diet_type,
+    meal_types=("breakfast", "lunch", "dinner", "snack"),
+    region=None,
+    health_conditions=None,
+    dislikes=None,
+    lab_values=None
+):
+    """
+    Single-pass variant of filter_dishes_by_preferences for several meals.
+
+    The meal-independent mask is evaluated once and then intersected with
+    each meal's bitmask. Returns {meal_type: positional row numbers into df}
+    so callers can truncate before materialising any rows.
+    """
+    index = dish_index_for(df)
+    keep = preference_mask(index, diet_type, region, health_conditions, dislikes, lab_values)
+    return {mt: np.flatnonzero(keep & index.meal_mask(mt)) for mt in meal_types}
 
-    return filtered
+
+def filter_dishes_for_meals(df, diet_type, meal_types=("breakfast", "lunch", "dinner", "snack"), **filters):
+    """Like filter_dish_positions_for_meals but returns one DataFrame per meal."""
+    if df is None:
+        import pandas as pd
+        return {mt: pd.DataFrame() for mt in meal_types}
+    positions = filter_dish_positions_for_meals(df, diet_type, meal_types, **filters)
+    return {mt: df.iloc[pos] for mt, pos in positions.items()}
 
 
 def df_to_compact_dish_list(filtered_df):
     """
     Convert pre-filtered DataFrame to ultra-compact dish representation
     Only essential nutrition data - all filtering already done
+    (name/cal/p/c/f/quantity, converted column-wise rather than per row)
     """
-    dishes = []
-    for _, row in filtered_df.iterrows():
-        dishes.append({
-            'name': row['Name'],
-            'cal': int(row['Calories (kcal)']),
-            'p': float(row['Protein (g)']),
-            'c': float(row['Carbs (g)']),
-            'f': float(row['Fat (g)']),
-            'quantity' : row.get('Quantity (g)', '')
-            # All filtering criteria already applied - no need for region/ingredients
-        })
-    return dishes
+    if filtered_df is None or filtered_df.empty:
+        return []
+    return compact_records(compact_columns(filtered_df))
+
+class DishSelectionCache:
+    """
+    Bounded LRU of ready-made compact dish selections.
 
-def create_dish_selection_from_csv(df, diet_type, region=None, health_conditions=None, dislikes=None, lab_values=None):
+    Keyed on selection_signature() plus the catalog version, so users who
+    share a filter profile (very common in a corporate batch) skip
+    filtering and compaction entirely, and a catalog reload never serves
+    stale dishes.
+    """
+
+    def __init__(self, maxsize: int | None = None):
+        self._maxsize = maxsize         # None → DISH_SELECTION_CACHE_SIZE (256) on first use
+        self._lock = threading.Lock()
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self) -> int:
+        if self._maxsize is None:
+            self._maxsize = int(env("DISH_SELECTION_CACHE_SIZE", "256"))
+        return self._maxsize
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+SELECTION_CACHE = DishSelectionCache()
+
+
+def dish_selection_cache_stats() -> dict:
+    return SELECTION_CACHE.stats()
+
+
+def selection_signature(diet_type, region=None, health_conditions=None, dislikes=None, lab_values=None) -> tuple:
+    """Order/case-insensitive key for everything that shapes a dish selection."""
+    def _norm(v):
+        return str(v).strip().lower()
+
+    conditions = health_conditions or []
+    if isinstance(conditions, str):
+        conditions = [conditions]
+    return (
+        _norm(diet_type),
+        _norm(region) if region else "",
+        tuple(sorted({_norm(c) for c in conditions if _norm(c)})),
+        tuple(sorted(normalize_dislikes(dislikes))),
+        tuple(sorted((_norm(k), _norm(v)) for k, v in (lab_values or {}).items())),
+    )
+
+
+@timed("filtering")
+def create_dish_selection_from_csv(df, diet_type, region=None, health_conditions=None, dislikes=None, lab_values=None,
+                                   token_budget=None, encoding=None):
     """
     Create a curated list of dishes from the database with COMPREHENSIVE filtering
     Then convert to compact format for AI processing
+
+    token_budget: prompt tokens available for the dish lists. When given,
+    the fixed MAX_DISHES_PER_MEAL cap is replaced by trim_to_budget(), which
+    counts the actual rows in the given prompt encoding.
+
+    Results for catalogs served by load_cuisine_database() are memoised in
+    SELECTION_CACHE; the returned dict/lists are fresh, the dish dicts are
+    shared and must not be mutated.
     """
     if df is None:
         return None
+
+    encoding = encoding or prompt_encoding()
+    catalog_version = CATALOG_CACHE.version_of(df)
+    cache_key = None
+    if catalog_version is not None:
+        budget_key = (token_budget, encoding) if token_budget else (None, None)
+        cache_key = (catalog_version,) + budget_key + selection_signature(
+            diet_type, region, health_conditions, dislikes, lab_values
+        )
+        cached = SELECTION_CACHE.get(cache_key)
+        if cached is not None:
+            log.debug("Dish selection cache hit (%d dishes)", sum(len(d) for d in cached.values()))
+            return {meal: list(dishes) for meal, dishes in cached.items()}
+
+    log.debug("Filtering %d dishes: diet_type=%s, region=%s, health_conditions=%s, dislikes=%s",
+              len(df), diet_type, region, health_conditions, dislikes)
     
-    print(f"Starting with {len(df)} total dishes")
-    print(f"Applying filters: diet_type={diet_type}, region={region}")
-    print(f"Health conditions: {health_conditions}")
-    print(f"Dislikes: {dislikes}")
-    
-    # Apply comprehensive filtering for each meal type
-    breakfast_dishes = filter_dishes_by_preferences(df, diet_type, "breakfast", region, health_conditions, dislikes, lab_values)
-    lunch_dishes = filter_dishes_by_preferences(df, diet_type, "lunch", region, health_conditions, dislikes, lab_values)
-    dinner_dishes = filter_dishes_by_preferences(df, diet_type, "dinner", region, health_conditions, dislikes, lab_values)
-    snack_dishes = filter_dishes_by_preferences(df, diet_type, "snack", region, health_conditions, dislikes, lab_values)
-    
-    print(f"After filtering - Breakfast: {len(breakfast_dishes)}, Lunch: {len(lunch_dishes)}, Dinner: {len(dinner_dishes)}, Snacks: {len(snack_dishes)}")
+    # Apply comprehensive filtering for all meal types in one pass
+    meal_types = ("breakfast", "lunch", "dinner", "snack")
+    positions = filter_dish_positions_for_meals(
+        df, diet_type, meal_types, region, health_conditions, dislikes, lab_values
+    )
+
+    log.debug("After filtering - Breakfast: %d, Lunch: %d, Dinner: %d, Snacks: %d",
+              *(len(positions[meal]) for meal in meal_types))
     
     # Optional: Limit dishes per meal type to control token usage
     MAX_DISHES_PER_MEAL = 30  # Adjust based on your token budget
     
-    if len(breakfast_dishes) > MAX_DISHES_PER_MEAL:
-        breakfast_dishes = breakfast_dishes.head(MAX_DISHES_PER_MEAL)
-        print(f"Limited breakfast dishes to {MAX_DISHES_PER_MEAL}")
-    
-    if len(lunch_dishes) > MAX_DISHES_PER_MEAL:
-        lunch_dishes = lunch_dishes.head(MAX_DISHES_PER_MEAL)
-        print(f"Limited lunch dishes to {MAX_DISHES_PER_MEAL}")
-    
-    if len(dinner_dishes) > MAX_DISHES_PER_MEAL:
-        dinner_dishes = dinner_dishes.head(MAX_DISHES_PER_MEAL)
-        print(f"Limited dinner dishes to {MAX_DISHES_PER_MEAL}")
-    
-    if len(snack_dishes) > MAX_DISHES_PER_MEAL:
-        snack_dishes = snack_dishes.head(MAX_DISHES_PER_MEAL)
-        print(f"Limited snack dishes to {MAX_DISHES_PER_MEAL}")
+    if not token_budget:
+        for meal in meal_types:
+            if len(positions[meal]) > MAX_DISHES_PER_MEAL:
+                positions[meal] = positions[meal][:MAX_DISHES_PER_MEAL]
+                log.debug("Limited %s dishes to %d", meal, MAX_DISHES_PER_MEAL)
     
     # Convert to compact dictionaries for AI processing (all filtering already done)
+    index = dish_index_for(df)
     dish_selection = {
-        'breakfast': df_to_compact_dish_list(breakfast_dishes),
-        'lunch': df_to_compact_dish_list(lunch_dishes),
-        'dinner': df_to_compact_dish_list(dinner_dishes),
-        'snack': df_to_compact_dish_list(snack_dishes)
+        meal: index.compact_dishes(positions[meal])
+        for meal in meal_types
     }
+
+    if token_budget:
+        dish_selection = trim_to_budget(dish_selection, token_budget, encoding)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Token budget %d: kept %s", token_budget, ", ".join(
+                f"{meal} {len(dish_selection[meal])}/{len(positions[meal])}" for meal in meal_types))
     
     # Validate we have enough dishes
     total_dishes = sum(len(dishes) for dishes in dish_selection.values())
-    print(f"Final compact dish selection: {total_dishes} dishes total")
+    log.info("Dish selection: %d dishes", total_dishes,
+             extra={"dishes": total_dishes, **{meal: len(dish_selection[meal]) for meal in meal_types}})
     
     if total_dishes < 10:
-        print("WARNING: Very few dishes after filtering. Consider relaxing some constraints.")
+        log.warning("Very few dishes after filtering (%d). Consider relaxing some constraints.", total_dishes)
+
+    if cache_key is not None:
+        SELECTION_CACHE.put(cache_key, {meal: list(dishes) for meal, dishes in dish_selection.items()})
     
     return dish_selection
 
@@ -262,10 +537,12 @@ def build_lab_value_adjustments(lab_values):
     return "\n".join(lab_lines) if lab_lines else "- None."
 
 def build_meal_distribution_and_diet_text(diet_type, meal_freq, non_veg):
-    snack_ct = max(0, meal_freq - 3)
+    splits = MEAL_SPLITS.get(int(meal_freq))
+    if splits is None:
+        raise ValueError(f"Unsupported meal frequency: {meal_freq}")
     dist_text = (
-        f"Breakfast:20–25%, Lunch:30–35%, Dinner:30–35%, "
-        f"Snacks:5–10% ({snack_ct} snack{'s' if snack_ct!=1 else ''}); redistribute if skipped."
+        ", ".join(f"{meal}:{share:.0%}" for meal, share in splits.items())
+        + "; redistribute if skipped."
     )
     dt = diet_type.lower()
     if dt == "non-vegetarian":
@@ -297,31 +574,11 @@ def build_region_text(region):
         return "Mixed cuisine."
 
 def clean_json_response(raw_text):
-    """Clean and fix common JSON formatting issues"""
-    # Strip markdown code fences
-    if raw_text.startswith("```"):
-        lines = raw_text.splitlines()
-        if len(lines) > 2:
-            raw_text = "\n".join(lines[1:-1])
-    
-    # Remove comment lines
-    clean_lines = []
-    for line in raw_text.splitlines():
-        stripped = line.strip()
-        if not stripped.startswith(("//", "/*", "*/")):
-            clean_lines.append(line)
-    
-    text = "\n".join(clean_lines)
-    
-    # Fix trailing commas - common GPT issue
-    import re
-    # Remove trailing commas before closing brackets/braces
-    text = re.sub(r',(\s*[}\]])', r'\1', text)
-    
-    # Remove trailing commas before newlines followed by closing brackets
-    text = re.sub(r',(\s*\n\s*[}\]])', r'\1', text)
-    
-    return text
+    """Clean and fix common JSON formatting issues (see ai_engine.json_repair)"""
+    try:
+        return repair_json(raw_text).text
+    except JSONRepairError:
+        return (raw_text or "").strip()
 
 def validate_calorie_targets(plan, target_calories):
     """Validate that each day meets the calorie target"""
@@ -368,80 +625,120 @@ def convert_non_veg_days(avoid_non_veg_days):
     
     return non_veg_days
 
-def assemble_compact_prompt(payload, dish_selection, target_calories):
-    """
-    Create ultra-compact prompt to minimize token usage
-    Adapts to meal frequency (3, 4, 5 meals/day)
-    """
+# Share of the daily target per meal, in the order meals appear in a day
+PROMPT_ENCODINGS = ("json", "table")
+# Overrides of the PROMPT_ENCODING / DISH_TOKEN_BUDGET env settings; None →
+# read the environment on use (see prompt_encoding(), dish_token_budget()).
+PROMPT_ENCODING: str | None = None      # dish encoding in the compact prompt
+# Optional cap on the dish lists' share of the prompt (tokens); replaces the
+# fixed 30-dishes-per-meal limit when set (0 = no cap).
+DISH_TOKEN_BUDGET: int | None = None
 
-    profile = payload.get("user_profile", {})
-    diet_type = profile.get("Diet type", "Mixed")
-    meal_freq = int(profile.get("Meal frequency in a day", 3))
 
+def prompt_encoding() -> str:
+    return PROMPT_ENCODING or env("PROMPT_ENCODING", "json")
 
-    # Decide meal structure
-    meals = ["Breakfast", "Lunch", "Dinner"]
-    snack_count = 0
-
-    if meal_freq == 4:
-        meals.insert(2, "Snack")
-        snack_count = 1
-    elif meal_freq == 5:
-        meals.insert(2, "Snack1")
-        meals.insert(4, "Snack2")
-        snack_count = 2
-
-    # Correct calorie distribution
-    if meal_freq == 3:
-        b_target = int(target_calories * 0.25)
-        l_target = int(target_calories * 0.35)
-        d_target = int(target_calories * 0.40)
-        s_targets = []
-    elif meal_freq == 4:
-        b_target = int(target_calories * 0.22)
-        l_target = int(target_calories * 0.33)
-        d_target = int(target_calories * 0.33)
-        s_targets = [int(target_calories * 0.12)]
-    elif meal_freq == 5:
-        b_target = int(target_calories * 0.20)
-        l_target = int(target_calories * 0.30)
-        d_target = int(target_calories * 0.30)
-        s_targets = [int(target_calories * 0.10), int(target_calories * 0.10)]
-    else:
+
+def dish_token_budget() -> int | None:
+    budget = DISH_TOKEN_BUDGET if DISH_TOKEN_BUDGET is not None else int(env("DISH_TOKEN_BUDGET", "0"))
+    return budget or None
+
+
+MEAL_SPLITS = {
+    3: {"Breakfast": 0.25, "Lunch": 0.35, "Dinner": 0.40},
+    4: {"Breakfast": 0.22, "Lunch": 0.33, "Snack": 0.12, "Dinner": 0.33},
+    5: {"Breakfast": 0.20, "Lunch": 0.30, "Snack1": 0.10, "Dinner": 0.30, "Snack2": 0.10},
+}
+
+
+def meal_calorie_targets(target_calories, meal_freq):
+    """{meal name: kcal} for a 3/4/5-meal day, e.g. {"Breakfast": 450, ...}"""
+    splits = MEAL_SPLITS.get(int(meal_freq))
+    if splits is None:
         raise ValueError(f"Unsupported meal frequency: {meal_freq}")
+    return {meal: int(target_calories * share) for meal, share in splits.items()}
 
-    print(f"Meal structure: {meals}")
-    print(f"Calories => B:{b_target}, L:{l_target}, D:{d_target}" + (
-        f", S:{s_targets}" if s_targets else ""))
 
-    # Compose meal blocks
+def meal_target_lines(meal_targets):
+    """The "- Breakfast: 450 kcal" block shared by every plan prompt."""
+    return "\n".join(f"- {meal}: {kcal} kcal" for meal, kcal in meal_targets.items())
+
+
+def _dish_format(encoding):
+    return ("one row per dish, columns as in each block's header" if encoding == "table"
+            else "name,cal,p,c,f,quantity")
+
+
+def _compact_meal_blocks(dish_selection, meals, encoding, shift=0.0):
+    """Dish list per meal in the prompt encoding. shift rotates every list by
+    that fraction of its length (so parallel requests see different heads)."""
     meal_dish_blocks = []
     for meal in meals:
         meal_key = meal.lower().replace("1", "").replace("2", "")  # normalize snack1/snack2
         dishes = dish_selection.get(meal_key, [])
-        block = f"{meal.upper()} ({len(dishes)} options):\n" + json.dumps(dishes, separators=(',', ':'))
+        if shift and dishes:
+            k = int(len(dishes) * shift) % len(dishes)
+            dishes = dishes[k:] + dishes[:k]
+        if encoding == "table":
+            block = f"{meal.upper()} ({len(dishes)} options):\n{TABLE_HEADER}\n" + "\n".join(map(dish_row, dishes))
+        else:
+            block = f"{meal.upper()} ({len(dishes)} options):\n[" + ",".join(map(dish_json, dishes)) + "]"
         meal_dish_blocks.append(block)
+    return "\n\n".join(meal_dish_blocks)
 
-    meal_blocks = "\n\n".join(meal_dish_blocks)
 
-    # Generate JSON structure for GPT response
+def _compact_day_json(meals, day_number):
     meal_json_fields = []
     for meal in meals:
         meal_json_fields.append(f'"{meal}":{{"Dish1":{{"name":"...","quantity":"...","calories":X,"protein":X,"carbs":X,"fats":X}}}}')
+    return "{\n" + f'"Day":"Day {day_number}",\n' + ",\n".join(meal_json_fields) + "\n}"
+
+
+def assemble_compact_prompt(payload, dish_selection, target_calories, encoding=None):
+    """
+    Create ultra-compact prompt to minimize token usage
+    Adapts to meal frequency (3, 4, 5 meals/day)
+
+    encoding: "json"  – each meal block is a JSON array of dish objects
+              "table" – one header line per block, then one "|" row per dish
+                        (keys are not repeated per dish; fewer tokens)
+    Defaults to prompt_encoding().
+    """
+    encoding = encoding or prompt_encoding()
+    if encoding not in PROMPT_ENCODINGS:
+        raise ValueError(f"Unknown prompt encoding {encoding!r}; expected one of {PROMPT_ENCODINGS}")
+
+    profile = payload.get("user_profile", {})
+    diet_type = profile.get("Diet type", "Mixed")
+    meal_freq = int(profile.get("Meal frequency in a day", 3))
+
+
+    # Decide meal structure and per-meal calorie targets
+    meal_targets = meal_calorie_targets(target_calories, meal_freq)
+    meals = list(meal_targets)
 
-    daily_json = "{\n" + '"Day":"Day 1",\n' + ",\n".join(meal_json_fields) + "\n}"
+    b_target = meal_targets["Breakfast"]
+    l_target = meal_targets["Lunch"]
+    d_target = meal_targets["Dinner"]
+    s_targets = [kcal for meal, kcal in meal_targets.items() if meal.startswith("Snack")]
+
+    log.debug("Meal structure: %s; calories => B:%s, L:%s, D:%s, S:%s",
+              meals, b_target, l_target, d_target, s_targets)
+
+    # Compose meal blocks
+    meal_blocks = _compact_meal_blocks(dish_selection, meals, encoding)
+
+    # Generate JSON structure for GPT response
+    daily_json = _compact_day_json(meals, 1)
 
     # Generate target block for prompt
-    target_block = f"- Breakfast: {b_target} kcal\n- Lunch: {l_target} kcal\n"
-    if snack_count == 1:
-        target_block += f"- Snack: {s_targets[0]} kcal\n"
-    elif snack_count == 2:
-        target_block += f"- Snack1: {s_targets[0]} kcal\n- Snack2: {s_targets[1]} kcal\n"
-    target_block += f"- Dinner: {d_target} kcal"
+    target_block = meal_target_lines(meal_targets)
+
+    dish_format = _dish_format(encoding)
 
     prompt = f"""Create a 7-day diet plan. Each day MUST total exactly {target_calories} kcal.
 
-AVAILABLE DISHES (name,cal,p,c,f,quantity):
+AVAILABLE DISHES ({dish_format}):
 
 {meal_blocks}
 
@@ -480,7 +777,57 @@ Each day must total exactly {target_calories} kcal.
     return prompt
 
 
-def assemble_prompt(payload, dist_text, freq_text, sub_text, skip_text, safe_text, variety_text, avoid_text, lab_text, hydration_text, diet_text, region_text, dish_selection=None):
+def assemble_day_prompt(payload, dish_selection, target_calories, day_numbers, encoding=None, context="",
+                        meal_targets=None):
+    """
+    Compact prompt for a subset of the week's days (parallel / targeted
+    generation). Dish lists are rotated per day group so concurrent requests
+    do not all start from the same dishes; context is extra rule text, e.g.
+    dishes already used elsewhere in the week. meal_targets, when given,
+    replaces the split derived from the payload's meal frequency.
+    """
+    encoding = encoding or prompt_encoding()
+    if meal_targets is None:
+        meal_freq = int(payload.get("user_profile", {}).get("Meal frequency in a day", 3))
+        meal_targets = meal_calorie_targets(target_calories, meal_freq)
+    meals = list(meal_targets)
+
+    day_numbers = list(day_numbers)
+    label = " and ".join(f"Day {n}" for n in day_numbers)
+    meal_blocks = _compact_meal_blocks(dish_selection, meals, encoding, shift=(day_numbers[0] - 1) / 7)
+    target_block = meal_target_lines(meal_targets)
+    days_json = ",\n    ".join(_compact_day_json(meals, n) for n in day_numbers)
+
+    return f"""Create {label} of a 7-day diet plan. Each day MUST total exactly {target_calories} kcal.
+
+AVAILABLE DISHES ({_dish_format(encoding)}):
+
+{meal_blocks}
+
+TARGET CALORIES PER MEAL:
+{target_block}
+
+RULES:
+- Combine 2‒4 dishes per meal if needed to reach the calorie target.
+- You can scale any dish up or down (e.g., 1.5x or 2x quantity).
+- Always update the "quantity" field to reflect the new portion, using the same units you see in the Quantity column (e.g., "350 g", "2 rotis").
+- ✱ Never write the word "serving(s)"; use real-world units only. ✱
+- Use the exact nutrition values provided and scale them accurately.
+- You must hit the calorie target for each meal as closely as possible.
+- **Never use a dish twice on the same day or on two consecutive days.**
+- **Do NOT include a dish if the scaled amount would be < 25 g / 25 ml / ½ roti / ½ piece.**
+{context}- Return valid JSON (no extra text).
+
+JSON FORMAT:
+{{
+  "7DayPlan": [
+    {days_json}
+  ]
+}}
+"""
+
+
+def assemble_prompt(payload, dist_text, freq_text, sub_text, skip_text, safe_text, variety_text, avoid_text, lab_text, hydration_text, diet_text, region_text, dish_selection=None, encoding=None):
     profile = payload.get("user_profile", {})
     calorie_goal = payload.get("calorie_goal", "1500 kcal/day")
     target_calories = int(calorie_goal.split()[0])
@@ -489,48 +836,18 @@ def assemble_prompt(payload, dist_text, freq_text, sub_text, skip_text, safe_tex
 
     diet_type = profile.get("Diet type", "Mixed")
 
-    # Decide meal structure
-    meals = ["Breakfast", "Lunch", "Dinner"]
-    snack_count = 0
-
-    if meal_freq == 4:
-        meals.insert(2, "Snack")
-        snack_count = 1
-    elif meal_freq == 5:
-        meals.insert(2, "Snack1")
-        meals.insert(4, "Snack2")
-        snack_count = 2
-
-    # Correct calorie distribution
-    if meal_freq == 3:
-        b_target = int(target_calories * 0.25)
-        l_target = int(target_calories * 0.35)
-        d_target = int(target_calories * 0.40)
-        s_targets = []
-    elif meal_freq == 4:
-        b_target = int(target_calories * 0.22)
-        l_target = int(target_calories * 0.33)
-        d_target = int(target_calories * 0.33)
-        s_targets = [int(target_calories * 0.12)]
-    elif meal_freq == 5:
-        b_target = int(target_calories * 0.20)
-        l_target = int(target_calories * 0.30)
-        d_target = int(target_calories * 0.30)
-        s_targets = [int(target_calories * 0.10), int(target_calories * 0.10)]
-    else:
-        raise ValueError("Unsupported meal frequency.")
+    # Same split as the compact and per-day prompts
+    meal_targets = meal_calorie_targets(target_calories, meal_freq)
+    snack_count = meal_freq - 3
+    d_target = meal_targets["Dinner"]
+    s_targets = [kcal for meal, kcal in meal_targets.items() if meal.startswith("Snack")]
 
     # If we have dish selection from CSV, use compact prompt
     if dish_selection:
-        return assemble_compact_prompt(payload, dish_selection, target_calories)
+        return assemble_compact_prompt(payload, dish_selection, target_calories, encoding)
 
     # Fallback to full prompt
-    meal_targets_text = f"- Breakfast: {b_target} kcal\n- Lunch: {l_target} kcal\n"
-    if snack_count == 1:
-        meal_targets_text += f"- Snack: {s_targets[0]} kcal\n"
-    elif snack_count == 2:
-        meal_targets_text += f"- Snack1: {s_targets[0]} kcal\n- Snack2: {s_targets[1]} kcal\n"
-    meal_targets_text += f"- Dinner: {d_target} kcal"
+    meal_targets_text = meal_target_lines(meal_targets)
 
     payload_str = json.dumps(payload, indent=2)
 
@@ -592,72 +909,509 @@ Each day must total exactly {target_calories} kcal.
 """
     return prompt
 
-def call_openai_with_retry(prompt: str, model: str, target_calories: int = 1667, max_retries: int = 5):
-    """Retry wrapper for ChatCompletion.create with exponential backoff."""
-    last_clean = None
+CHAT_SYSTEM_PROMPT = (
+    "You are a precision dietitian. Use only the given dishes. "
+    "You MUST reach exact calorie targets by combining and scaling dishes as needed. "
+    "Do NOT underdeliver on calories."
+)
 
-    for attempt in range(1, max_retries + 1):
+
+DEFAULT_MAX_TOKENS = 8000
+
+
+def _chat_request(prompt: str, model: str, max_tokens: int = DEFAULT_MAX_TOKENS) -> dict:
+    """Keyword arguments for ChatCompletion.create / acreate."""
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.3,
+        max_tokens=max_tokens,
+    )
+
+
+def _retry_delay(err: Exception, attempt: int) -> float | None:
+    """Seconds to back off before the next attempt, or None to give up."""
+    from openai.error import APIConnectionError, OpenAIError, RateLimitError, Timeout as APITimeoutError
+
+    if isinstance(err, RateLimitError):
+        incr("rate_limited")
+        wait = (2 ** attempt) + random.uniform(0, 1)
+        log.warning("Attempt %d: rate-limited, sleeping %.1fs", attempt, wait,
+                    extra={"attempt": attempt, "wait_s": round(wait, 2)})
+        get_rate_limiter().penalize(wait)
+        return wait
+    incr("api_errors", kind=type(err).__name__)
+    if isinstance(err, (APITimeoutError, APIConnectionError)):
+        log.warning("Attempt %d: transient error: %s", attempt, err, extra={"attempt": attempt})
+        return (2 ** attempt) * 0.5
+    if isinstance(err, OpenAIError):
+        log.error("Attempt %d: unrecoverable OpenAI error: %s", attempt, err, extra={"attempt": attempt})
+    else:
+        log.error("Attempt %d: unexpected error: %s", attempt, err, extra={"attempt": attempt})
+    return None
+
+
+def _cached_plan(request: dict, use_cache: bool):
+    """(cache key or None when bypassed, cached plan or None)."""
+    cache = get_plan_cache()
+    if not (use_cache and cache.enabled):
+        return None, None
+    key = request_key(request)
+    plan = cache.get(key)
+    if plan is not None:
+        log.info("Plan cache hit (%s) – skipping API call", key[:12])
+        incr("plan_cache_hits")
+    return key, plan
+
+
+def _store_plan(key: str | None, plan: dict, target_calories: int):
+    """Cache an accepted plan, unless it still has days off target (a
+    partial / fallback plan is returned once, but the next run retries)."""
+    if key is None:
+        return
+    if _failing_days(plan, target_calories):
+        log.debug("Plan has days off target – not cached")
+        return
+    get_plan_cache().put(key, plan)
+
+
+def _stream_monitor(target_calories: int, decode) -> StreamMonitor:
+    return StreamMonitor(target_calories, loads=loads_lenient,
+                         decode=decode)
+
+
+def _stream_delta(chunk: dict, monitor: StreamMonitor) -> dict | None:
+    """Feed one stream chunk to monitor; returns its `usage` block, if any."""
+    choices = chunk.get("choices") or []
+    delta = choices[0].get("delta", {}).get("content") if choices else None
+    if delta:
+        monitor.feed(delta)
+    return chunk.get("usage")
+
+
+def _record_stream_usage(usage: dict | None, monitor: StreamMonitor, prompt_tokens: int):
+    """Streams carry no usage unless the provider appends it – count what arrived."""
+    if not usage:
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": count_tokens(monitor.parser.text)}
+    record_usage(usage, prompt_tokens)
+
+
+def _stream_completion(request: dict, monitor: StreamMonitor, prompt_tokens: int = 0) -> str:
+    """Run a streamed completion through monitor; returns the full text.
+    Usage is recorded even when the monitor aborts the stream."""
+    chunks = get_llm_backend().create(stream=True, **request)
+    usage = None
+    try:
+        for chunk in chunks:
+            usage = _stream_delta(chunk, monitor) or usage
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()                     # stop reading if we bailed out early
+        _record_stream_usage(usage, monitor, prompt_tokens)
+    return monitor.finish()
+
+
+async def _astream_completion(request: dict, monitor: StreamMonitor, prompt_tokens: int = 0) -> str:
+    """asyncio version of _stream_completion."""
+    chunks = await get_llm_backend().acreate(stream=True, **request)
+    usage = None
+    try:
+        async for chunk in chunks:
+            usage = _stream_delta(chunk, monitor) or usage
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        _record_stream_usage(usage, monitor, prompt_tokens)
+    return monitor.finish()
+
+
+def _min_good_days(expected_days: int) -> int:
+    """Days that must be within range to accept a plan: 4 of 7, pro rata."""
+    return max(1, math.ceil(expected_days * 4 / 7))
+
+
+def _plan_from_raw(raw: str, attempt: int, target_calories: int,
+                   dish_selection: dict | None, meal_targets: dict | None,
+                   decode: Callable[[dict], dict] | None = None, expected_days: int = 7):
+    """Parse, validate and locally repair one completion.
+    decode turns a non-plan response format (e.g. dish IDs) into a plan.
+    Returns (plan or None, failing day indices, cleaned text); plan is None
+    only when the response cannot be used at all."""
+    try:
+        with span("json_parse"):
+            parsed = repair_json(raw)
+    except JSONDecodeError as e:
+        log.warning("Attempt %d: JSON decode error: %s", attempt, e, extra={"attempt": attempt})
+        incr("decode_failures", reason="json")
+        return None, [], (raw or "").strip()
+    plan, clean = parsed.value, parsed.text
+    if parsed.repairs:
+        log.info("Attempt %d: repaired JSON: %s%s", attempt, "; ".join(parsed.repairs[:5]),
+                 f" (+{len(parsed.repairs) - 5} more)" if len(parsed.repairs) > 5 else "",
+                 extra={"attempt": attempt, "repairs": len(parsed.repairs)})
+
+    if decode is not None:
         try:
-            resp = openai.ChatCompletion.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a precision dietitian. Use only the given dishes. "
-                            "You MUST reach exact calorie targets by combining and scaling dishes as needed. "
-                            "Do NOT underdeliver on calories."
-                        ),
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.3,
-                max_tokens=8000,
-            )
-            raw = resp["choices"][0]["message"]["content"].strip()
-        except RateLimitError:
-            wait = (2 ** attempt) + random.uniform(0, 1)
-            print(f"Attempt {attempt}: rate‑limited, sleeping {wait:.1f}s…")
-            time.sleep(wait)
+            plan = decode(plan)
+        except ValueError as e:
+            log.warning("Attempt %d: could not decode response: %s", attempt, e, extra={"attempt": attempt})
+            incr("decode_failures", reason="format")
+            return None, [], clean
+
+    days = plan.get("7DayPlan") if isinstance(plan, dict) else None
+    if not (isinstance(days, list) and len(days) == expected_days):
+        log.warning("Attempt %d: invalid structure (days=%s)", attempt, type(days).__name__,
+                    extra={"attempt": attempt})
+        incr("decode_failures", reason="structure")
+        return None, [], clean
+
+    with span("validation"):
+        failing = _failing_days(plan, target_calories)
+        log.info("Attempt %d: %d/%d days within ±150 kcal", attempt, expected_days - len(failing), expected_days,
+                 extra={"attempt": attempt, "days_ok": expected_days - len(failing)})
+        if failing:
+            plan, touched = repair_plan(plan, dish_selection, target_calories, meal_targets)
+            failing = _failing_days(plan, target_calories)
+            log.info("Attempt %d: repaired %d day(s) locally → %d/%d within range",
+                     attempt, touched, expected_days - len(failing), expected_days,
+                     extra={"attempt": attempt, "days_ok": expected_days - len(failing)})
+    return plan, failing, clean
+
+
+def _failing_days(plan: dict, target_calories: int) -> list[int]:
+    return [i for i, v in enumerate(validate_calorie_targets(plan, target_calories)) if not v["within_range"]]
+
+
+def _used_dishes_context(plan_days: list[dict], failing: list[int]) -> str:
+    """Rule lines telling a follow-up request which dishes the kept days use."""
+    uses: dict[str, int] = {}
+    by_day: dict[int, set[str]] = {}
+    for i, day in enumerate(plan_days):
+        if i in failing:
             continue
-        except (APITimeoutError, APIConnectionError) as e:
-            print(f"Attempt {attempt}: transient error: {e}")
-            time.sleep((2 ** attempt) * 0.5)
+        names = {str(d.get("name")) for meal, dishes in day.items() if meal != "Day" and isinstance(dishes, dict)
+                 for d in dishes.values() if isinstance(d, dict) and d.get("name")}
+        by_day[i] = names
+        for name in names:
+            uses[name] = uses.get(name, 0) + 1
+
+    lines = []
+    maxed = sorted(name for name, n in uses.items() if n >= 2)
+    if maxed:
+        lines.append("- Already used twice this week – do NOT use: " + ", ".join(maxed) + ".")
+    for i in failing:
+        adjacent = sorted(by_day.get(i - 1, set()) | by_day.get(i + 1, set()))
+        if adjacent:
+            lines.append(f"- Day {i + 1} must not use (served on a neighbouring day): " + ", ".join(adjacent) + ".")
+    return "".join(line + "\n" for line in lines)
+
+
+class _PlanAttempts:
+    """
+    Attempt bookkeeping shared by call_openai_with_retry and its async twin.
+
+    The first request asks for the whole plan. If days are still off target
+    after local repair, the good days are kept and later attempts only ask
+    for the failing days (assemble_day_prompt, with the dishes the kept days
+    already use as context); their answers are merged back and revalidated.
+    A stream cut short by StreamAborted is handled the same way: the days
+    that arrived intact are kept and only the rest are asked for again.
+    """
+
+    def __init__(self, prompt, model, target_calories, dish_selection, meal_targets,
+                 decode, max_tokens, expected_days):
+        self.model = model
+        self.target = target_calories
+        self.dish_selection = dish_selection
+        self.meal_targets = meal_targets
+        self.decode = decode
+        self.expected_days = expected_days
+        self.request = _chat_request(prompt, model, max_tokens)
+        self.partial: dict | None = None      # plan whose failing days are being regenerated
+        self.failing: list[int] = []
+        self.last_clean = None
+
+    def _can_target(self) -> bool:
+        return (self.decode is None and self.expected_days == 7
+                and bool(self.dish_selection) and bool(self.meal_targets))
+
+    def next_request(self) -> tuple[dict, int]:
+        """(chat request, days it should return) for the next attempt."""
+        if self.partial is None:
+            return self.request, self.expected_days
+        days = [i + 1 for i in self.failing]
+        prompt = assemble_day_prompt(
+            None, self.dish_selection, self.target, days, meal_targets=self.meal_targets,
+            context=_used_dishes_context(self.partial["7DayPlan"], self.failing),
+        )
+        return _chat_request(prompt, self.model, min(DEFAULT_MAX_TOKENS, DAY_MAX_TOKENS * len(days))), len(days)
+
+    def take(self, raw: str, attempt: int, n_days: int) -> dict | None:
+        """Digest one completion; returns the plan once it can be accepted."""
+        plan, failing, self.last_clean = _plan_from_raw(
+            raw, attempt, self.target, self.dish_selection, self.meal_targets,
+            self.decode if self.partial is None else None, n_days,
+        )
+        if plan is None:
+            return None
+
+        if self.partial is not None:
+            merged = list(self.partial["7DayPlan"])
+            for i, day in zip(self.failing, plan["7DayPlan"]):
+                merged[i] = {"Day": f"Day {i + 1}", **{k: v for k, v in day.items() if k != "Day"}}
+            merged, swaps = enforce_weekly_rules(merged, self.dish_selection)
+            plan = {**self.partial, "7DayPlan": merged, "Summary": plan_summary(merged)}
+            failing = _failing_days(plan, self.target)
+            log.info("Attempt %d: merged %d regenerated day(s) (%d swap(s)) → %d/7 within range",
+                     attempt, len(self.failing), swaps, 7 - len(failing), extra={"attempt": attempt})
+
+        if not failing:
+            return plan
+        if not self._can_target():
+            return plan if self.expected_days - len(failing) >= _min_good_days(self.expected_days) else None
+        if len(failing) == self.expected_days:
+            log.info("Attempt %d: no day within range – requesting the whole plan again", attempt,
+                     extra={"attempt": attempt})
+            return None
+        log.info("Attempt %d: keeping %d good day(s), regenerating days %s only",
+                 attempt, self.expected_days - len(failing), [i + 1 for i in failing],
+                 extra={"attempt": attempt})
+        self.partial, self.failing = plan, failing
+        return None
+
+    def take_aborted(self, days: list[dict | None], attempt: int):
+        """Keep the usable days of an aborted stream (None = bad) for the next attempt."""
+        if not self._can_target():
+            return
+        if self.partial is None:
+            slots = list(range(self.expected_days))
+            merged = [{"Day": f"Day {i + 1}"} for i in slots]
+        else:
+            slots = self.failing
+            merged = list(self.partial["7DayPlan"])
+        kept = 0
+        for i, day in zip(slots, days):
+            if day is not None:
+                merged[i] = {"Day": f"Day {i + 1}", **{k: v for k, v in day.items() if k != "Day"}}
+                kept += 1
+        if not kept:
+            return
+        plan = {**(self.partial or {}), "7DayPlan": merged}
+        plan, _ = repair_plan(plan, self.dish_selection, self.target, self.meal_targets)
+        plan["Summary"] = plan_summary(plan["7DayPlan"])
+        failing = _failing_days(plan, self.target)
+        if not failing or len(failing) == self.expected_days:
+            return
+        log.info("Attempt %d: stream aborted – keeping %d good day(s), regenerating days %s only",
+                 attempt, self.expected_days - len(failing), [i + 1 for i in failing],
+                 extra={"attempt": attempt})
+        self.partial, self.failing = plan, failing
+
+    def fallback(self) -> dict | None:
+        """After the last attempt: the kept plan if it has enough good days."""
+        if self.partial is None:
+            return None
+        good = self.expected_days - len(self.failing)
+        if good < _min_good_days(self.expected_days):
+            return None
+        incr("partial_plans")
+        return self.partial
+
+
+def call_openai_with_retry(prompt: str, model: str, target_calories: int = 1667, max_retries: int = 5,
+                           dish_selection: dict | None = None, meal_targets: dict | None = None,
+                           use_cache: bool = True, decode: Callable[[dict], dict] | None = None,
+                           max_tokens: int = DEFAULT_MAX_TOKENS, stream: bool | None = None,
+                           expected_days: int = 7):
+    """Retry wrapper for ChatCompletion.create with exponential backoff.
+
+    Every attempt first waits on the shared rate limiter (requests/min and
+    tokens/min), so concurrent callers stay under the provider limits.
+
+    Days outside ±150 kcal are first rescaled locally with repair_plan()
+    (using dish_selection / meal_targets when given). Days that are still
+    off are then regenerated on their own – the good days are kept and the
+    follow-up request only covers the failing days (see _PlanAttempts).
+    Without dish_selection a plan with at least 4 good days is accepted as
+    before, otherwise the whole plan is requested again.
+
+    Accepted plans with every day on target are stored in the on-disk
+    response cache keyed by the full request, so an identical prompt is
+    answered without an API call (use_cache=False or PLAN_CACHE=off
+    bypasses it).
+
+    decode / max_tokens support compact response protocols: decode maps the
+    parsed completion to a plan before validation (see dish_protocol).
+
+    stream=True (default: streaming_enabled()) validates each day while the
+    completion is still arriving and cuts the attempt short at the first
+    unrecoverable day (see streaming).
+
+    expected_days < 7 is used for day-subset prompts (assemble_day_prompt).
+    """
+    attempts = _PlanAttempts(prompt, model, target_calories, dish_selection, meal_targets,
+                             decode, max_tokens, expected_days)
+    key, plan = _cached_plan(attempts.request, use_cache)
+    if plan is not None:
+        return plan
+    stream = streaming_enabled() if stream is None else stream
+
+    for attempt in range(1, max_retries + 1):
+        request, n_days = attempts.next_request()
+        prompt_tokens = chat_prompt_tokens(request["messages"])
+        get_rate_limiter().acquire(prompt_tokens + request["max_tokens"])
+        incr("api_attempts")
+        if attempt > 1:
+            incr("retries")
+        try:
+            with span("api_call"):
+                if stream:
+                    monitor = _stream_monitor(target_calories, decode if attempts.partial is None else None)
+                    raw = _stream_completion(request, monitor, prompt_tokens).strip()
+                else:
+                    resp = get_llm_backend().create(**request)
+                    record_usage(resp.get("usage"), prompt_tokens)
+                    raw = resp["choices"][0]["message"]["content"].strip()
+        except StreamAborted as e:
+            log.warning("Attempt %d: %s", attempt, e, extra={"attempt": attempt})
+            incr("stream_aborts")
+            attempts.last_clean = e.partial
+            attempts.take_aborted(e.days, attempt)
             continue
-        except OpenAIError as e:
-            print(f"Attempt {attempt}: unrecoverable OpenAI error: {e}")
-            break
         except Exception as e:
-            print(f"Attempt {attempt}: unexpected error: {e}")
+            wait = _retry_delay(e, attempt)
+            if wait is None:
+                break
+            time.sleep(wait)
+            continue
+
+        plan = attempts.take(raw, attempt, n_days)
+        if plan is not None:
             break
+    else:
+        plan = None
 
-        clean = clean_json_response(raw)
-        last_clean = clean
+    plan = plan or attempts.fallback()
+    if plan is None:
+        raise ValueError(
+            f"Failed to obtain a valid {expected_days}-day plan after retries. Last response:\n"
+            + str(attempts.last_clean)
+        )
+    _store_plan(key, plan, target_calories)
+    return plan
+
+
+async def acall_openai_with_retry(prompt: str, model: str, target_calories: int = 1667, max_retries: int = 5,
+                                  dish_selection: dict | None = None, meal_targets: dict | None = None,
+                                  use_cache: bool = True, decode: Callable[[dict], dict] | None = None,
+                                  max_tokens: int = DEFAULT_MAX_TOKENS, stream: bool | None = None,
+                                  expected_days: int = 7):
+    """asyncio twin of call_openai_with_retry (ChatCompletion.acreate)."""
+    attempts = _PlanAttempts(prompt, model, target_calories, dish_selection, meal_targets,
+                             decode, max_tokens, expected_days)
+    key, plan = _cached_plan(attempts.request, use_cache)
+    if plan is not None:
+        return plan
+    stream = streaming_enabled() if stream is None else stream
 
+    for attempt in range(1, max_retries + 1):
+        request, n_days = attempts.next_request()
+        prompt_tokens = chat_prompt_tokens(request["messages"])
+        await get_rate_limiter().acquire_async(prompt_tokens + request["max_tokens"])
+        incr("api_attempts")
+        if attempt > 1:
+            incr("retries")
         try:
-            plan = json.loads(clean)
-        except JSONDecodeError as e:
-            print(f"Attempt {attempt}: JSON decode error: {e}")
+            with span("api_call"):
+                if stream:
+                    monitor = _stream_monitor(target_calories, decode if attempts.partial is None else None)
+                    raw = (await _astream_completion(request, monitor, prompt_tokens)).strip()
+                else:
+                    resp = await get_llm_backend().acreate(**request)
+                    record_usage(resp.get("usage"), prompt_tokens)
+                    raw = resp["choices"][0]["message"]["content"].strip()
+        except StreamAborted as e:
+            log.warning("Attempt %d: %s", attempt, e, extra={"attempt": attempt})
+            incr("stream_aborts")
+            attempts.last_clean = e.partial
+            attempts.take_aborted(e.days, attempt)
+            continue
+        except Exception as e:
+            wait = _retry_delay(e, attempt)
+            if wait is None:
+                break
+            await asyncio.sleep(wait)
             continue
 
-        days = plan.get("7DayPlan")
-        if isinstance(days, list) and len(days) == 7:
-            validation = validate_calorie_targets(plan, target_calories)
-            within = sum(1 for v in validation if v["within_range"])
-            print(f"Attempt {attempt}: {within}/7 days within ±150 kcal")
-            if within >= 4:
-                return plan
-        else:
-            print(f"Attempt {attempt}: invalid structure (days={type(days)})")
+        plan = attempts.take(raw, attempt, n_days)
+        if plan is not None:
+            break
+    else:
+        plan = None
+
+    plan = plan or attempts.fallback()
+    if plan is None:
+        raise ValueError(
+            f"Failed to obtain a valid {expected_days}-day plan after retries. Last response:\n"
+            + str(attempts.last_clean)
+        )
+    _store_plan(key, plan, target_calories)
+    return plan
+
+PLAN_MODES = ("llm", "local", "hybrid", "ids", "parallel")
+
+# "parallel" mode: days per concurrent request (1 → seven requests per user)
+PARALLEL_DAYS_PER_REQUEST: int | None = None    # None → PARALLEL_DAYS_PER_REQUEST env (1)
+DAY_MAX_TOKENS = 1500           # completion budget per day in a day-subset request
 
-    raise ValueError(
-        "Failed to obtain a valid 7‑day plan after retries. Last response:\n" + str(last_clean)
-    )
 
-def get_diet_plan_via_gpt(payload: dict, model: str = "gpt-4o", csv_path: str | Path = CSV_DEFAULT) -> dict:
+def parallel_days_per_request() -> int:
+    return PARALLEL_DAYS_PER_REQUEST or int(env("PARALLEL_DAYS_PER_REQUEST", "1"))
+
+
+DRAFT_PLAN_INSTRUCTIONS = """
+DRAFT PLAN (portions already computed to hit every target):
+Improve variety and how dishes pair within a meal. You may swap a dish for
+another dish from the same meal list, but re-scale it so the meal's calories
+stay the same. Keep everything else. Return the full plan in the JSON FORMAT above.
+
+"""
+
+
+@dataclass
+class PlanRequest:
+    """Everything needed to obtain one user's plan, minus the API call itself."""
+    prompt: str | None
+    target_calories: int
+    dish_selection: dict | None
+    meal_targets: dict
+    local_plan: dict | None = None      # "local"/"hybrid": ready plan / fallback
+    decode: Callable[[dict], dict] | None = None    # "ids": response → plan
+    max_tokens: int = DEFAULT_MAX_TOKENS
+    day_groups: list[tuple[tuple[int, ...], str]] | None = None   # "parallel": (days, prompt)
+
+
+def day_groups(days: int = 7, size: int = 1) -> list[tuple[int, ...]]:
+    """Day numbers 1..days split into consecutive groups of `size`."""
+    size = max(1, size)
+    return [tuple(range(start, min(start + size, days + 1))) for start in range(1, days + 1, size)]
+
+
+def prepare_plan_request(payload: dict, csv_path: str | Path = CSV_DEFAULT, mode: str = "llm") -> PlanRequest | None:
     """
-    Main function to generate diet plan via GPT with optimized filtering and token usage
+    Filtering, local planning and prompt assembly for one user.
+
+    Returns None when the filters leave a required meal without dishes.
+    For mode="local" the returned request has prompt=None and a local_plan.
     """
+    if mode not in PLAN_MODES:
+        raise ValueError(f"Unknown plan mode {mode!r}; expected one of {PLAN_MODES}")
+
     profile = payload.get("user_profile", {})
     diet_type = profile.get("Diet type", "Mixed")
     meal_freq = int(profile.get("Meal frequency in a day", 3))
@@ -665,8 +1419,7 @@ def get_diet_plan_via_gpt(payload: dict, model: str = "gpt-4o", csv_path: str |
     # Convert "days to avoid non-veg" to "days to prefer non-veg"
     avoid_non_veg_days = profile.get("Non-Veg Days", [])
     non_veg_days = convert_non_veg_days(avoid_non_veg_days)
-    print(f"Non-veg avoid days: {avoid_non_veg_days}")
-    print(f"Non-veg preferred days: {non_veg_days}")
+    log.debug("Non-veg avoid days: %s; preferred days: %s", avoid_non_veg_days, non_veg_days)
     
     conditions = profile.get("Health Conditions", [])
     region = profile.get("Culture preference", "Mixed")
@@ -690,7 +1443,8 @@ def get_diet_plan_via_gpt(payload: dict, model: str = "gpt-4o", csv_path: str |
             region=region, 
             health_conditions=conditions, 
             dislikes=dislikes, 
-            lab_values=lab_values
+            lab_values=lab_values,
+            token_budget=dish_token_budget(),
         )
 
         debug_dish_distribution(dish_selection)
@@ -698,10 +1452,9 @@ def get_diet_plan_via_gpt(payload: dict, model: str = "gpt-4o", csv_path: str |
         # Check if we have enough dishes after filtering
         if dish_selection:
             total_dishes = sum(len(dishes) for dishes in dish_selection.values())
-            print(f"After filtering: {total_dishes} dishes available")
-            
             if total_dishes < 10:  # Need at least 10 dishes for variety
-                print("Warning: Limited dish variety after filtering. Consider expanding the database or relaxing constraints.")
+                log.warning("Limited dish variety after filtering (%d dishes). "
+                            "Consider expanding the database or relaxing constraints.", total_dishes)
                 
             # Check individual meal types, allow skipping snack if meal_freq is 3
             meal_freq = int(profile.get("Meal frequency in a day", 3))
@@ -710,11 +1463,11 @@ def get_diet_plan_via_gpt(payload: dict, model: str = "gpt-4o", csv_path: str |
                 if meal_type == "snack" and meal_freq == 3:
                     continue  # ✅ skip snack validation for 3-meal plans
                 if len(dishes) == 0:
-                    print(f"ERROR: No {meal_type} dishes available after filtering!")
+                    log.error("No %s dishes available after filtering", meal_type)
                     return None
 
         else:
-            print("No dishes found matching all the preferences.")
+            log.error("No dishes found matching all the preferences")
             return None
     
     # Build constraint texts (keeping original functionality for fallback)
@@ -737,62 +1490,211 @@ def get_diet_plan_via_gpt(payload: dict, model: str = "gpt-4o", csv_path: str |
     dist_text, diet_text = build_meal_distribution_and_diet_text(diet_type, meal_freq, non_veg_days)
     region_text = build_region_text(region)
 
+    meal_targets = meal_calorie_targets(target_calories, meal_freq)
+
+    local_plan = None
+    if mode != "llm" and not dish_selection:
+        log.warning("mode=%r needs the cuisine database – falling back to the LLM", mode)
+    elif mode == "parallel":
+        with span("prompt_assembly"):
+            groups = [
+                (days, assemble_day_prompt(payload, dish_selection, target_calories, days))
+                for days in day_groups(7, parallel_days_per_request())
+            ]
+        return PlanRequest(None, target_calories, dish_selection, meal_targets, day_groups=groups)
+    elif mode == "ids":
+        with span("prompt_assembly"):
+            protocol = DishIdProtocol(dish_selection, meal_targets)
+            prompt = protocol.prompt(target_calories)
+        return PlanRequest(prompt, target_calories, dish_selection,
+                           meal_targets, decode=protocol.expand, max_tokens=ID_MAX_TOKENS)
+    elif mode != "llm":
+        local_plan = build_local_plan(dish_selection, meal_targets, payload.get("macros"))
+        if mode == "local":
+            return PlanRequest(None, target_calories, dish_selection, meal_targets, local_plan)
+
     # Create prompt with or without CSV dishes
-    prompt = assemble_prompt(
-        payload, dist_text, freq_text, sub_text, skip_text, safe_text, variety_text,
-        avoid_text, lab_text, hydration_text, diet_text, region_text, dish_selection
-    )
-    
-    return call_openai_with_retry(prompt, model, target_calories)
+    with span("prompt_assembly"):
+        prompt = assemble_prompt(
+            payload, dist_text, freq_text, sub_text, skip_text, safe_text, variety_text,
+            avoid_text, lab_text, hydration_text, diet_text, region_text, dish_selection
+        )
+        if local_plan is not None:
+            prompt += DRAFT_PLAN_INSTRUCTIONS + json.dumps(local_plan, separators=(',', ':'))
+
+    return PlanRequest(prompt, target_calories, dish_selection, meal_targets, local_plan)
+
+
+async def generate_days_parallel(req: PlanRequest, model: str) -> dict:
+    """
+    Run every day-group prompt of req concurrently (the shared rate limiter
+    still paces them), merge the days in order and enforce the weekly dish
+    rules locally. A group that fails all retries is filled from the local
+    planner so one bad request does not sink the plan.
+    """
+    async def one(days, prompt):
+        try:
+            plan = await acall_openai_with_retry(prompt, model, req.target_calories,
+                                                 dish_selection=req.dish_selection,
+                                                 meal_targets=req.meal_targets,
+                                                 max_tokens=min(DEFAULT_MAX_TOKENS, DAY_MAX_TOKENS * len(days)),
+                                                 expected_days=len(days))
+            return plan["7DayPlan"]
+        except ValueError as e:
+            log.warning("Days %s: no valid response (%s) – using the local planner",
+                        list(days), e.__class__.__name__)
+            return None
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(one(days, prompt) for days, prompt in req.day_groups))
+
+    local_days = None
+    plan_days = []
+    for (days, _), got in zip(req.day_groups, results):
+        if got is None:
+            incr("local_fallbacks")
+            if local_days is None:
+                local_days = build_local_plan(req.dish_selection, req.meal_targets)["7DayPlan"]
+            got = [local_days[n - 1] for n in days]
+        plan_days.extend(got)
+    plan_days = [{"Day": f"Day {n}", **{k: v for k, v in day.items() if k != "Day"}}
+                 for n, day in enumerate(plan_days, 1)]
+
+    plan_days, swaps = enforce_weekly_rules(plan_days, req.dish_selection)
+    plan = {"7DayPlan": plan_days, "Summary": plan_summary(plan_days)}
+    within = sum(1 for v in validate_calorie_targets(plan, req.target_calories) if v["within_range"])
+    log.info("Parallel plan: %d requests in %.1fs, %d dish swap(s) for weekly rules, %d/7 days within ±150 kcal",
+             len(req.day_groups), time.perf_counter() - t0, swaps, within, extra={"days_ok": within})
+    return plan
+
+
+@timed("plan")
+def get_diet_plan_via_gpt(payload: dict, model: str = "gpt-4o", csv_path: str | Path = CSV_DEFAULT, mode: str = "llm") -> dict:
+    """
+    Main function to generate diet plan via GPT with optimized filtering and token usage
+
+    mode:
+        "llm"    – the model picks dishes and scales portions (original flow)
+        "local"  – portion_optimizer builds the plan locally, no API call
+        "hybrid" – the local plan is sent to the model as a draft for a
+                   stylistic pass; falls back to the local plan if that fails
+        "ids"    – the model only answers [dish_id, multiplier] pairs; names,
+                   quantities and nutrition are filled in from the catalog
+        "parallel" – days (PARALLEL_DAYS_PER_REQUEST per request) are generated
+                   by concurrent requests; weekly rules are enforced locally
+    """
+    incr("plans", mode=mode)
+    req = prepare_plan_request(payload, csv_path, mode)
+    if req is None:
+        return None
+    if req.day_groups:
+        return asyncio.run(generate_days_parallel(req, model))
+    if req.prompt is None:
+        return req.local_plan
+
+    try:
+        return call_openai_with_retry(req.prompt, model, req.target_calories,
+                                      dish_selection=req.dish_selection, meal_targets=req.meal_targets,
+                                      decode=req.decode, max_tokens=req.max_tokens)
+    except ValueError as e:
+        if req.local_plan is None:
+            raise
+        log.warning("Stylistic pass failed (%s); using the local plan", e.__class__.__name__)
+        incr("local_fallbacks")
+        return req.local_plan
+
+
+@timed("plan")
+async def get_diet_plan_async(payload: dict, model: str = "gpt-4o", csv_path: str | Path = CSV_DEFAULT,
+                              mode: str = "llm", semaphore: asyncio.Semaphore | None = None) -> dict:
+    """
+    asyncio version of get_diet_plan_via_gpt.
+
+    Local work (filtering, prompt assembly) runs inline; only the completion
+    calls are awaited. Pass a shared semaphore to bound how many completions
+    are in flight across many concurrent users.
+    """
+    incr("plans", mode=mode)
+    req = prepare_plan_request(payload, csv_path, mode)
+    if req is None:
+        return None
+    if req.day_groups:
+        async with (semaphore or contextlib.nullcontext()):
+            return await generate_days_parallel(req, model)
+    if req.prompt is None:
+        return req.local_plan
+
+    try:
+        async with (semaphore or contextlib.nullcontext()):
+            return await acall_openai_with_retry(req.prompt, model, req.target_calories,
+                                                 dish_selection=req.dish_selection,
+                                                 meal_targets=req.meal_targets,
+                                                 decode=req.decode, max_tokens=req.max_tokens)
+    except ValueError as e:
+        if req.local_plan is None:
+            raise
+        log.warning("Stylistic pass failed (%s); using the local plan", e.__class__.__name__)
+        incr("local_fallbacks")
+        return req.local_plan
 
 def debug_dish_distribution(dish_selection):
-    """Enhanced debug function to show filtering results"""
-    print("\n=== FILTERED Meal Distribution Debug ===")
+    """Log the filtered dishes per meal type with a few samples (DEBUG level only)"""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
     for meal_type, dishes in dish_selection.items():
-        print(f"{meal_type}: {len(dishes)} dishes")
-        if dishes:
-            print("  Sample dishes:")
-            for i, dish in enumerate(dishes[:3]):  # Show first 3
-                print(f"    {i+1}. {dish['name']} ({dish['cal']} cal)")
-        else:
-            print("  WARNING: No dishes available!")
-    print("=========================================\n")
+        samples = [f"{dish['name']} ({dish['cal']} cal)" for dish in dishes[:3]]   # first 3
+        log.debug("Filtered %s: %d dishes%s", meal_type, len(dishes),
+                  f"; e.g. {', '.join(samples)}" if samples else " – none available!",
+                  extra={"meal_type": meal_type, "dishes": len(dishes)})
 
 # Additional utility functions for enhanced functionality
 
-def estimate_token_usage(dish_selection):
+def _selection_payload(dish_selection):
+    """Minimal payload whose meal structure covers the selection's lists."""
+    return {"user_profile": {"Meal frequency in a day": 4 if dish_selection.get("snack") else 3}}
+
+
+def estimate_token_usage(dish_selection, payload=None, target_calories=1500, encoding=None):
+    """
+    Prompt tokens (system + compact user prompt) this selection produces,
+    counted on the assembled prompt with token_accounting.count_tokens.
+    """
     if not dish_selection:
         return 0
-    total_dishes = sum(len(d) for d in dish_selection.values())
-    return total_dishes * 20 + 1000  # add buffer for base prompt
+    prompt = assemble_compact_prompt(payload or _selection_payload(dish_selection),
+                                     dish_selection, target_calories, encoding)
+    return chat_prompt_tokens([{"content": CHAT_SYSTEM_PROMPT}, {"content": prompt}])
 
 
-def optimize_dish_selection_for_tokens(dish_selection, max_tokens=8000):
+def optimize_dish_selection_for_tokens(dish_selection, max_tokens=8000, payload=None,
+                                       target_calories=1500, encoding=None):
     """
     Dynamically adjust dish limits based on token budget
     """
-    estimated_tokens = estimate_token_usage(dish_selection)
+    encoding = encoding or prompt_encoding()
+    estimated_tokens = estimate_token_usage(dish_selection, payload, target_calories, encoding)
     
     if estimated_tokens <= max_tokens:
         return dish_selection
     
-    print(f"Estimated tokens ({estimated_tokens}) exceed limit ({max_tokens}). Optimizing...")
+    log.info("Prompt tokens (%d) exceed limit (%d). Optimizing...", estimated_tokens, max_tokens)
     
-    # Calculate how many dishes we can afford
-    available_tokens = max_tokens - 700  # Reserve tokens for base prompt
-    tokens_per_dish = 18
-    max_total_dishes = available_tokens // tokens_per_dish
-    
-    # Distribute dishes proportionally
+    # Whatever is not dish rows is fixed prompt overhead
+    dish_cost = sum(dish_tokens(d, encoding) for dishes in dish_selection.values() for d in dishes)
+    available_tokens = max_tokens - (estimated_tokens - dish_cost)
+    optimized_selection = trim_to_budget(dish_selection, available_tokens, encoding)
+
+    # token counts are not exactly additive across joined rows – re-check
+    for _ in range(10):
+        overshoot = estimate_token_usage(optimized_selection, payload, target_calories, encoding) - max_tokens
+        if overshoot <= 0:
+            break
+        available_tokens -= overshoot
+        optimized_selection = trim_to_budget(dish_selection, available_tokens, encoding)
+
     total_current_dishes = sum(len(dishes) for dishes in dish_selection.values())
-    scaling_factor = max_total_dishes / total_current_dishes
-    
-    optimized_selection = {}
-    for meal_type, dishes in dish_selection.items():
-        max_for_meal = max(3, int(len(dishes) * scaling_factor))  # Minimum 3 per meal
-        optimized_selection[meal_type] = dishes[:max_for_meal]
-        
-    print(f"Optimized from {total_current_dishes} to {sum(len(dishes) for dishes in optimized_selection.values())} dishes")
+    log.info("Optimized from %d to %d dishes", total_current_dishes,
+             sum(len(dishes) for dishes in optimized_selection.values()))
     
     return optimized_selection
 
@@ -813,9 +1715,7 @@ def validate_dish_selection(dish_selection):
         issues.append(f"Total dishes ({total_dishes}) very low - consider relaxing filters")
     
     if issues:
-        print("VALIDATION WARNINGS:")
-        for issue in issues:
-            print(f"  - {issue}")
+        log.warning("Dish selection validation: %s", "; ".join(issues), extra={"issues": issues})
         return False
     
     return True
@@ -830,7 +1730,7 @@ def get_diet_plan_via_gpt_enhanced(payload: dict, model: str = "gpt-4o", csv_pat
         plan = get_diet_plan_via_gpt(payload, model, csv_path)
         
         if plan is None:
-            print("Failed to generate plan with current filters. Trying with relaxed constraints...")
+            log.warning("Failed to generate plan with current filters. Trying with relaxed constraints...")
             
             # Try with relaxed dislikes
             profile = payload.get("user_profile", {})
@@ -838,16 +1738,16 @@ def get_diet_plan_via_gpt_enhanced(payload: dict, model: str = "gpt-4o", csv_pat
             
             if len(original_dislikes) > 2:
                 profile["Dislikes"] = original_dislikes[:2]  # Keep only top 2 dislikes
-                print(f"Relaxed dislikes to: {profile['Dislikes']}")
+                log.info("Relaxed dislikes to: %s", profile["Dislikes"])
                 plan = get_diet_plan_via_gpt(payload, model, csv_path)
             
             if plan is None and len(original_dislikes) > 0:
                 profile["Dislikes"] = []  # Remove all dislikes
-                print("Removed all dislikes")
+                log.info("Removed all dislikes")
                 plan = get_diet_plan_via_gpt(payload, model, csv_path)
         
         return plan
         
     except Exception as e:
-        print(f"Error in enhanced diet plan generation: {e}")
+        log.exception("Error in enhanced diet plan generation: %s", e)
         return None
\ No newline at end of file
@@ -7,6 +7,8 @@ from fpdf import FPDF
 import re
 from decimal import Decimal, ROUND_HALF_UP
 
+from ai_engine.metrics import timed
+
 
 #  helper ────────────────────────────────────────────────────────
 def _pretty_qty(raw: str) -> str:
@@ -134,6 +136,7 @@ def clean_text(txt: str) -> str:
 
 
 # ── PDF generators ─────────────────────────────────────────────────────────
+@timed("pdf_render")
 def create_pdf(plan: dict, filename: str):
     """
     Landscape summary table – one row per day.
@@ -277,6 +280,7 @@ def create_pdf(plan: dict, filename: str):
 # ---------------------------------------------------------------------------
 # Optional detailed version (unchanged except for calls to clean_text/parse).
 # ---------------------------------------------------------------------------
+@timed("pdf_render")
 def create_detailed_pdf(plan: dict, filename: str):
     pdf = FPDF("P", "mm", "A4")
     pdf.set_auto_page_break(True, 15)
@@ -1,7 +1,12 @@
 # ai_engine/planner.py
 
+import asyncio
 import json
-from ai_engine.openai_client import get_diet_plan_via_gpt
+import time
+from ai_engine.openai_client import get_diet_plan_via_gpt, get_diet_plan_async
+from ai_engine.log import correlation_scope, get_logger
+
+log = get_logger(__name__)
 
 def parse_weight_height(s: str):
     # expects "60kg, 165cm"
@@ -85,7 +90,7 @@ def compute_macros(calories: float, goal: str) -> dict:
         "Fats_g":    round((calories * r["fats"])    / 9, 1)
     }
 
-def generate_plan(user_data: dict) -> dict:
+def build_payload(user_data: dict) -> dict:
     # 1) Parse
     w, h = parse_weight_height(user_data["Weight & Height"])
     age    = int(user_data["Age"])
@@ -94,7 +99,7 @@ def generate_plan(user_data: dict) -> dict:
     activity = normalize_activity_level(activity_raw)
     goal = user_data["Goals"]
 
-    print(f"Parsed activity level: '{activity_raw}' -> '{activity}'")
+    log.debug("Parsed activity level: %r -> %r", activity_raw, activity)
 
     # 2) Compute
     bmr  = calculate_bmr(w, h, age, gender)
@@ -102,14 +107,54 @@ def generate_plan(user_data: dict) -> dict:
     cal_goal = adjust_calories(tdee, goal)
     macros   = compute_macros(cal_goal, goal)
 
-    print(f"BMR: {bmr:.0f}, TDEE: {tdee:.0f}, Calorie Goal: {cal_goal:.0f}")
+    log.info("BMR: %.0f, TDEE: %.0f, Calorie Goal: %.0f", bmr, tdee, cal_goal,
+             extra={"bmr": round(bmr), "tdee": round(tdee), "calorie_goal": round(cal_goal)})
 
     # 3) Build payload
-    payload = {
+    return {
         "user_profile": user_data,
         "calorie_goal": f"{round(cal_goal)} kcal/day",
         "macros": macros
     }
 
-    # 4) Call GPT
-    return get_diet_plan_via_gpt(payload)
\ No newline at end of file
+def generate_plan(user_data: dict, mode: str = "llm") -> dict:
+    # one correlation ID per user (kept if the caller already set one)
+    with correlation_scope():
+        payload = build_payload(user_data)
+
+        # 4) Call GPT (or build locally, see get_diet_plan_via_gpt modes)
+        return get_diet_plan_via_gpt(payload, mode=mode)
+
+async def generate_plan_async(user_data: dict, mode: str = "llm", semaphore: asyncio.Semaphore | None = None) -> dict:
+    with correlation_scope():
+        payload = build_payload(user_data)
+        return await get_diet_plan_async(payload, mode=mode, semaphore=semaphore)
+
+async def generate_plans_async(users, concurrency: int = 4, mode: str = "llm", on_start=None):
+    """
+    Generate many plans at once, at most `concurrency` users in flight.
+
+    users: iterable of (key, user_data). Yields (key, plan, error, seconds)
+    in completion order; error is the exception (plan None) if one failed;
+    seconds counts from when the user got a slot. on_start(key), if given,
+    is called once a user holds a slot, just before its work begins.
+    Each user's log lines carry str(key) as their correlation ID.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(key, user_data):
+        async with semaphore:
+            if on_start is not None:
+                on_start(key)
+            t0 = time.perf_counter()
+            with correlation_scope(str(key)):
+                try:
+                    plan = await generate_plan_async(user_data, mode)
+                    return key, plan, None, time.perf_counter() - t0
+                except Exception as err:
+                    log.error("Plan failed: %s: %s", type(err).__name__, err)
+                    return key, None, err, time.perf_counter() - t0
+
+    tasks = [asyncio.create_task(_one(k, u)) for k, u in users]
+    for fut in asyncio.as_completed(tasks):
+        yield await fut
\ No newline at end of file
@@ -0,0 +1,467 @@
+# ─── ai_engine/portion_optimizer.py ───────────────────────────────────────
+"""
+Deterministic local planner: picks dishes and portion multipliers per meal
+so that every meal hits its kcal target (and tracks the macro split from
+compute_macros) without asking the LLM to do the arithmetic.
+
+For each meal it scores every 1-, 2- (and, if needed, 3-) dish combination
+of the still-allowed dishes with a bounded weighted least-squares fit of the
+multipliers, all combinations of one size solved at once with numpy.
+Weekly rules from the prompt are enforced while choosing:
+
+    • a dish appears at most MAX_USES_PER_WEEK times in the week
+    • never on two consecutive days (nor twice on the same day)
+    • no portion below 25 g / 25 ml / ½ roti / ½ piece
+
+The output is a plan dict in the usual {"7DayPlan": [...], "Summary": {...}}
+shape, so it can go straight to validate_calorie_targets() and create_pdf().
+"""
+from __future__ import annotations
+
+import re
+from itertools import combinations
+
+import numpy as np
+
+from ai_engine.log import get_logger
+
+log = get_logger(__name__)
+
+MAX_USES_PER_WEEK = 2
+MAX_DISHES_PER_MEAL = 3
+MAX_MULTIPLIER = 2.5
+MIN_MULTIPLIER = 0.25
+MIN_GRAMS = 25                  # also applies to ml
+MIN_PIECES = 0.5                # ½ roti / ½ piece
+MULTIPLIER_STEP = 0.05          # portions are rounded to this grid
+
+# macro split used when the payload carries no "macros" block
+DEFAULT_MACRO_SPLIT = {"protein": 0.30, "carbs": 0.40, "fats": 0.30}
+
+# relative-error weights: kcal dominates, macros steer the choice
+KCAL_WEIGHT = 4.0
+MACRO_WEIGHT = 1.0
+EXTRA_DISH_PENALTY = 0.01       # prefer fewer dishes when fits are equal
+REUSE_PENALTY = 0.02            # prefer dishes not used yet this week
+COMBO_CANDIDATES = 12           # best single-dish fits searched in 2-/3-dish combos …
+COMPLEMENT_CANDIDATES = 3        # … plus the richest dishes in each macro
+
+_NUMBER = re.compile(r"(\d+(?:\.\d+)?)(?:\s*/\s*(\d+))?")
+_GRAM_TAIL = re.compile(r"\s*(?:g|gm|gms|grams?|ml)\b", re.I)
+_GRAMS = re.compile(r"(\d+(?:\.\d+)?)\s*(?:g|gm|gms|grams?|ml)\b", re.I)
+_COUNT = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(?:roti|rotis|chapati|chapatis|paratha|parathas|puri|puris|"
+    r"piece|pieces|pc|pcs|slice|slices|egg|eggs|dosa|idli|appam|thepla|theplas|pav)\b",
+    re.I,
+)
+
+
+# ── quantity strings ──────────────────────────────────────────────────────
+def _fmt_number(x: float, unit_tail: str) -> str:
+    """Whole grams/ml, otherwise one decimal without a trailing '.0'."""
+    if _GRAM_TAIL.match(unit_tail):
+        return str(int(round(x)))
+    x = round(x, 1)
+    return str(int(x)) if x == int(x) else f"{x}"
+
+
+def scale_quantity(quantity, factor: float) -> str:
+    """
+    Multiply every number in a catalog quantity string.
+
+        "2 pieces (100g)" × 1.5          → "3 pieces (150g)"
+        "1/2 medium bowl + 4 puris" × 2  → "1 medium bowl + 8 puris"
+    """
+    if not isinstance(quantity, str) or not quantity.strip():
+        return f"{_fmt_number(factor, '')}x portion"
+    if abs(factor - 1.0) < 1e-9:
+        return quantity
+
+    def _scale(m: re.Match) -> str:
+        num = float(m.group(1))
+        if m.group(2):
+            num /= float(m.group(2)) or 1.0
+        return _fmt_number(num * factor, quantity[m.end():])
+
+    return _NUMBER.sub(_scale, quantity)
+
+
+def min_multiplier(quantity) -> float:
+    """Smallest factor that keeps every component above the minimum portion."""
+    lo = MIN_MULTIPLIER
+    if isinstance(quantity, str):
+        grams = [float(g) for g in _GRAMS.findall(quantity) if float(g) > 0]
+        counts = [float(c) for c in _COUNT.findall(quantity) if float(c) > 0]
+        if grams:
+            lo = max(lo, MIN_GRAMS / min(grams))
+        if counts:
+            lo = max(lo, MIN_PIECES / min(counts))
+    return lo
+
+
+def scale_dish(dish: dict, factor: float) -> dict:
+    """Compact catalog record → plan dish entry, scaled by factor."""
+    return {
+        "name": dish["name"],
+        "quantity": scale_quantity(dish.get("quantity", ""), factor),
+        "calories": int(round(dish["cal"] * factor)),
+        "protein": round(dish["p"] * factor, 1),
+        "carbs": round(dish["c"] * factor, 1),
+        "fats": round(dish["f"] * factor, 1),
+    }
+
+
+# ── targets ───────────────────────────────────────────────────────────────
+def meal_nutrient_targets(meal_kcal: dict[str, int], macros: dict | None) -> dict[str, np.ndarray]:
+    """
+    Per-meal [kcal, protein g, carbs g, fats g] targets. Daily macros (the
+    compute_macros() dict) are split across meals in proportion to kcal.
+    """
+    day_kcal = sum(meal_kcal.values()) or 1
+    if macros:
+        day_macros = np.array([
+            float(macros.get("Protein_g", 0)),
+            float(macros.get("Carbs_g", 0)),
+            float(macros.get("Fats_g", 0)),
+        ])
+    else:
+        day_macros = np.array([
+            day_kcal * DEFAULT_MACRO_SPLIT["protein"] / 4,
+            day_kcal * DEFAULT_MACRO_SPLIT["carbs"] / 4,
+            day_kcal * DEFAULT_MACRO_SPLIT["fats"] / 9,
+        ])
+    return {
+        meal: np.concatenate([[kcal], day_macros * kcal / day_kcal])
+        for meal, kcal in meal_kcal.items()
+    }
+
+
+# ── combination search ────────────────────────────────────────────────────
+def _fit_combos(nutr: np.ndarray, lo: np.ndarray, combos: np.ndarray, target: np.ndarray):
+    """
+    Fit multipliers for many dish combinations of the same size at once.
+
+    nutr    (n, 4)  base kcal/p/c/f per candidate dish
+    lo      (n,)    minimum multiplier per dish
+    combos  (m, k)  candidate indices per combination
+    target  (4,)    meal target
+
+    Returns (multipliers (m, k), score (m,)).
+    """
+    scale = np.where(target > 0, target, 1.0)
+    weights = np.array([KCAL_WEIGHT, MACRO_WEIGHT, MACRO_WEIGHT, MACRO_WEIGHT])
+    A = (nutr[combos] / scale).transpose(0, 2, 1) * weights[None, :, None]   # (m, 4, k)
+    t = (target / scale) * weights                                          # (4,)
+
+    k = combos.shape[1]
+    AtA = A.transpose(0, 2, 1) @ A + 1e-6 * np.eye(k)
+    Atb = A.transpose(0, 2, 1) @ t
+    x = np.linalg.solve(AtA, Atb[..., None])[..., 0]
+
+    lo_c = lo[combos]
+    x = np.clip(x, lo_c, MAX_MULTIPLIER)
+    # put kcal back on target, then re-apply portion bounds and the step grid
+    kcal = (nutr[combos][..., 0] * x).sum(axis=1)
+    x = np.clip(x * (target[0] / np.maximum(kcal, 1e-9))[:, None], lo_c, MAX_MULTIPLIER)
+    x = np.maximum(np.round(x / MULTIPLIER_STEP) * MULTIPLIER_STEP, lo_c)
+
+    got = np.einsum("mkj,mk->mj", nutr[combos], x)
+    rel = (got - target) / scale
+    score = KCAL_WEIGHT * np.abs(rel[:, 0]) + MACRO_WEIGHT * np.abs(rel[:, 1:]).mean(axis=1)
+    return x, score + EXTRA_DISH_PENALTY * (k - 1)
+
+
+def _combo_candidates(nutr: np.ndarray, allowed: list[int], single_score: np.ndarray) -> list[int]:
+    """
+    The allowed dishes worth combining: the best single-dish fits, plus the
+    dishes richest in protein, carbs and fats per kcal (a poor fit alone can
+    be the right complement). Keeps the 2-/3-dish search a fixed size.
+    """
+    if len(allowed) <= COMBO_CANDIDATES + 3 * COMPLEMENT_CANDIDATES:
+        return allowed
+    idx = np.asarray(allowed)
+    keep = set(idx[np.argsort(single_score, kind="stable")[:COMBO_CANDIDATES]].tolist())
+    per_kcal = nutr[idx, 1:] / np.maximum(nutr[idx, :1], 1.0)
+    for j in range(per_kcal.shape[1]):
+        keep.update(idx[np.argsort(-per_kcal[:, j], kind="stable")[:COMPLEMENT_CANDIDATES]].tolist())
+    return sorted(keep)
+
+
+def _best_combo(dishes: list[dict], allowed: list[int], uses: dict[str, int], target: np.ndarray):
+    """Best (indices, multipliers) for one meal among the allowed dishes.
+    Single dishes are all tried; 2- and 3-dish combinations only among
+    _combo_candidates()."""
+    nutr = np.array([[d["cal"], d["p"], d["c"], d["f"]] for d in dishes], dtype=float)
+    lo = np.array([min_multiplier(d.get("quantity")) for d in dishes])
+    reuse = np.array([uses.get(d["name"], 0) for d in dishes], dtype=float) * REUSE_PENALTY
+
+    best = (None, None, np.inf)
+    candidates = allowed
+    for k in range(1, MAX_DISHES_PER_MEAL + 1):
+        if k > len(candidates):
+            break
+        combos = np.array(list(combinations(candidates, k)), dtype=int)
+        x, score = _fit_combos(nutr, lo, combos, target)
+        score = score + reuse[combos].sum(axis=1)
+        i = int(np.argmin(score))
+        if score[i] < best[2]:
+            best = (combos[i], x[i], float(score[i]))
+        if k == 1:
+            candidates = _combo_candidates(nutr, allowed, score)
+        # a close fit with fewer dishes is good enough – skip the bigger search
+        if best[2] < KCAL_WEIGHT * 0.03 + MACRO_WEIGHT * 0.15:
+            break
+    return best[0], best[1]
+
+
+def _allowed(dishes, uses, last_day, day, max_uses):
+    """Indices a meal on `day` may use, relaxing the weekly rules if needed."""
+    strict = [i for i, d in enumerate(dishes)
+              if uses.get(d["name"], 0) < max_uses
+              and last_day.get(d["name"], -9) < day - 1]
+    if strict:
+        return strict
+    no_consecutive = [i for i, d in enumerate(dishes) if last_day.get(d["name"], -9) < day - 1]
+    if no_consecutive:
+        log.warning("Day %d: weekly max of %d uses relaxed – catalog too small", day + 1, max_uses)
+        return no_consecutive
+    log.warning("Day %d: consecutive-day rule relaxed – catalog too small", day + 1)
+    return [i for i, d in enumerate(dishes) if last_day.get(d["name"], -9) < day]
+
+
+def build_local_plan(
+    dish_selection: dict[str, list[dict]],
+    meal_kcal: dict[str, int],
+    macros: dict | None = None,
+    days: int = 7,
+    max_uses: int = MAX_USES_PER_WEEK,
+) -> dict:
+    """
+    Assemble a full plan locally.
+
+    dish_selection  compact lists from create_dish_selection_from_csv()
+    meal_kcal       {meal name: kcal} from meal_calorie_targets()
+    macros          daily {"Protein_g", "Carbs_g", "Fats_g"} (compute_macros)
+    """
+    targets = meal_nutrient_targets(meal_kcal, macros)
+    uses: dict[str, int] = {}
+    last_day: dict[str, int] = {}
+    plan_days = []
+
+    for day in range(days):
+        entry = {"Day": f"Day {day + 1}"}
+        for meal, target in targets.items():
+            dishes = dish_selection.get(meal_key(meal), [])
+            allowed = _allowed(dishes, uses, last_day, day, max_uses)
+            if not allowed:
+                entry[meal] = {}
+                continue
+            idx, mult = _best_combo(dishes, allowed, uses, target)
+            entry[meal] = {
+                f"Dish{n}": scale_dish(dishes[i], float(m))
+                for n, (i, m) in enumerate(zip(idx, mult), 1)
+            }
+            for i in idx:
+                name = dishes[i]["name"]
+                uses[name] = uses.get(name, 0) + 1
+                last_day[name] = day
+        plan_days.append(entry)
+
+    return {"7DayPlan": plan_days, "Summary": plan_summary(plan_days)}
+
+
+def meal_key(meal: str) -> str:
+    """Plan meal name → dish_selection key ("Snack1" → "snack")."""
+    return meal.lower().rstrip("12")
+
+
+def plan_summary(plan_days: list[dict]) -> dict:
+    """Average kcal/macros over the plan days, in the Summary format."""
+    totals = np.zeros(4)
+    for entry in plan_days:
+        for meal, dishes in entry.items():
+            if meal == "Day" or not isinstance(dishes, dict):
+                continue
+            for d in dishes.values():
+                if isinstance(d, dict):
+                    totals += [float(d.get("calories", 0)), float(d.get("protein", 0)),
+                               float(d.get("carbs", 0)), float(d.get("fats", 0))]
+    avg = totals / max(len(plan_days), 1)
+    return {
+        "AverageCalories": f"{avg[0]:.0f} kcal/day",
+        "AverageMacros": {"Protein": f"{avg[1]:.0f}g", "Carbs": f"{avg[2]:.0f}g", "Fats": f"{avg[3]:.0f}g"},
+    }
+
+
+# ── post-response repair ──────────────────────────────────────────────────
+def _catalog_by_name(dish_selection: dict[str, list[dict]] | None) -> dict[str, dict]:
+    lookup = {}
+    for dishes in (dish_selection or {}).values():
+        for d in dishes:
+            lookup.setdefault(str(d["name"]).strip().lower(), d)
+    return lookup
+
+
+def _dish_entries(meal_data) -> dict:
+    """{"Dish1": {...}, ...} for either the multi-dish or single-dish meal form."""
+    if not isinstance(meal_data, dict):
+        return {}
+    if {"name", "calories"}.issubset(meal_data):
+        return {"": meal_data}
+    return {k: v for k, v in meal_data.items() if isinstance(v, dict)}
+
+
+def _rescale_entry(entry: dict, factor: float, catalog: dict[str, dict]) -> dict:
+    """Rescale one plan dish by factor, preferring exact catalog nutrition."""
+    base = catalog.get(str(entry.get("name", "")).strip().lower())
+    try:
+        kcal = float(entry.get("calories", 0))
+    except (TypeError, ValueError):
+        kcal = 0.0
+    if base and base["cal"] > 0 and kcal > 0:
+        mult = max(kcal / base["cal"] * factor, min_multiplier(base.get("quantity")))
+        scaled = scale_dish(base, min(mult, MAX_MULTIPLIER))
+        scaled["name"] = entry.get("name", scaled["name"])
+        return scaled
+
+    out = dict(entry)
+    for key in ("protein", "carbs", "fats"):
+        try:
+            out[key] = round(float(entry.get(key, 0)) * factor, 1)
+        except (TypeError, ValueError):
+            pass
+    out["calories"] = int(round(kcal * factor))
+    if isinstance(entry.get("quantity"), str):
+        out["quantity"] = scale_quantity(entry["quantity"], factor)
+    return out
+
+
+def _meal_kcal(meal_data) -> float:
+    total = 0.0
+    for d in _dish_entries(meal_data).values():
+        try:
+            total += float(d.get("calories", 0))
+        except (TypeError, ValueError):
+            pass
+    return total
+
+
+def repair_plan(
+    plan: dict,
+    dish_selection: dict[str, list[dict]] | None,
+    target_calories: int,
+    meal_kcal: dict[str, int] | None = None,
+    tolerance: float = 150,
+    max_factor: float = 2.0,
+) -> tuple[dict, int]:
+    """
+    Rescale out-of-range days of an LLM plan instead of regenerating them.
+
+    Every meal of a day outside ±tolerance kcal is scaled towards its
+    meal_kcal target (or, for meals without a target, the whole day towards
+    target_calories). Dishes found in dish_selection are recomputed from the
+    catalog's per-portion nutrition and quantity; unknown dishes have their
+    own numbers and quantity string scaled. Returns (new plan, days touched).
+    """
+    catalog = _catalog_by_name(dish_selection)
+    meal_kcal = meal_kcal or {}
+    repaired = {**plan, "7DayPlan": []}
+    touched = 0
+
+    for day in plan.get("7DayPlan", []):
+        if not isinstance(day, dict):
+            repaired["7DayPlan"].append(day)
+            continue
+        day_total = sum(_meal_kcal(v) for k, v in day.items() if k != "Day")
+        if abs(day_total - target_calories) <= tolerance or day_total <= 0:
+            repaired["7DayPlan"].append(day)
+            continue
+
+        touched += 1
+        # meals without their own target share the rest of the day proportionally
+        untargeted = sum(_meal_kcal(v) for k, v in day.items() if k != "Day" and k not in meal_kcal)
+        rest = target_calories - sum(meal_kcal.get(k, 0) for k in day if k != "Day")
+        new_day = {}
+        for meal, data in day.items():
+            kcal = _meal_kcal(data) if meal != "Day" else 0
+            if meal == "Day" or kcal <= 0:
+                new_day[meal] = data
+                continue
+            goal = meal_kcal.get(meal)
+            if goal is None:
+                goal = kcal * rest / untargeted if untargeted > 0 and rest > 0 else kcal
+            factor = min(max(goal / kcal, 1 / max_factor), max_factor)
+            entries = _dish_entries(data)
+            if "" in entries:
+                new_day[meal] = _rescale_entry(data, factor, catalog)
+            else:
+                new_day[meal] = {k: _rescale_entry(v, factor, catalog) for k, v in entries.items()}
+        repaired["7DayPlan"].append(new_day)
+
+    return repaired, touched
+
+
+# ── weekly rules across independently generated days ───────────────────────
+def _substitute(entry: dict, options: list[dict], banned: set[str]) -> dict | None:
+    """Allowed dish from options that can match entry's kcal most closely."""
+    try:
+        kcal = float(entry.get("calories", 0))
+    except (TypeError, ValueError):
+        kcal = 0.0
+    best = None
+    for d in options:
+        if d["cal"] <= 0 or str(d["name"]).strip().lower() in banned:
+            continue
+        mult = min(max(kcal / d["cal"], min_multiplier(d.get("quantity"))), MAX_MULTIPLIER)
+        err = abs(d["cal"] * mult - kcal)
+        if best is None or err < best[0]:
+            best = (err, d, mult)
+    return None if best is None else scale_dish(best[1], round(best[2] / MULTIPLIER_STEP) * MULTIPLIER_STEP)
+
+
+def enforce_weekly_rules(
+    plan_days: list[dict],
+    dish_selection: dict[str, list[dict]] | None,
+    max_uses: int = MAX_USES_PER_WEEK,
+) -> tuple[list[dict], int]:
+    """
+    Make days that were generated independently obey the weekly rules
+    (max_uses per week, never on consecutive days, once per day).
+
+    Days are walked in order; a dish that breaks a rule is swapped for the
+    allowed dish of the same meal list whose scaled portion best matches its
+    calories. Returns (days, number of swaps).
+    """
+    uses: dict[str, int] = {}
+    last_day: dict[str, int] = {}
+    out, swaps = [], 0
+
+    for day, entry in enumerate(plan_days):
+        today: set[str] = set()
+        new_day = {}
+        for meal, data in entry.items():
+            dishes = _dish_entries(data) if meal != "Day" else {}
+            if not dishes:
+                new_day[meal] = data
+                continue
+            options = (dish_selection or {}).get(meal_key(meal), [])
+            new_meal = {}
+            for key, dish in dishes.items():
+                name = str(dish.get("name", "")).strip().lower()
+                if uses.get(name, 0) >= max_uses or last_day.get(name) == day - 1 or name in today:
+                    banned = today | {n for n, c in uses.items() if c >= max_uses} \
+                        | {n for n, d in last_day.items() if d == day - 1}
+                    sub = _substitute(dish, options, banned)
+                    if sub is None:
+                        log.warning("Day %d: no substitute for %r – rule left broken", day + 1, dish.get("name"))
+                    else:
+                        dish, name = sub, str(sub["name"]).strip().lower()
+                        swaps += 1
+                new_meal[key] = dish
+                uses[name] = uses.get(name, 0) + 1
+                last_day[name] = day
+                today.add(name)
+            new_day[meal] = new_meal[""] if "" in new_meal else new_meal
+        out.append(new_day)
+
+    return out, swaps
@@ -0,0 +1,156 @@
+# ─── ai_engine/rate_limiter.py ────────────────────────────────────────────
+"""
+Process-wide OpenAI rate limiter.
+
+Two token buckets – requests/min and tokens/min – refilled continuously.
+Each call reserves one request plus its estimated token cost (prompt +
+max_tokens) and sleeps only as long as the emptier bucket needs to cover
+that reservation. Reservations are taken under a lock and may drive a
+bucket negative, so concurrent threads and asyncio tasks queue up fairly
+instead of polling.
+
+Limits are those of the OpenAI account's usage tier for gpt-4o, so
+batches run at the real provider limit:
+
+    OPENAI_TIER=1          1..5 (default 1), see TIER_LIMITS
+    OPENAI_RPM=…           override the tier's requests/min
+    OPENAI_TPM=…           override the tier's tokens/min
+
+Backends without a provider quota (the offline fake) get a no-op limiter,
+so load tests are never paced.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from ai_engine.llm_backends import get_llm_backend
+from ai_engine.settings import env
+from ai_engine.token_accounting import chat_prompt_tokens
+
+# gpt-4o limits per usage tier: (requests/min, tokens/min)
+TIER_LIMITS = {
+    "1": (500, 30_000),
+    "2": (5_000, 450_000),
+    "3": (5_000, 800_000),
+    "4": (10_000, 2_000_000),
+    "5": (10_000, 30_000_000),
+}
+DEFAULT_TIER = "1"
+DEFAULT_RPM, DEFAULT_TPM = TIER_LIMITS[DEFAULT_TIER]
+
+
+class TokenBucket:
+    """Continuous-refill bucket; `capacity` units per `period` seconds."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount now; return seconds until the bucket is back to ≥ 0."""
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+
+class RateLimiter:
+    """Requests/min + tokens/min limiter shared by every caller in the process."""
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self.waited_s = 0.0
+        self.calls = 0
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self._paused_until - now,
+            )
+            self.calls += 1
+            self.waited_s += max(wait, 0.0)
+            return max(wait, 0.0)
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request of `tokens` tokens fits in both budgets."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0):
+        """asyncio version of acquire()."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float):
+        """Provider said 429 – hold back every caller, not just the one that hit it."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "waited_s": round(self.waited_s, 2),
+                    "rpm": self.requests.capacity, "tpm": self.tokens.capacity}
+
+
+def estimate_request_tokens(messages: list[dict], max_tokens: int = 0) -> int:
+    """Prompt tokens plus the completion budget the request may use."""
+    return chat_prompt_tokens(messages) + int(max_tokens or 0)
+
+
+class NullRateLimiter:
+    """Same interface, never waits – for backends without a provider quota."""
+
+    calls = 0
+
+    def acquire(self, tokens: int = 0):
+        pass
+
+    async def acquire_async(self, tokens: int = 0):
+        pass
+
+    def penalize(self, seconds: float):
+        pass
+
+    def stats(self) -> dict:
+        return {"calls": 0, "waited_s": 0.0, "rpm": None, "tpm": None}
+
+
+NULL_LIMITER = NullRateLimiter()
+_LIMITER: RateLimiter | None = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def tier_limits() -> tuple[float, float]:
+    """(rpm, tpm) from OPENAI_TIER, with OPENAI_RPM / OPENAI_TPM overrides."""
+    tier = str(env("OPENAI_TIER", DEFAULT_TIER)).strip()
+    if tier not in TIER_LIMITS:
+        raise ValueError(f"Unknown OPENAI_TIER {tier!r}; expected one of {sorted(TIER_LIMITS)}")
+    rpm, tpm = TIER_LIMITS[tier]
+    return float(env("OPENAI_RPM", rpm)), float(env("OPENAI_TPM", tpm))
+
+
+def get_rate_limiter() -> RateLimiter | NullRateLimiter:
+    """The shared limiter (created on first use, see tier_limits()), or
+    NULL_LIMITER while the selected backend is not rate limited."""
+    global _LIMITER
+    if not getattr(get_llm_backend(), "rate_limited", True):
+        return NULL_LIMITER
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            _LIMITER = RateLimiter(*tier_limits())
+        return _LIMITER
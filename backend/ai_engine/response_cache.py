@@ -0,0 +1,143 @@
+# ─── ai_engine/response_cache.py ──────────────────────────────────────────
+"""
+On-disk, content-addressed cache of validated plans.
+
+The key is a SHA-256 of the complete chat request – model, messages (so the
+final prompt from assemble_prompt) and sampling params – and the value is
+the plan JSON that call_openai_with_retry accepted with every day on
+target (degraded fallback plans are not stored). Re-running a batch with
+unchanged inputs is then served from disk instead of the API.
+
+Storage is a single SQLite file (safe for threads and several processes).
+Entries expire after a TTL and the oldest-used are evicted beyond a size
+cap. Settings (environment):
+
+    PLAN_CACHE=off                 bypass the cache entirely
+    PLAN_CACHE_PATH=...            default: backend/.plan_cache.sqlite3
+    PLAN_CACHE_TTL_DAYS=30
+    PLAN_CACHE_MAX_ENTRIES=5000
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from ai_engine.settings import env
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / ".plan_cache.sqlite3"
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_ENTRIES = 5000
+KEY_VERSION = 1                 # bump when the stored plan format changes
+
+
+def request_key(request: dict) -> str:
+    """Stable hash of a ChatCompletion request (model, messages, params)."""
+    blob = json.dumps({"v": KEY_VERSION, **request}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    def __init__(self, path: str | Path = DEFAULT_PATH, ttl_s: float = DEFAULT_TTL_DAYS * 86400,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, enabled: bool = True):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                " key TEXT PRIMARY KEY, plan TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS plans_accessed ON plans(accessed)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> dict | None:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT plan, created FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_s:
+                if row is not None:
+                    db.execute("DELETE FROM plans WHERE key = ?", (key,))
+                    db.commit()
+                self.misses += 1
+                return None
+            db.execute("UPDATE plans SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, plan: dict):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO plans (key, plan, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(plan, separators=(",", ":")), now, now),
+            )
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        db.execute("DELETE FROM plans WHERE created < ?", (now - self.ttl_s,))
+        (count,) = db.execute("SELECT COUNT(*) FROM plans").fetchone()
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM plans WHERE key IN "
+                "(SELECT key FROM plans ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM plans")
+            db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "path": str(self.path)}
+
+
+_CACHE: PlanCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_plan_cache() -> PlanCache:
+    """The shared cache, configured from the environment on first use."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = PlanCache(
+                env("PLAN_CACHE_PATH", DEFAULT_PATH),
+                float(env("PLAN_CACHE_TTL_DAYS", DEFAULT_TTL_DAYS)) * 86400,
+                int(env("PLAN_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                enabled=env("PLAN_CACHE", "on").lower() not in ("off", "0", "false", "no"),
+            )
+        return _CACHE
+
+
+def set_plan_cache_enabled(enabled: bool):
+    """Process-wide bypass switch (e.g. batch_runner --no-cache)."""
+    get_plan_cache().enabled = enabled
@@ -0,0 +1,171 @@
+# ─── ai_engine/run_journal.py ─────────────────────────────────────────────
+"""
+Durable per-user journal of batch runs, so an interrupted batch can resume.
+
+A run is identified by the SHA-256 of the input CSV; inside it every user
+is keyed by its row label. Each row moves through
+
+    pending  → selected for the run, not started yet
+    running  → plan requested
+    planned  → plan JSON stored, PDF not written yet
+    done     → PDF written (output path stored)
+    failed   → error stored; retried on resume
+
+and every transition is committed before the batch moves on, so a crash
+(network blip, OOM, Ctrl-C) loses at most the rows in flight.
+batch_runner --resume then
+
+    • skips rows that are done and whose PDF still exists
+    • renders PDFs of planned rows from the stored plan (no API call)
+    • regenerates failed / running / pending / never-seen rows
+
+Storage is one SQLite file (WAL, safe for threads), next to the PDFs by
+default. A changed CSV hashes differently and starts a fresh run.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+STATUSES = ("pending", "running", "planned", "done", "failed")
+
+
+def file_sha256(path: str | Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+@dataclass
+class RowState:
+    row: str
+    name: str
+    status: str
+    attempts: int
+    plan: dict | None
+    output: str | None
+    error: str | None
+    elapsed: float
+
+    def completed(self) -> bool:
+        """Done, and the PDF is still on disk."""
+        return self.status == "done" and bool(self.output) and Path(self.output).exists()
+
+
+class RunJournal:
+    def __init__(self, path: str | Path, csv_path: str | Path):
+        self.path = Path(path)
+        self.csv_path = str(csv_path)
+        self.run_id = file_sha256(csv_path)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_id TEXT PRIMARY KEY, csv_path TEXT NOT NULL,"
+                " started REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rows ("
+                " run_id TEXT NOT NULL, row TEXT NOT NULL, name TEXT NOT NULL,"
+                " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " plan TEXT, output TEXT, error TEXT, elapsed REAL NOT NULL DEFAULT 0,"
+                " updated REAL NOT NULL, PRIMARY KEY (run_id, row))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def begin(self) -> bool:
+        """Register this run; False if the journal already knew it (a resume)."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            known = db.execute("SELECT 1 FROM runs WHERE run_id = ?", (self.run_id,)).fetchone()
+            db.execute(
+                "INSERT INTO runs (run_id, csv_path, started, updated) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(run_id) DO UPDATE SET csv_path = excluded.csv_path, updated = excluded.updated",
+                (self.run_id, self.csv_path, now, now),
+            )
+            db.commit()
+        return known is not None
+
+    def rows(self) -> dict[str, RowState]:
+        """Every journaled row of this run, by row key."""
+        with self._lock:
+            cur = self._db().execute(
+                "SELECT row, name, status, attempts, plan, output, error, elapsed"
+                " FROM rows WHERE run_id = ?", (self.run_id,))
+            out = {}
+            for row, name, status, attempts, plan, output, error, elapsed in cur:
+                out[row] = RowState(row, name, status, attempts, json.loads(plan) if plan else None,
+                                    output, error, elapsed)
+        return out
+
+    # ── transitions ───────────────────────────────────────────────────────
+    def queue(self, names: dict):
+        """pending, for rows ({row: name}) the journal does not know yet."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT INTO rows (run_id, row, name, status, updated) VALUES (?, ?, ?, 'pending', ?)"
+                " ON CONFLICT(run_id, row) DO NOTHING",
+                [(self.run_id, str(row), name, now) for row, name in names.items()],
+            )
+            db.commit()
+
+    def started(self, row, name: str):
+        """running; counts an attempt and drops any earlier plan / error."""
+        self._write(
+            "INSERT INTO rows (run_id, row, name, status, attempts, updated) VALUES (?, ?, ?, 'running', 1, ?)"
+            " ON CONFLICT(run_id, row) DO UPDATE SET name = excluded.name, status = 'running',"
+            " attempts = attempts + 1, plan = NULL, output = NULL, error = NULL, updated = excluded.updated",
+            (self.run_id, str(row), name, time.time()),
+        )
+
+    def planned(self, row, plan: dict):
+        self._set(row, status="planned", plan=json.dumps(plan, separators=(",", ":")), error=None)
+
+    def done(self, row, output: str | Path, elapsed: float):
+        self._set(row, status="done", output=str(output), error=None, elapsed=elapsed)
+
+    def failed(self, row, error: str, elapsed: float):
+        self._set(row, status="failed", error=error, elapsed=elapsed)
+
+    def _set(self, row, **fields):
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        self._write(f"UPDATE rows SET {cols}, updated = ? WHERE run_id = ? AND row = ?",
+                    (*fields.values(), time.time(), self.run_id, str(row)))
+
+    def _write(self, sql: str, params: tuple):
+        with self._lock:
+            db = self._db()
+            db.execute(sql, params)
+            db.execute("UPDATE runs SET updated = ? WHERE run_id = ?", (time.time(), self.run_id))
+            db.commit()
+
+    # ── reporting ─────────────────────────────────────────────────────────
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            cur = self._db().execute(
+                "SELECT status, COUNT(*) FROM rows WHERE run_id = ? GROUP BY status", (self.run_id,))
+            found = dict(cur.fetchall())
+        return {s: found.get(s, 0) for s in STATUSES}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
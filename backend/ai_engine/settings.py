@@ -0,0 +1,46 @@
+# ─── ai_engine/settings.py ────────────────────────────────────────────────
+"""
+Environment settings, with the .env file loaded on first use.
+
+    from ai_engine.settings import env
+    rpm = float(env("OPENAI_RPM", DEFAULT_RPM))
+
+Importing an ai_engine module never touches the environment: the first
+env() call loads .env (python-dotenv, if installed; variables already set
+in the process win) and every later call is a plain os.getenv. Settings
+are read when the object that needs them is first built – the LLM backend,
+the rate limiter, the plan cache, the logging handler – so a short-lived
+worker that only renders PDFs or prints --help never pays for them.
+"""
+from __future__ import annotations
+
+import os
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env(path: str | None = None) -> bool:
+    """Load .env into os.environ once per process; False if python-dotenv is missing."""
+    global _loaded
+    with _lock:
+        if _loaded:
+            return True
+        _loaded = True
+        try:
+            from dotenv import load_dotenv
+        except ImportError:
+            return False
+        load_dotenv(path)
+        return True
+
+
+def env(name: str, default: str | None = None) -> str | None:
+    if not _loaded:
+        load_env()
+    return os.getenv(name, default)
+
+
+def env_flag(name: str, default: str = "0") -> bool:
+    return str(env(name, default)).strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,284 @@
+# ─── ai_engine/streaming.py ───────────────────────────────────────────────
+"""
+Streaming completions with day-by-day validation.
+
+With stream=True the completion arrives as small text deltas. A
+DayStreamParser scans them once, tracking JSON strings and brackets, and
+hands back each object of the "7DayPlan" (or "days") array the moment its
+closing brace arrives. A StreamMonitor checks every such day against the
+calorie target:
+
+    valid        within ±TOLERANCE_KCAL
+    repairable   off target, but within MAX_REPAIR_FACTOR (repair_plan fixes it)
+    bad          unparseable, empty, or too far off to rescale
+
+After more than max_bad_days bad days the monitor raises StreamAborted, so
+the caller can cut the stream and retry instead of waiting for the rest of
+the generation. The exception carries the days judged so far (None for a
+bad one), so the retry only has to cover the bad and missing days. Per-stream timings (time to first token, time to first
+valid day, total) are kept in STREAM_LOG.
+
+Enable with OPENAI_STREAM=1, set_streaming_enabled(True) or stream=True on
+call_openai_with_retry.
+"""
+from __future__ import annotations
+
+import json
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Callable
+
+from ai_engine.log import get_logger
+from ai_engine.settings import env_flag
+
+log = get_logger(__name__)
+
+DAY_ARRAY_KEYS = ("7DayPlan", "days")
+TOLERANCE_KCAL = 150            # same band as validate_calorie_targets
+MAX_REPAIR_FACTOR = 2.0         # same cap as repair_plan
+STREAM_LOG_KEEP = 500           # streams whose full stats STREAM_LOG keeps
+
+_ENABLED: bool | None = None    # None → OPENAI_STREAM on first use
+
+
+def set_streaming_enabled(enabled: bool):
+    """Process-wide default for call_openai_with_retry(stream=None)."""
+    global _ENABLED
+    _ENABLED = enabled
+
+
+def streaming_enabled() -> bool:
+    global _ENABLED
+    if _ENABLED is None:
+        _ENABLED = env_flag("OPENAI_STREAM")
+    return _ENABLED
+
+
+class StreamAborted(Exception):
+    """The stream was cut early because the plan cannot be used."""
+
+    def __init__(self, message: str, partial: str = "", days: list[dict | None] | None = None):
+        super().__init__(message)
+        self.partial = partial
+        self.days = days or []          # decoded days in stream order, None where bad
+
+
+class DayStreamParser:
+    """
+    Incremental scanner that yields the raw JSON text of every day object as
+    soon as it is complete. Text outside the day array (markdown fences,
+    "Summary", …) is kept in `text` but otherwise ignored.
+    """
+
+    def __init__(self, array_keys=DAY_ARRAY_KEYS):
+        self.array_keys = set(array_keys)
+        self.text = ""
+        self.array_key: str | None = None      # key the day array was found under
+        self._pos = 0
+        self._stack: list[str] = []
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._last_str: str | None = None
+        self._key: str | None = None
+        self._day_depth: int | None = None
+        self._day_start: int | None = None
+        self.closed = False                    # day array finished
+
+    def feed(self, chunk: str) -> list[str]:
+        self.text += chunk
+        text, done = self.text, []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    self._last_str = text[self._str_start + 1:i]
+                continue
+            if ch == '"':
+                self._in_str, self._str_start = True, i
+            elif ch == ":":
+                self._key = self._last_str
+            elif ch in "{[":
+                self._stack.append(ch)
+                depth = len(self._stack)
+                if ch == "[" and self._day_depth is None and self._key in self.array_keys:
+                    self._day_depth, self.array_key = depth, self._key
+                elif (ch == "{" and self._day_depth is not None and not self.closed
+                      and depth == self._day_depth + 1):
+                    self._day_start = i
+            elif ch in "}]":
+                depth = len(self._stack)
+                if self._stack:
+                    self._stack.pop()
+                if self.closed or self._day_depth is None:
+                    continue
+                if ch == "]" and depth == self._day_depth:
+                    self.closed = True
+                elif ch == "}" and self._day_start is not None and depth == self._day_depth + 1:
+                    done.append(text[self._day_start:i + 1])
+                    self._day_start = None
+        self._pos = len(text)
+        return done
+
+
+def day_calories(day: dict) -> float:
+    """Sum of dish calories in one plan day (validate_calorie_targets rules)."""
+    total = 0.0
+    for meal, dishes in day.items():
+        if meal != "Day" and isinstance(dishes, dict):
+            for dish in dishes.values():
+                if isinstance(dish, dict):
+                    try:
+                        total += float(dish.get("calories", 0))
+                    except (TypeError, ValueError):
+                        pass
+    return total
+
+
+@dataclass
+class StreamStats:
+    first_token_s: float | None = None
+    first_valid_day_s: float | None = None
+    elapsed_s: float = 0.0
+    days: int = 0
+    valid_days: int = 0
+    repairable_days: int = 0
+    bad_days: int = 0
+    aborted: bool = False
+    verdicts: list[str] = field(default_factory=list)
+
+
+class StreamMonitor:
+    """
+    Feeds deltas to a DayStreamParser and judges each finished day.
+
+    loads     text → object (lets the caller plug in its tolerant cleaner)
+    decode    response-format decoder (e.g. DishIdProtocol.expand); days of a
+              non-plan array are decoded one at a time as {key: [day]}
+    """
+
+    def __init__(self, target_calories: int, loads: Callable[[str], object] = json.loads,
+                 decode: Callable[[dict], dict] | None = None, max_bad_days: int = 0,
+                 tolerance: float = TOLERANCE_KCAL, max_factor: float = MAX_REPAIR_FACTOR):
+        self.target = target_calories
+        self.loads = loads
+        self.decode = decode
+        self.max_bad_days = max_bad_days
+        self.tolerance = tolerance
+        self.max_factor = max_factor
+        self.parser = DayStreamParser()
+        self.stats = StreamStats()
+        self.days: list[dict | None] = []
+        self._t0 = time.perf_counter()
+
+    def _since_start(self) -> float:
+        return round(time.perf_counter() - self._t0, 3)
+
+    def _judge(self, raw_day: str) -> tuple[str, dict | None]:
+        try:
+            day = self.loads(raw_day)
+            if self.decode is not None and self.parser.array_key != "7DayPlan":
+                day = self.decode({self.parser.array_key: [day]})["7DayPlan"][0]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return "bad", None
+        if not isinstance(day, dict):
+            return "bad", None
+        total = day_calories(day)
+        if abs(total - self.target) <= self.tolerance:
+            return "valid", day
+        if total > 0 and 1 / self.max_factor <= total / self.target <= self.max_factor:
+            return "repairable", day
+        return "bad", None
+
+    def feed(self, delta: str):
+        if self.stats.first_token_s is None:
+            self.stats.first_token_s = self._since_start()
+        for raw_day in self.parser.feed(delta):
+            verdict, day = self._judge(raw_day)
+            self.days.append(day)
+            s = self.stats
+            s.days += 1
+            s.verdicts.append(verdict)
+            if verdict == "valid":
+                s.valid_days += 1
+                if s.first_valid_day_s is None:
+                    s.first_valid_day_s = self._since_start()
+            elif verdict == "repairable":
+                s.repairable_days += 1
+            else:
+                s.bad_days += 1
+                if s.bad_days > self.max_bad_days:
+                    s.aborted = True
+                    self.finish()
+                    raise StreamAborted(f"day {s.days} unrecoverable – stream aborted "
+                                        f"after {s.elapsed_s:.1f}s", self.parser.text, list(self.days))
+
+    def finish(self) -> str:
+        """Close the books on this stream; returns the full text received."""
+        self.stats.elapsed_s = self._since_start()
+        STREAM_LOG.record(self.stats)
+        s = self.stats
+        log.debug("Stream: %d day(s) in %.1fs (%d valid, %d repairable, %d bad); first valid day after %ss",
+                  s.days, s.elapsed_s, s.valid_days, s.repairable_days, s.bad_days, s.first_valid_day_s,
+                  extra={"days": s.days, "elapsed_s": round(s.elapsed_s, 3), "bad_days": s.bad_days,
+                         "aborted": s.aborted})
+        return self.parser.text
+
+
+class StreamLog:
+    """
+    Timings of the streams in the process (thread-safe). Counts and means
+    cover every stream; the median and "last" come from the most recent
+    `keep` streams only, so a long-lived worker does not grow without bound.
+    """
+
+    def __init__(self, keep: int = STREAM_LOG_KEEP):
+        self._lock = threading.Lock()
+        self.streams: deque[StreamStats] = deque(maxlen=keep)
+        self.count = 0
+        self.aborted = 0
+        self.elapsed_total_s = 0.0
+        self.first_valid_count = 0
+        self.first_valid_total_s = 0.0
+
+    def record(self, stats: StreamStats):
+        with self._lock:
+            self.streams.append(stats)
+            self.count += 1
+            self.aborted += stats.aborted
+            self.elapsed_total_s += stats.elapsed_s
+            if stats.first_valid_day_s is not None:
+                self.first_valid_count += 1
+                self.first_valid_total_s += stats.first_valid_day_s
+
+    def summary(self) -> dict:
+        with self._lock:
+            streams = list(self.streams)
+            count, aborted, elapsed = self.count, self.aborted, self.elapsed_total_s
+            n_first, first_total = self.first_valid_count, self.first_valid_total_s
+        recent_firsts = [s.first_valid_day_s for s in streams if s.first_valid_day_s is not None]
+        return {
+            "streams": count,
+            "aborted": aborted,
+            "time_to_first_valid_day_s": {
+                "mean": round(first_total / n_first, 3) if n_first else None,
+                "median": round(statistics.median(recent_firsts), 3) if recent_firsts else None,
+            },
+            "mean_elapsed_s": round(elapsed / count, 3) if count else None,
+            "last": asdict(streams[-1]) if streams else None,
+        }
+
+
+STREAM_LOG = StreamLog()
+
+
+def streaming_stats() -> dict:
+    return STREAM_LOG.summary()
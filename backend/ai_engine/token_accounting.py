@@ -0,0 +1,232 @@
+# ─── ai_engine/token_accounting.py ────────────────────────────────────────
+"""
+Token counting and usage accounting.
+
+count_tokens() counts with the model's BPE encoding through tiktoken
+(TOKEN_ENCODING, default o200k_base – the gpt-4o encoding), loaded on the
+first count. Nothing is downloaded at runtime: tiktoken is only used when
+its vocabulary file is already cached (TIKTOKEN_CACHE_DIR, default
+<tmp>/data-gym-cache; fill it once with tiktoken.get_encoding() on a
+machine with network access). Otherwise counts fall back to
+approx_tokens(), an offline *estimate*: the text is split with the same
+kind of pre-tokenizer regex those encodings use (words with their leading
+space, digit groups of ≤3, punctuation runs, whitespace runs) and each
+piece is charged by its length. The estimate is close enough to compare
+encodings and budgets, not to bill by. Any other tokenizer can be plugged
+in with set_tokenizer(lambda text: n).
+
+trim_to_budget() cuts a dish selection to what fits a token budget, and
+the UsageLedger records the prompt/completion `usage` each API response
+reports, next to our own estimate for the same prompt.
+
+    python -m ai_engine.token_accounting      # json vs table prompt size
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import re
+import tempfile
+import threading
+from typing import Callable
+
+from ai_engine.dish_index import dish_json, dish_row
+from ai_engine.log import get_logger
+from ai_engine.settings import env
+
+log = get_logger(__name__)
+
+_PRETOKEN = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)"             # contractions
+    r"|[^\r\n\w]?[^\W\d_]+"             # word, optionally with one leading symbol/space
+    r"|\d{1,3}"                         # digits, grouped by three
+    r"| ?(?:[^\s\w]|_)+[\r\n]*"         # punctuation run
+    r"|\s*[\r\n]+"                      # newlines
+    r"|\s+(?!\S)|\s+",                  # other whitespace
+    re.IGNORECASE,
+)
+CHARS_PER_WORD_TOKEN = 7        # longer words split into sub-word pieces
+CHARS_PER_SYMBOL_TOKEN = 2      # e.g. '":"' / '},{' merge into 1–2 tokens
+
+
+def _piece_tokens(piece: str) -> int:
+    core = piece.strip()
+    if not core:
+        return 1
+    if core[-1].isalpha():
+        return math.ceil(len(core) / CHARS_PER_WORD_TOKEN)
+    if core.isdigit():
+        return 1
+    return math.ceil(len(core) / CHARS_PER_SYMBOL_TOKEN)
+
+
+def approx_tokens(text: str) -> int:
+    """Estimated number of model tokens in text (no vocabulary needed)."""
+    return sum(_piece_tokens(m.group()) for m in _PRETOKEN.finditer(text or ""))
+
+
+MESSAGE_OVERHEAD_TOKENS = 4     # role + separators per chat message
+DEFAULT_ENCODING = "o200k_base"
+VOCABULARY_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+CACHED_ENCODINGS = ("cl100k_base", "o200k_base")    # single-file vocabularies we look for
+_TOKENIZER: Callable[[str], int] | None = None      # None → tiktoken, else approx_tokens
+_tokenizer_lock = threading.Lock()
+
+
+def vocabulary_cached(name: str) -> bool:
+    """True if tiktoken can load encoding `name` from its cache, without a download."""
+    if name not in CACHED_ENCODINGS:
+        return False
+    cache_dir = (os.environ.get("TIKTOKEN_CACHE_DIR") or os.environ.get("DATA_GYM_CACHE_DIR")
+                 or os.path.join(tempfile.gettempdir(), "data-gym-cache"))
+    key = hashlib.sha1(VOCABULARY_URL.format(name).encode()).hexdigest()
+    return os.path.isfile(os.path.join(cache_dir, key))
+
+
+def _default_tokenizer() -> Callable[[str], int]:
+    name = env("TOKEN_ENCODING", DEFAULT_ENCODING)
+    if not vocabulary_cached(name):
+        log.info("No cached %s vocabulary; token counts are estimates", name)
+        return approx_tokens
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding(name)
+    except Exception as e:      # not installed, corrupt cache file
+        log.info("No %s tokenizer (%s); token counts are estimates", name, e)
+        return approx_tokens
+    return lambda text: len(enc.encode(text, disallowed_special=()))
+
+
+def get_tokenizer() -> Callable[[str], int]:
+    global _TOKENIZER
+    if _TOKENIZER is None:
+        with _tokenizer_lock:
+            if _TOKENIZER is None:
+                _TOKENIZER = _default_tokenizer()
+    return _TOKENIZER
+
+
+def set_tokenizer(tokenizer: Callable[[str], int] | None = None):
+    """Use tokenizer(text) → int for all counts; None restores the default."""
+    global _TOKENIZER
+    _TOKENIZER = tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Number of model tokens in text, using the configured tokenizer."""
+    return get_tokenizer()(text or "")
+
+
+def chat_prompt_tokens(messages: list[dict]) -> int:
+    """Prompt tokens of a chat request (message contents + per-message overhead)."""
+    return sum(count_tokens(m.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+# ── dish budgets ──────────────────────────────────────────────────────────
+def dish_tokens(dish: dict, encoding: str = "json") -> int:
+    """Tokens one dish adds to a meal block (its JSON object or table row + separator)."""
+    return count_tokens(dish_row(dish) if encoding == "table" else dish_json(dish)) + 1
+
+
+def trim_to_budget(dish_selection: dict[str, list[dict]], budget: int,
+                   encoding: str = "json", min_per_meal: int = 3) -> dict[str, list[dict]]:
+    """
+    Keep the longest per-meal prefixes of the dish lists whose rows fit in
+    budget tokens, filling the meals round-robin so no meal is starved.
+    Every meal keeps at least min_per_meal dishes (if it has them).
+    """
+    kept = {meal: [] for meal in dish_selection}
+    open_meals = [meal for meal, dishes in dish_selection.items() if dishes]
+    spent, depth = 0, 0
+    while open_meals:
+        still_open = []
+        for meal in open_meals:
+            dishes = dish_selection[meal]
+            cost = dish_tokens(dishes[depth], encoding)
+            if depth >= min_per_meal and spent + cost > budget:
+                continue
+            kept[meal].append(dishes[depth])
+            spent += cost
+            if depth + 1 < len(dishes):
+                still_open.append(meal)
+        open_meals, depth = still_open, depth + 1
+    return kept
+
+
+# ── usage reported by the API ─────────────────────────────────────────────
+class UsageLedger:
+    """Running totals of response `usage` blocks (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_prompt_tokens = 0
+
+    def record(self, usage: dict | None, estimated_prompt: int | None = None):
+        if not usage:
+            return
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += int(usage.get("prompt_tokens", 0))
+            self.completion_tokens += int(usage.get("completion_tokens", 0))
+            if estimated_prompt:
+                self.estimated_prompt_tokens += int(estimated_prompt)
+
+    def stats(self) -> dict:
+        with self._lock:
+            est = self.estimated_prompt_tokens
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                # actual / estimated prompt size – how far off the local count is
+                "estimate_ratio": round(self.prompt_tokens / est, 3) if est else None,
+            }
+
+
+USAGE = UsageLedger()
+
+
+def record_usage(usage: dict | None, estimated_prompt: int | None = None):
+    USAGE.record(usage, estimated_prompt)
+
+
+def token_usage_stats() -> dict:
+    return USAGE.stats()
+
+
+def compare_prompt_encodings(payload: dict, dish_selection: dict, target_calories: int) -> dict:
+    """
+    Size of the compact prompt in each dish encoding:
+    {encoding: {"chars": n, "tokens": n}, "token_saving": fraction vs json}.
+    """
+    from ai_engine.openai_client import PROMPT_ENCODINGS, assemble_compact_prompt
+
+    sizes = {}
+    for encoding in PROMPT_ENCODINGS:
+        prompt = assemble_compact_prompt(payload, dish_selection, target_calories, encoding)
+        sizes[encoding] = {"chars": len(prompt), "tokens": count_tokens(prompt)}
+    base = sizes["json"]["tokens"]
+    sizes["token_saving"] = round(1 - sizes["table"]["tokens"] / base, 3) if base else 0.0
+    return sizes
+
+
+if __name__ == "__main__":
+    import json
+
+    from ai_engine.openai_client import create_dish_selection_from_csv, load_cuisine_database
+
+    df = load_cuisine_database()
+    report = {}
+    for freq in (3, 4, 5):
+        payload = {"user_profile": {"Diet type": "Veg", "Meal frequency in a day": freq}}
+        selection = create_dish_selection_from_csv(df, "Veg", region="Mixed")
+        report[f"{freq} meals"] = compare_prompt_encodings(payload, selection, 1800)
+    print(json.dumps(report, indent=2))
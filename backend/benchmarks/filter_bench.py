@@ -0,0 +1,191 @@
+# ─── benchmarks/filter_bench.py ───────────────────────────────────────────
+"""
+Filtering latency and memory on large synthetic catalogs.
+
+For each catalog size (default 10k, 100k and 1M dishes) a fresh child
+process
+
+    1. generates the catalog (benchmarks.synthetic_catalog) and writes the CSV
+    2. loads it with load_cuisine_database()  – CSV parse + DishIndex build
+    3. runs --profiles user preference profiles (diet type × region ×
+       disliked ingredients) through
+         filter_dishes_by_preferences   one call per meal type
+         create_dish_selection_from_csv
+       twice: "cold" (first sight of every ingredient term / selection key)
+       and "warm" (term masks and SELECTION_CACHE populated)
+
+and reports per-stage latency (mean / p50 / p95), RSS after the load, peak
+RSS, and the fitted scaling exponent of every stage's mean latency vs
+catalog size (1.0 = linear).
+
+    cd backend
+    python -m benchmarks.filter_bench --out filter_bench.json
+    python -m benchmarks.filter_bench --sizes 10000 100000 --profiles 20
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.pipeline_bench import BACKEND_DIR, StageClock, git_commit, peak_rss_mb
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_PROFILES = 40
+DIET_TYPES = ("Vegetarian", "Non-Vegetarian", "Eggetarian", "Jain")
+REGIONS = ("North Indian", "South Indian", "Both", None)
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+
+
+def current_rss_mb() -> float | None:
+    """Resident set size right now (Linux /proc; None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def preference_profiles(n: int, vocab: list[str], seed: int = 0) -> list[dict]:
+    """n distinct-ish (diet, region, dislikes) combinations."""
+    rng = random.Random(seed)
+    return [{
+        "diet_type": rng.choice(DIET_TYPES),
+        "region": rng.choice(REGIONS),
+        "dislikes": rng.sample(vocab, rng.choice((0, 1, 2, 3))) if vocab else [],
+    } for _ in range(n)]
+
+
+def run_size(n_dishes: int, n_profiles: int = DEFAULT_PROFILES, seed: int = 0) -> dict:
+    from ai_engine.openai_client import (
+        create_dish_selection_from_csv,
+        filter_dishes_by_preferences,
+        load_cuisine_database,
+    )
+    from benchmarks.synthetic_catalog import CatalogModel, synthetic_catalog
+
+    clock = StageClock()
+    model = CatalogModel()
+    vocab = [w.lower() for words in model.vocab.values() for w in words if len(w.split()) == 1]
+    profiles = preference_profiles(n_profiles, sorted(set(vocab)), seed)
+    sink = io.StringIO()
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(sink):
+        csv_path = Path(tmp) / "catalog.csv"
+        with clock.stage("generate"):
+            catalog = synthetic_catalog(n_dishes, seed, model)
+        with clock.stage("write_csv"):
+            catalog.to_csv(csv_path, index=False)
+        del catalog
+        csv_mb = round(csv_path.stat().st_size / 2**20, 1)
+
+        with clock.stage("catalog_load"):
+            df = load_cuisine_database(csv_path)
+        rss_loaded = current_rss_mb()
+
+        kept = []
+        for phase in ("cold", "warm"):
+            for p in profiles:
+                for meal in MEAL_TYPES:
+                    with clock.stage(f"filter_{phase}"):
+                        rows = filter_dishes_by_preferences(df, p["diet_type"], meal, p["region"],
+                                                            dislikes=p["dislikes"])
+                    if phase == "cold":
+                        kept.append(len(rows))
+                with clock.stage(f"selection_{phase}"):
+                    create_dish_selection_from_csv(df, p["diet_type"], p["region"], dislikes=p["dislikes"])
+
+    return {
+        "dishes": n_dishes,
+        "profiles": n_profiles,
+        "csv_mb": csv_mb,
+        "rss_after_load_mb": rss_loaded,
+        "peak_rss_mb": peak_rss_mb(),
+        "mean_rows_kept_per_filter": round(sum(kept) / len(kept), 1) if kept else 0,
+        "stages": clock.summary(),
+    }
+
+
+def scaling_exponents(runs: list[dict]) -> dict:
+    """Least-squares slope of log(mean latency) vs log(catalog size), per stage."""
+    if len(runs) < 2:
+        return {}
+    out = {}
+    for stage in runs[0]["stages"]:
+        pts = [(math.log(r["dishes"]), math.log(r["stages"][stage]["mean_ms"]))
+               for r in runs if r["stages"].get(stage, {}).get("mean_ms", 0) > 0]
+        if len(pts) < 2:
+            continue
+        mx = sum(x for x, _ in pts) / len(pts)
+        my = sum(y for _, y in pts) / len(pts)
+        sxx = sum((x - mx) ** 2 for x, _ in pts)
+        out[stage] = round(sum((x - mx) * (y - my) for x, y in pts) / sxx, 2) if sxx else None
+    return out
+
+
+def _run_child(n_dishes: int, n_profiles: int, seed: int) -> dict:
+    cmd = [sys.executable, "-m", "benchmarks.filter_bench", "--child", "--sizes", str(n_dishes),
+           "--profiles", str(n_profiles), "--seed", str(seed)]
+    out = subprocess.run(cmd, cwd=BACKEND_DIR, env={**os.environ, "LLM_BACKEND": "fake", "LOG_LEVEL": "WARNING"},
+                         check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(out.stdout)
+
+
+def main(argv=None) -> int:
+    argp = argparse.ArgumentParser(description="Filter-engine scaling benchmark on synthetic catalogs")
+    argp.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES),
+                      help="catalog sizes (dishes), one run each")
+    argp.add_argument("--profiles", type=int, default=DEFAULT_PROFILES,
+                      help="user preference profiles per run")
+    argp.add_argument("--seed", type=int, default=0)
+    argp.add_argument("--out", help="write the JSON report here (default: stdout)")
+    argp.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    a = argp.parse_args(argv)
+
+    if a.child:
+        print(json.dumps(run_size(a.sizes[0], a.profiles, a.seed)))
+        return 0
+
+    runs = []
+    for n in a.sizes:
+        print(f"… {n} dishes", file=sys.stderr)
+        t0 = time.perf_counter()
+        runs.append(_run_child(n, a.profiles, a.seed))
+        r, s = runs[-1], runs[-1]["stages"]
+        print(f"  load {s['catalog_load']['mean_ms']:.0f} ms, filter cold/warm "
+              f"{s['filter_cold']['mean_ms']:.2f}/{s['filter_warm']['mean_ms']:.2f} ms, selection cold/warm "
+              f"{s['selection_cold']['mean_ms']:.2f}/{s['selection_warm']['mean_ms']:.2f} ms, "
+              f"peak RSS {r['peak_rss_mb']} MB ({time.perf_counter() - t0:.0f}s)", file=sys.stderr)
+
+    report = {
+        "benchmark": "filter_scaling",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": runs,
+        "scaling_exponent": scaling_exponents(runs),
+    }
+    text = json.dumps(report, indent=2)
+    if a.out:
+        Path(a.out).write_text(text)
+        print(f"Report written to {a.out}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# ─── benchmarks/import_bench.py ───────────────────────────────────────────
+"""
+Startup cost of the entry points, measured with python -X importtime.
+
+Every target is started --repeat times in a fresh interpreter (after one
+untimed warm-up run that also writes the .pyc files). The report keeps the
+median import time (sum of the top-level cumulative times importtime
+prints), the median process wall time, and the slowest top-level imports.
+
+Targets must also stay light: none of them may import a FORBIDDEN package
+(openai, pandas) – those load on first use, see ai_engine.settings.
+
+    pdf_only        import ai_engine.pdf_generator
+    cli_help        python -m ai_engine.batch_runner --help
+    main_usage      python -m ai_engine.main   (prints usage)
+    openai_client   import ai_engine.openai_client
+    planner         import ai_engine.planner
+    flask_app       import app  (frontend/, skipped if flask is missing)
+
+    cd backend
+    python -m benchmarks.import_bench --out import_bench.json
+    python -m benchmarks.import_bench --compare import_bench.json
+
+Exits with status 1 if a target imports a forbidden package, or (with
+--compare) if a median import time got more than --tolerance worse.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.pipeline_bench import BACKEND_DIR, git_commit
+
+FRONTEND_DIR = BACKEND_DIR.parent / "frontend"
+FORBIDDEN = ("openai", "pandas")
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25        # 25 % slower than the baseline → regression
+NOISE_FLOOR_MS = 5.0            # interpreter startup jitter
+TOP_N = 8
+
+TARGETS = {
+    "pdf_only": (["-c", "import ai_engine.pdf_generator"], BACKEND_DIR),
+    "cli_help": (["-m", "ai_engine.batch_runner", "--help"], BACKEND_DIR),
+    "main_usage": (["-m", "ai_engine.main"], BACKEND_DIR),
+    "openai_client": (["-c", "import ai_engine.openai_client"], BACKEND_DIR),
+    "planner": (["-c", "import ai_engine.planner"], BACKEND_DIR),
+    "flask_app": (["-c", "import app"], FRONTEND_DIR),
+}
+
+# "import time:       412 |       1033 |   ai_engine.metrics"
+_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)")
+
+
+def parse_importtime(stderr: str) -> tuple[float, list[tuple[str, float]], set[str]]:
+    """(total ms, [(top-level module, cumulative ms)], every module imported)."""
+    top, modules = [], set()
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        modules.add(m.group(4))
+        if len(m.group(3)) <= 1:            # no nesting → imported by the target itself
+            top.append((m.group(4), int(m.group(2)) / 1000))
+    return sum(ms for _, ms in top), top, modules
+
+
+def forbidden_in(modules: set[str]) -> list[str]:
+    return sorted(f for f in FORBIDDEN if any(m == f or m.startswith(f + ".") for m in modules))
+
+
+def run_target(name: str, repeat: int = DEFAULT_REPEAT) -> dict:
+    args, cwd = TARGETS[name]
+    if name == "flask_app" and importlib.util.find_spec("flask") is None:
+        return {"target": name, "skipped": "flask not installed"}
+
+    cmd = [sys.executable, "-X", "importtime", *args]
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONPATH"}
+    totals, walls, last = [], [], None
+    for i in range(repeat + 1):
+        t0 = time.perf_counter()
+        out = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+        wall = (time.perf_counter() - t0) * 1000
+        total, top, modules = parse_importtime(out.stderr)
+        if not top:
+            return {"target": name, "error": out.stderr.strip().splitlines()[-1:] or [f"exit {out.returncode}"]}
+        if i:                                # run 0 is the warm-up
+            totals.append(total)
+            walls.append(wall)
+            last = (top, modules)
+
+    top, modules = last
+    return {
+        "target": name,
+        "command": " ".join(["python", *args]),
+        "import_ms": round(statistics.median(totals), 1),
+        "import_ms_min": round(min(totals), 1),
+        "wall_ms": round(statistics.median(walls), 1),
+        "modules": len(modules),
+        "forbidden": forbidden_in(modules),
+        "slowest": [{"module": m, "ms": round(ms, 1)}
+                    for m, ms in sorted(top, key=lambda t: -t[1])[:TOP_N]],
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """Regressions of report against baseline (targets present in both)."""
+    base = {r["target"]: r for r in baseline.get("targets", []) if "import_ms" in r}
+    problems = []
+    for run in report["targets"]:
+        ref = base.get(run["target"])
+        if ref is None or "import_ms" not in run:
+            continue
+        if (run["import_ms"] > ref["import_ms"] * (1 + tolerance)
+                and run["import_ms"] - ref["import_ms"] > NOISE_FLOOR_MS):
+            problems.append(f"{run['target']}: import {run['import_ms']} ms > baseline {ref['import_ms']} ms")
+    return problems
+
+
+def main(argv=None) -> int:
+    argp = argparse.ArgumentParser(description="Import-time benchmark of the entry points")
+    argp.add_argument("--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    argp.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per target")
+    argp.add_argument("--out", help="write the JSON report here (default: stdout)")
+    argp.add_argument("--compare", help="earlier report to check for regressions")
+    argp.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    a = argp.parse_args(argv)
+
+    runs = []
+    for name in a.targets:
+        runs.append(run_target(name, max(1, a.repeat)))
+        r = runs[-1]
+        if "import_ms" in r:
+            print(f"{name:<14} import {r['import_ms']:>7.1f} ms  wall {r['wall_ms']:>7.1f} ms  "
+                  f"{r['modules']:>4} modules" + (f"  FORBIDDEN {r['forbidden']}" if r["forbidden"] else ""),
+                  file=sys.stderr)
+        else:
+            print(f"{name:<14} {r.get('skipped') or r.get('error')}", file=sys.stderr)
+
+    report = {
+        "benchmark": "import_time",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": a.repeat,
+        "targets": runs,
+    }
+    text = json.dumps(report, indent=2)
+    if a.out:
+        Path(a.out).write_text(text)
+        print(f"Report written to {a.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    problems = [f"{r['target']}: imports {', '.join(r['forbidden'])}" for r in runs if r.get("forbidden")]
+    problems += [f"{r['target']}: failed to start: {r['error']}" for r in runs if "error" in r]
+    if a.compare:
+        problems += compare(report, json.loads(Path(a.compare).read_text()), a.tolerance)
+    for p in problems:
+        print(f"REGRESSION: {p}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+# ─── benchmarks/pipeline_bench.py ─────────────────────────────────────────
+"""
+End-to-end benchmark of the plan pipeline with the offline LLM backend.
+
+For every size (default 1, 100 and 10 000 synthetic users) a fresh child
+process runs the batch path user by user
+
+    row_to_user → generate_plan (payload, catalog load, filtering, prompt
+    assembly, LLM call, parsing + validation) → create_pdf
+
+and reports per-stage wall time, throughput and peak RSS. Sizes run in
+separate processes so each peak RSS is that size's own. Stages are timed by
+wrapping the pipeline functions in place; nested stages are inclusive
+(plan_total contains filtering, llm_call, …).
+
+    cd backend
+    python -m benchmarks.pipeline_bench --out bench.json
+    python -m benchmarks.pipeline_bench --sizes 1 100 --compare bench.json
+
+--compare exits with status 1 if throughput or a stage's mean time got more
+than --tolerance worse than in the given earlier report.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SIZES = (1, 100, 10_000)
+DEFAULT_TOLERANCE = 0.20        # 20 % slower than the baseline → regression
+NOISE_FLOOR_MS = 1.0            # stage slow-downs smaller than this are ignored
+
+# Environment of the child runs: offline LLM (never rate limited), no disk
+# cache, per-user log lines off.
+BENCH_ENV = {
+    "LLM_BACKEND": "fake",
+    "LOG_LEVEL": "WARNING",
+    "PLAN_CACHE": "off",
+}
+
+
+# ── synthetic survey rows ─────────────────────────────────────────────────
+def synthetic_users(n: int, seed: int = 0):
+    """n survey rows with the columns batch_runner reads, as a DataFrame."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        gender = rng.choice(("Male", "Female"))
+        rows.append({
+            "Name of the employee": f"Bench User {i:05d}",
+            "Official Email address": f"user{i}@example.com",
+            "Department": rng.choice(("IT", "HR", "Sales", "Ops")),
+            "Gender": gender,
+            "Age": rng.randint(21, 60),
+            "Current body Weight": rng.randint(50, 95) if gender == "Male" else rng.randint(42, 85),
+            "Current Height (in cm)": rng.randint(165, 190) if gender == "Male" else rng.randint(150, 175),
+            "Activity level": rng.randint(1, 10),
+            "Rate your stress level": rng.randint(1, 5),
+            "Goals": rng.choice(("Fat loss", "Muscle gain", "General wellness", "Weight gain")),
+            "Diet type": rng.choice(("Vegetarian", "Non-Vegetarian", "Eggetarian", "Jain")),
+            "Meal frequency in a day": rng.choice((3, 3, 4, 5)),
+            "Any regional preference ( state wise)(like North Indian or south indian)":
+                rng.choice(("North Indian", "South Indian", "Both")),
+            "Any food allergies (Gluten intolerance / Lactose Intolerance or any other)":
+                rng.choice(("no", "no", "no", "Lactose Intolerance")),
+            "Are there any preferred day you don't eat non-vegetarian food":
+                rng.choice(("no", "Tuesday", "Tuesday, Thursday")),
+        })
+    return pd.DataFrame(rows)
+
+
+# ── stage clock ───────────────────────────────────────────────────────────
+class StageClock:
+    """Collects wall-time samples per stage name."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - t0)
+
+    def wrap(self, owner, attr: str, name: str):
+        """Replace owner.attr (function, method or coroutine function) with a timed version."""
+        fn = getattr(owner, attr)
+        clock = self
+
+        if inspect.iscoroutinefunction(fn):
+            async def timed(*args, **kwargs):
+                with clock.stage(name):
+                    return await fn(*args, **kwargs)
+        else:
+            def timed(*args, **kwargs):
+                with clock.stage(name):
+                    return fn(*args, **kwargs)
+        timed.__wrapped__ = fn
+        setattr(owner, attr, timed)
+
+    def summary(self) -> dict:
+        out = {}
+        for name, xs in sorted(self.samples.items()):
+            ordered = sorted(xs)
+            out[name] = {
+                "count": len(xs),
+                "total_s": round(sum(xs), 4),
+                "mean_ms": round(statistics.fmean(xs) * 1000, 3),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return out
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss: KiB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ── one size, in this process ─────────────────────────────────────────────
+def run_size(n_users: int, mode: str = "llm", seed: int = 0, quiet: bool = True) -> dict:
+    from ai_engine import openai_client, planner
+    from ai_engine.batch_runner import row_to_user
+    from ai_engine.dish_protocol import DishIdProtocol
+    from ai_engine.llm_backends import get_llm_backend
+    from ai_engine.pdf_generator import create_pdf
+
+    clock = StageClock()
+    clock.wrap(planner, "build_payload", "payload")
+    clock.wrap(openai_client, "load_cuisine_database", "catalog_load")
+    clock.wrap(openai_client, "create_dish_selection_from_csv", "filtering")
+    clock.wrap(openai_client, "assemble_prompt", "prompt_assembly")
+    clock.wrap(openai_client, "assemble_day_prompt", "prompt_assembly")
+    clock.wrap(DishIdProtocol, "prompt", "prompt_assembly")
+    clock.wrap(openai_client, "_plan_from_raw", "parse_validate")
+    backend = get_llm_backend()
+    clock.wrap(backend, "create", "llm_call")
+    clock.wrap(backend, "acreate", "llm_call")
+
+    df = synthetic_users(n_users, seed)
+    rss_start = peak_rss_mb()
+    failures = 0
+    sink = io.StringIO()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = str(Path(tmp) / "plan.pdf")
+        t0 = time.perf_counter()
+        for idx in df.index:
+            with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+                try:
+                    with clock.stage("row_to_user"):
+                        user = row_to_user(df.loc[idx])
+                    with clock.stage("plan_total"):
+                        plan = planner.generate_plan(user, mode=mode)
+                    with clock.stage("pdf"):
+                        create_pdf(plan, pdf_path)
+                except Exception as e:
+                    failures += 1
+                    print(f"user {idx}: {type(e).__name__}: {e}", file=sys.stderr)
+            sink.seek(0)
+            sink.truncate()
+        wall = time.perf_counter() - t0
+
+    return {
+        "users": n_users,
+        "mode": mode,
+        "wall_s": round(wall, 3),
+        "throughput_users_per_s": round(n_users / wall, 2) if wall else None,
+        "failures": failures,
+        "rss_at_start_mb": rss_start,
+        "peak_rss_mb": peak_rss_mb(),
+        "dish_selection_cache": openai_client.dish_selection_cache_stats(),
+        "stages": clock.summary(),
+    }
+
+
+# ── driver ────────────────────────────────────────────────────────────────
+def _run_child(n_users: int, mode: str, seed: int) -> dict:
+    """run_size in a fresh interpreter, so peak RSS is per size."""
+    env = {**os.environ, **BENCH_ENV}
+    cmd = [sys.executable, "-m", "benchmarks.pipeline_bench", "--child",
+           "--sizes", str(n_users), "--mode", mode, "--seed", str(seed)]
+    out = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(out.stdout)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """Regressions of report against baseline (matching sizes only)."""
+    base_runs = {r["users"]: r for r in baseline.get("runs", [])}
+    problems = []
+    for run in report["runs"]:
+        base = base_runs.get(run["users"])
+        if base is None:
+            continue
+        n = run["users"]
+        if run["throughput_users_per_s"] < base["throughput_users_per_s"] * (1 - tolerance):
+            problems.append(f"{n} users: throughput {run['throughput_users_per_s']} "
+                            f"< baseline {base['throughput_users_per_s']} users/s")
+        for stage, stats in run["stages"].items():
+            ref = base["stages"].get(stage)
+            if (ref and stats["mean_ms"] > ref["mean_ms"] * (1 + tolerance)
+                    and stats["mean_ms"] - ref["mean_ms"] > NOISE_FLOOR_MS):
+                problems.append(f"{n} users: {stage} mean {stats['mean_ms']} ms "
+                                f"> baseline {ref['mean_ms']} ms")
+    return problems
+
+
+def main(argv=None) -> int:
+    from ai_engine.openai_client import PLAN_MODES
+
+    argp = argparse.ArgumentParser(description="End-to-end plan pipeline benchmark (offline LLM)")
+    argp.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES),
+                      help="numbers of synthetic users, one run each")
+    argp.add_argument("--mode", choices=PLAN_MODES, default="llm")
+    argp.add_argument("--seed", type=int, default=0)
+    argp.add_argument("--out", help="write the JSON report here (default: stdout)")
+    argp.add_argument("--compare", help="earlier report to check for regressions")
+    argp.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    argp.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    a = argp.parse_args(argv)
+
+    if a.child:
+        print(json.dumps(run_size(a.sizes[0], a.mode, a.seed)))
+        return 0
+
+    runs = []
+    for n in a.sizes:
+        print(f"… {n} users", file=sys.stderr)
+        runs.append(_run_child(n, a.mode, a.seed))
+        r = runs[-1]
+        print(f"  {r['wall_s']}s, {r['throughput_users_per_s']} users/s, "
+              f"peak RSS {r['peak_rss_mb']} MB, {r['failures']} failed", file=sys.stderr)
+
+    report = {
+        "benchmark": "pipeline",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "env": BENCH_ENV,
+        "runs": runs,
+    }
+    text = json.dumps(report, indent=2)
+    if a.out:
+        Path(a.out).write_text(text)
+        print(f"Report written to {a.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if a.compare:
+        problems = compare(report, json.loads(Path(a.compare).read_text()), a.tolerance)
+        for p in problems:
+            print(f"REGRESSION: {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
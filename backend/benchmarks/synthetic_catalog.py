@@ -0,0 +1,183 @@
+# ─── benchmarks/synthetic_catalog.py ──────────────────────────────────────
+"""
+Synthetic cuisine catalogs of any size, shaped like samples/CuisineList.csv.
+
+Every synthetic dish is a variant of a real one (its "template"): portion
+and recipe are perturbed (calories/macros/quantity scale together, via
+scale_quantity), sides and ingredients are swapped for ones seen with the
+same diet label, and region / meal type are occasionally redrawn from the
+real file's distributions. The result keeps what the filters care about:
+
+    • the same columns, including the messy values ("Lunch/Dinner",
+      "Breakfast/Snack", "kerala", "Universal", empty ApprovedForBoth)
+    • the Veg / Non-Veg / Eggetarian mix and meal-type combos
+    • ApprovedForBoth = "yes" at the real rate among South-Indian dishes
+    • ingredient lists drawn from the real vocabulary per diet label
+
+    cd backend
+    python -m benchmarks.synthetic_catalog 100000 --out /tmp/catalog_100k.csv
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ai_engine.dish_index import SOUTH_REGEX
+from ai_engine.portion_optimizer import scale_quantity
+
+SOURCE_CSV = Path(__file__).resolve().parent.parent / "samples" / "CuisineList.csv"
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+PORTION_RANGE = (0.6, 1.6)      # portion variant of the template dish
+RECIPE_JITTER = 0.10            # ± per-macro recipe variation
+REDRAW_REGION = 0.5             # chance the region is redrawn from the real mix
+REDRAW_MEAL_TYPE = 0.15
+SWAP_SIDE = 0.4                 # "X + Raita" → "X + Salad"
+DROP_INGREDIENT = 0.15
+ADD_INGREDIENTS = (0, 1, 2)
+STYLES = ("Homestyle", "Dhaba Style", "Tiffin", "Festive", "Light", "Classic",
+          "Street Style", "Temple Style", "Coastal", "Hill Style")
+
+_INGREDIENT_SPLIT = re.compile(r",\s*(?![^()]*\))")     # commas outside (…)
+
+
+class CatalogModel:
+    """Empirical distributions of one or more real catalogs."""
+
+    def __init__(self, sources=(SOURCE_CSV,)):
+        df = pd.concat([pd.read_csv(p) for p in sources], ignore_index=True)
+        df = df.rename(columns={"Quantity": "Quantity (g)"})
+        df = df.dropna(subset=["Name", "Calories (kcal)"]).reset_index(drop=True)
+        if "ApprovedForBoth" not in df.columns:
+            df["ApprovedForBoth"] = np.nan
+        self.templates = df
+
+        self.regions, self.region_p = _distribution(df["State/Region"])
+        self.meal_types, self.meal_type_p = _distribution(df["Meal Type"])
+
+        south = df["State/Region"].fillna("").str.contains(SOUTH_REGEX, case=False)
+        approved = df["ApprovedForBoth"].fillna("").astype(str).str.lower() == "yes"
+        self.approved_rate = float(approved[south].mean()) if south.any() else 0.0
+
+        self.ingredients = [_split_ingredients(s) for s in df["Ingredients"].fillna("")]
+        self.sides: dict[str, list[str]] = {}
+        self.vocab: dict[str, list[str]] = {}
+        for diet, name, ings in zip(df["Veg/Non-Veg"].fillna(""), df["Name"], self.ingredients):
+            parts = [p.strip() for p in str(name).split("+")]
+            self.sides.setdefault(diet, []).extend(p for p in parts[1:] if p)
+            self.vocab.setdefault(diet, []).extend(ings)
+        self.sides = {k: sorted(set(v)) for k, v in self.sides.items()}
+        self.vocab = {k: sorted(set(v)) for k, v in self.vocab.items()}
+
+
+def _distribution(column: pd.Series) -> tuple[list[str], np.ndarray]:
+    counts = Counter(column.dropna().astype(str))
+    values = sorted(counts)
+    p = np.array([counts[v] for v in values], dtype=float)
+    return values, p / p.sum()
+
+
+def _split_ingredients(text: str) -> list[str]:
+    return [s.strip() for s in _INGREDIENT_SPLIT.split(str(text)) if s.strip()]
+
+
+@functools.lru_cache(maxsize=65536)
+def _scaled_quantity(quantity: str, factor: float) -> str:
+    return scale_quantity(quantity, factor)
+
+
+def synthetic_catalog(n: int, seed: int = 0, model: CatalogModel | None = None) -> pd.DataFrame:
+    """n synthetic dishes with the columns (and value mix) of the real catalog."""
+    model = model or CatalogModel()
+    rng = np.random.default_rng(seed)
+    t = model.templates
+    tpl = rng.integers(0, len(t), n)
+
+    # portion variant × recipe jitter; quantity follows the portion on a 0.05 grid
+    portion = np.round(rng.uniform(*PORTION_RANGE, n) / 0.05) * 0.05
+    jitter = rng.uniform(1 - RECIPE_JITTER, 1 + RECIPE_JITTER, (4, n))
+    cal = np.maximum(1, np.round(t["Calories (kcal)"].to_numpy(float)[tpl] * portion * jitter[0])).astype(int)
+    protein = np.round(t["Protein (g)"].fillna(0).to_numpy(float)[tpl] * portion * jitter[1], 1)
+    carbs = np.round(t["Carbs (g)"].fillna(0).to_numpy(float)[tpl] * portion * jitter[2], 1)
+    fat = np.round(t["Fat (g)"].fillna(0).to_numpy(float)[tpl] * portion * jitter[3], 1)
+
+    region = t["State/Region"].to_numpy(object)[tpl].copy()
+    redraw = rng.random(n) < REDRAW_REGION
+    region[redraw] = rng.choice(np.array(model.regions, dtype=object), redraw.sum(), p=model.region_p)
+
+    meal_type = t["Meal Type"].to_numpy(object)[tpl].copy()
+    redraw = rng.random(n) < REDRAW_MEAL_TYPE
+    meal_type[redraw] = rng.choice(np.array(model.meal_types, dtype=object), redraw.sum(), p=model.meal_type_p)
+
+    south = pd.Series(region).fillna("").astype(str).str.contains(SOUTH_REGEX, case=False).to_numpy()
+    approved = np.where(south & (rng.random(n) < model.approved_rate), "yes", "")
+
+    diet = t["Veg/Non-Veg"].fillna("").to_numpy(object)[tpl]
+    names, quantities, ingredients = [], [], []
+    base_names = t["Name"].astype(str).str.strip().to_numpy(object)
+    base_qty = t["Quantity (g)"].fillna("").astype(str).to_numpy(object)
+    swap = rng.random(n) < SWAP_SIDE
+    styles = rng.integers(0, len(STYLES), n)
+    drops = rng.random((n, 16)) < DROP_INGREDIENT
+    adds = rng.choice(ADD_INGREDIENTS, n)
+    picks = rng.random((n, 4))
+
+    for i in range(n):
+        k = tpl[i]
+        parts = [p.strip() for p in base_names[k].split("+")]
+        sides = model.sides.get(diet[i]) or []
+        if swap[i] and len(parts) > 1 and sides:
+            parts[-1] = sides[int(picks[i, 0] * len(sides))]
+        names.append(f"{' + '.join(parts)} ({STYLES[styles[i]]} #{i + 1})")
+
+        quantities.append(_scaled_quantity(base_qty[k], float(portion[i])))
+
+        ings = [s for j, s in enumerate(model.ingredients[k]) if not drops[i, j % 16]] \
+            or model.ingredients[k][:1]
+        vocab = model.vocab.get(diet[i]) or []
+        for j in range(adds[i] if vocab else 0):
+            extra = vocab[int(picks[i, 1 + j] * len(vocab))]
+            if extra not in ings:
+                ings.append(extra)
+        ingredients.append(", ".join(ings))
+
+    return pd.DataFrame({
+        "Name": names,
+        "State/Region": region,
+        "ApprovedForBoth": approved,
+        "Quantity (g)": quantities,
+        "Calories (kcal)": cal,
+        "Protein (g)": protein,
+        "Carbs (g)": carbs,
+        "Fat (g)": fat,
+        "Veg/Non-Veg": diet,
+        "Meal Type": meal_type,
+        "Ingredients": ingredients,
+    })
+
+
+def _size(text: str) -> int:
+    text = text.lower().replace("_", "")
+    return SIZES.get(text) or int(float(text))
+
+
+if __name__ == "__main__":
+    argp = argparse.ArgumentParser(description="Generate a synthetic cuisine catalog CSV")
+    argp.add_argument("size", help="number of dishes (e.g. 10000, 100k, 1m)")
+    argp.add_argument("--out", required=True, help="CSV file to write")
+    argp.add_argument("--seed", type=int, default=0)
+    argp.add_argument("--source", nargs="+", default=[str(SOURCE_CSV)],
+                      help="real catalog(s) to take the distributions from")
+    a = argp.parse_args()
+
+    t0 = time.perf_counter()
+    catalog = synthetic_catalog(_size(a.size), a.seed, CatalogModel(a.source))
+    catalog.to_csv(a.out, index=False)
+    print(f"{len(catalog)} dishes → {a.out} ({time.perf_counter() - t0:.1f}s)")
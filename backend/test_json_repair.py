@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Regression tests for lenient JSON parsing of model output
+"""
+
+import pytest
+
+from ai_engine.json_repair import loads_lenient, repair_json
+
+# stray characters where a value belongs used to stall the parser
+@pytest.mark.parametrize("text, expected", [
+    ('[1, ...]', [1]),
+    ('[1 : 2]', [1, 2]),
+    ('[1, =]', [1]),
+    ('{"a":[1 ; 2]}', {"a": [1, 2]}),
+    ('{"days":[{"day": 1}, ... ]}', {"days": [{"day": 1}]}),
+])
+def test_stray_characters_are_skipped(text, expected):
+    result = repair_json(text)
+    assert result.value == expected
+    assert any("skipped unexpected" in r for r in result.repairs)
+
+
+def test_key_without_value_is_dropped():
+    assert loads_lenient('{"a": ..., "b": 2}') == {"b": 2}
+
+
+def test_truncated_stream_prefix():
+    assert loads_lenient('{"days": [{"day": 1, "meals": [1, 2') == {"days": [{"day": 1, "meals": [1, 2]}]}
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for local plan repair and the weekly dish rules
+"""
+
+from ai_engine.portion_optimizer import MAX_MULTIPLIER, enforce_weekly_rules, repair_plan, scale_dish
+
+POHA = {"name": "Poha", "cal": 250, "p": 5.0, "c": 40.0, "f": 8.0, "quantity": "1 bowl (150g)"}
+DAL = {"name": "Dal Rice", "cal": 350, "p": 12.0, "c": 55.0, "f": 8.0, "quantity": "1 plate (300g)"}
+ROTI = {"name": "Roti Sabzi", "cal": 300, "p": 9.0, "c": 45.0, "f": 9.0, "quantity": "2 rotis + 1 bowl"}
+UPMA = {"name": "Upma", "cal": 240, "p": 6.0, "c": 38.0, "f": 7.0, "quantity": "1 bowl (150g)"}
+SELECTION = {"breakfast": [POHA, UPMA], "lunch": [DAL], "dinner": [ROTI]}
+MEAL_KCAL = {"Breakfast": 500, "Lunch": 700, "Dinner": 600}
+
+
+def day_total(day):
+    return sum(d["calories"] for meal, dishes in day.items() if meal != "Day" for d in dishes.values())
+
+
+def test_near_miss_day_is_repaired_into_range():
+    short = {"Day": "Day 1",
+             "Breakfast": {"Dish1": scale_dish(POHA, 1.6)},      # 400 of 500
+             "Lunch": {"Dish1": scale_dish(DAL, 1.6)},           # 560 of 700
+             "Dinner": {"Dish1": scale_dish(ROTI, 1.6)}}         # 480 of 600
+    on_target = {"Day": "Day 2",
+                 "Breakfast": {"Dish1": scale_dish(POHA, 2.0)},
+                 "Lunch": {"Dish1": scale_dish(DAL, 2.0)},
+                 "Dinner": {"Dish1": scale_dish(ROTI, 2.0)}}
+    assert abs(day_total(short) - 1800) > 150
+
+    plan, touched = repair_plan({"7DayPlan": [short, on_target]}, SELECTION, 1800, MEAL_KCAL)
+
+    assert touched == 1
+    assert abs(day_total(plan["7DayPlan"][0]) - 1800) <= 150
+    assert plan["7DayPlan"][0]["Breakfast"]["Dish1"]["quantity"] == "2 bowl (300g)"
+    assert plan["7DayPlan"][1] == on_target
+
+
+def test_catalog_dish_is_capped_at_max_multiplier():
+    small = {"name": "Idli", "cal": 100, "p": 3.0, "c": 20.0, "f": 0.5, "quantity": "2 pieces"}
+    day = {"Day": "Day 1", "Breakfast": {"Dish1": scale_dish(small, 2.0)}}      # 200 kcal, wants 1800
+
+    plan, _ = repair_plan({"7DayPlan": [day]}, {"breakfast": [small]}, 1800, {"Breakfast": 1800},
+                          max_factor=4.0)
+
+    assert plan["7DayPlan"][0]["Breakfast"]["Dish1"]["calories"] == int(100 * MAX_MULTIPLIER)
+
+
+def test_factor_is_bounded_by_max_factor():
+    unknown = {"name": "Chef Special", "calories": 1000, "protein": 40, "carbs": 100, "fats": 40,
+               "quantity": "2 plates"}
+    day = {"Day": "Day 1", "Lunch": {"Dish1": unknown}}                      # wants 100 kcal
+
+    plan, _ = repair_plan({"7DayPlan": [day]}, None, 100, {"Lunch": 100}, max_factor=2.0)
+
+    dish = plan["7DayPlan"][0]["Lunch"]["Dish1"]
+    assert dish["calories"] == 500                                          # 1 / max_factor
+    assert dish["quantity"] == "1 plates"
+
+
+def test_weekly_rules_swap_consecutive_repeats():
+    days = [{"Day": f"Day {n}", "Breakfast": {"Dish1": scale_dish(POHA, 2.0)}} for n in (1, 2, 3)]
+
+    fixed, swaps = enforce_weekly_rules(days, SELECTION)
+
+    names = [d["Breakfast"]["Dish1"]["name"] for d in fixed]
+    assert swaps == 1
+    assert names == ["Poha", "Upma", "Poha"]
+    assert abs(fixed[1]["Breakfast"]["Dish1"]["calories"] - 500) <= 25
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared requests/min + tokens/min limiter
+"""
+
+import pytest
+
+from ai_engine import rate_limiter
+from ai_engine.llm_backends import set_llm_backend
+from ai_engine.rate_limiter import NULL_LIMITER, RateLimiter, get_rate_limiter
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", waits.append)
+    return waits
+
+
+def test_tokens_per_minute_wait(sleeps):
+    limiter = RateLimiter(rpm=1000, tpm=600)          # 10 tokens/s
+
+    limiter.acquire(600)                              # the full minute's budget
+    limiter.acquire(300)                              # 300 more tokens → ~30 s
+
+    assert len(sleeps) == 1
+    assert sleeps[0] == pytest.approx(30, abs=0.5)
+    assert limiter.stats()["waited_s"] == pytest.approx(30, abs=0.5)
+
+
+def test_requests_per_minute_wait(sleeps):
+    limiter = RateLimiter(rpm=2, tpm=1e9)             # one request every 30 s
+
+    for _ in range(3):
+        limiter.acquire(1)
+
+    assert sleeps[0] == pytest.approx(30, abs=0.5)
+
+
+def test_penalize_holds_back_every_caller(sleeps):
+    limiter = RateLimiter(rpm=1e6, tpm=1e9)
+
+    limiter.penalize(5)
+    limiter.acquire(1)
+
+    assert sleeps[0] == pytest.approx(5, abs=0.5)
+
+
+def test_fake_backend_is_not_rate_limited():
+    set_llm_backend("fake")
+    try:
+        assert get_rate_limiter() is NULL_LIMITER
+        set_llm_backend("openai")
+        assert isinstance(get_rate_limiter(), RateLimiter)
+    finally:
+        set_llm_backend(None)
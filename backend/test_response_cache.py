@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk plan cache: expiry and size-capped eviction
+"""
+
+import pytest
+
+from ai_engine import response_cache
+from ai_engine.response_cache import PlanCache, request_key
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(response_cache.time, "time", c)
+    return c
+
+
+def plan(n):
+    return {"7DayPlan": [{"Day": f"Day {n}"}]}
+
+
+def test_request_key_is_stable_and_order_independent():
+    a = {"model": "gpt-4o", "messages": [{"role": "user", "content": "x"}], "temperature": 0.7}
+    b = {"temperature": 0.7, "messages": [{"role": "user", "content": "x"}], "model": "gpt-4o"}
+    assert request_key(a) == request_key(b)
+    assert request_key(a) != request_key({**a, "temperature": 0.2})
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = PlanCache(tmp_path / "plans.sqlite3", ttl_s=60)
+    cache.put("a", plan(1))
+
+    clock.now += 59
+    assert cache.get("a") == plan(1)
+    clock.now += 2
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = PlanCache(tmp_path / "plans.sqlite3", max_entries=2)
+    cache.put("a", plan(1))
+    clock.now += 1
+    cache.put("b", plan(2))
+    clock.now += 1
+    assert cache.get("a") == plan(1)          # a is now more recent than b
+    clock.now += 1
+    cache.put("c", plan(3))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == plan(1)
+    assert cache.get("c") == plan(3)
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = PlanCache(tmp_path / "plans.sqlite3", enabled=False)
+    cache.put("a", plan(1))
+    cache.enabled = True
+    assert cache.get("a") is None
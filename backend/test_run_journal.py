@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch run journal and batch_runner --resume
+"""
+
+import pytest
+
+from ai_engine import batch_runner, planner
+from ai_engine.run_journal import RunJournal
+from benchmarks.pipeline_bench import synthetic_users
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "survey.csv"
+    synthetic_users(3).to_csv(path, index=False)
+    return path
+
+
+def test_transitions_survive_reopening(tmp_path, csv_path):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF")
+    journal = RunJournal(tmp_path / "journal.sqlite3", csv_path)
+    assert journal.begin() is False
+    journal.queue({0: "A", 1: "B", 2: "C"})
+    journal.started(0, "A")
+    journal.planned(0, {"7DayPlan": []})
+    journal.done(0, pdf, 1.5)
+    journal.started(1, "B")
+    journal.failed(1, "boom", 0.5)
+    journal.close()
+
+    again = RunJournal(tmp_path / "journal.sqlite3", csv_path)
+    assert again.begin() is True
+    rows = again.rows()
+    assert rows["0"].completed() and rows["0"].plan == {"7DayPlan": []}
+    assert rows["1"].status == "failed" and rows["1"].error == "boom" and not rows["1"].completed()
+    assert rows["2"].status == "pending" and rows["2"].attempts == 0
+    assert again.counts() == {"pending": 1, "running": 0, "planned": 0, "done": 1, "failed": 1}
+
+
+def test_done_row_whose_pdf_is_gone_is_not_completed(tmp_path, csv_path):
+    journal = RunJournal(tmp_path / "journal.sqlite3", csv_path)
+    journal.begin()
+    journal.started(0, "A")
+    journal.done(0, tmp_path / "missing.pdf", 1.0)
+    assert not journal.rows()["0"].completed()
+
+
+def test_resume_skips_done_rows(tmp_path, csv_path, monkeypatch):
+    monkeypatch.setattr(batch_runner, "OUT_DIR", tmp_path / "out")
+    journal_path = tmp_path / "journal.sqlite3"
+    batch_runner.main(csv_path, [0, 1], False, mode="local", journal_path=journal_path)
+
+    generated = []
+    real = batch_runner.generate_plan
+    monkeypatch.setattr(batch_runner, "generate_plan",
+                        lambda payload, mode: generated.append(payload) or real(payload, mode=mode))
+    batch_runner.main(csv_path, None, True, mode="local", resume=True, journal_path=journal_path)
+
+    assert len(generated) == 1                      # only row 2 was new
+    journal = RunJournal(journal_path, csv_path)
+    rows = journal.rows()
+    assert all(rows[r].completed() for r in ("0", "1", "2"))
+    assert [rows[r].attempts for r in ("0", "1", "2")] == [1, 1, 1]
+
+
+def test_concurrent_rows_start_only_when_they_get_a_slot(tmp_path, csv_path, monkeypatch):
+    monkeypatch.setattr(batch_runner, "OUT_DIR", tmp_path / "out")
+    journal_path = tmp_path / "journal.sqlite3"
+    begun, early = [], []
+    real = planner.generate_plan_async
+
+    async def watched(user_data, mode="llm", semaphore=None):
+        begun.append(user_data["Name of the employee"])
+        journal = RunJournal(journal_path, csv_path)
+        early.extend(state.name for state in journal.rows().values()
+                     if state.status == "running" and state.name not in begun)
+        journal.close()
+        return await real(user_data, mode, semaphore)
+
+    monkeypatch.setattr(planner, "generate_plan_async", watched)
+    batch_runner.main(csv_path, [0, 1, 2], False, mode="local", concurrency=2,
+                      journal_path=journal_path)
+
+    assert len(begun) == 3 and early == []          # no queued row marked running
+    rows = RunJournal(journal_path, csv_path).rows()
+    assert all(rows[r].completed() and rows[r].attempts == 1 for r in ("0", "1", "2"))
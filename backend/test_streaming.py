@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for day-by-day stream validation and stream aborts
+"""
+
+import copy
+import json
+import re
+
+import pytest
+
+from ai_engine import openai_client as oc
+from ai_engine.llm_backends import LLMBackend, set_llm_backend
+from ai_engine.streaming import DayStreamParser, StreamAborted, StreamMonitor, day_calories
+
+DAY = {"Day": "Day 1", "Breakfast": {"Dish1": {"name": "Poha {x}", "calories": 600}},
+       "Lunch": {"Dish1": {"name": "Dal", "calories": 1200}}}
+
+
+def deltas(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_parser_yields_each_day_when_its_brace_closes():
+    days = [dict(DAY, Day=f"Day {n}") for n in (1, 2, 3)]
+    text = "```json\n" + json.dumps({"7DayPlan": days, "Summary": {"x": "}"}}) + "\n```"
+    parser = DayStreamParser()
+
+    seen = []
+    for chunk in deltas(text):
+        seen += [json.loads(raw)["Day"] for raw in parser.feed(chunk)]
+
+    assert seen == ["Day 1", "Day 2", "Day 3"]
+    assert parser.closed and parser.text == text
+
+
+def test_monitor_aborts_at_first_bad_day_and_keeps_the_good_ones():
+    bad = dict(DAY, Day="Day 2", Lunch={"Dish1": {"name": "Dal", "calories": 9000}})
+    text = json.dumps({"7DayPlan": [DAY, bad, DAY]})
+    monitor = StreamMonitor(1800)
+
+    with pytest.raises(StreamAborted) as e:
+        for chunk in deltas(text):
+            monitor.feed(chunk)
+
+    assert day_calories(DAY) == 1800
+    assert monitor.stats.verdicts == ["valid", "bad"]
+    assert e.value.days == [DAY, None]
+
+
+class _ScriptedBackend(LLMBackend):
+    """Streams `first` for the whole-week prompt and good days for day-subset prompts."""
+    rate_limited = False
+
+    def __init__(self, first, good):
+        self.first, self.good, self.prompts = first, good, []
+
+    def create(self, stream=False, **request):
+        prompt = request["messages"][-1]["content"]
+        self.prompts.append(prompt)
+        days = [int(n) for n in re.findall(r'"Day":"Day (\d+)"', prompt)]
+        plan = self.first if not days else {"7DayPlan": [self.good["7DayPlan"][n - 1] for n in days]}
+        text = json.dumps(plan)
+        return ({"choices": [{"delta": {"content": c}}]} for c in deltas(text, 48))
+
+
+def test_abort_regenerates_only_the_bad_and_missing_days():
+    payload = {"user_profile": {"Diet type": "Veg", "Meal frequency in a day": 3,
+                                "Culture preference": "North"},
+               "calorie_goal": "1800 kcal/day"}
+    req = oc.prepare_plan_request(payload, mode="local")
+    good = req.local_plan
+    first = copy.deepcopy(good)
+    for meal in first["7DayPlan"][3].values():                 # day 4 far off target
+        if isinstance(meal, dict):
+            for dish in meal.values():
+                dish["calories"] *= 3
+    backend = _ScriptedBackend(first, good)
+    set_llm_backend(backend)
+    try:
+        plan = oc.call_openai_with_retry("Create a 7-day plan", "gpt-4o", 1800, use_cache=False,
+                                         dish_selection=req.dish_selection,
+                                         meal_targets=req.meal_targets, stream=True)
+    finally:
+        set_llm_backend(None)
+
+    assert len(backend.prompts) == 2
+    assert re.findall(r'"Day":"Day (\d+)"', backend.prompts[1]) == ["4", "5", "6", "7"]
+    assert plan["7DayPlan"][:3] == good["7DayPlan"][:3]
+    assert all(v["within_range"] for v in oc.validate_calorie_targets(plan, 1800))
+
+
+def test_all_failing_attempt_is_retried_in_full():
+    payload = {"user_profile": {"Diet type": "Veg", "Meal frequency in a day": 3,
+                                "Culture preference": "North"},
+               "calorie_goal": "1800 kcal/day"}
+    req = oc.prepare_plan_request(payload, mode="local")
+    attempts = oc._PlanAttempts("Create a 7-day plan", "gpt-4o", 1800, req.dish_selection,
+                                req.meal_targets, None, 4000, 7)
+    useless = copy.deepcopy(req.local_plan)
+    for day in useless["7DayPlan"]:
+        for meal in day.values():
+            if isinstance(meal, dict):
+                for dish in meal.values():
+                    dish["calories"] *= 3
+
+    assert attempts.take(json.dumps(useless), 1, 7) is None
+    assert attempts.partial is None
+    assert attempts.next_request() == (attempts.request, 7)
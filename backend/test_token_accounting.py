@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Accuracy of the offline token estimate against known BPE token counts
+"""
+
+import pytest
+
+from ai_engine.token_accounting import approx_tokens, vocabulary_cached
+
+# token counts of the cl100k / o200k encodings
+KNOWN_COUNTS = [
+    ("hello world", 2),
+    ("Hello, world!", 4),
+    ("The quick brown fox jumps over the lazy dog", 9),
+    ("1234567", 3),
+]
+
+
+@pytest.mark.parametrize("text, tokens", KNOWN_COUNTS)
+def test_estimate_matches_known_counts(text, tokens):
+    assert approx_tokens(text) == tokens
+
+
+def test_estimate_error_on_plan_prompt():
+    tiktoken = pytest.importorskip("tiktoken")
+    if not vocabulary_cached("o200k_base"):
+        pytest.skip("o200k_base vocabulary not cached")
+    enc = tiktoken.get_encoding("o200k_base")
+    from ai_engine.openai_client import assemble_compact_prompt, create_dish_selection_from_csv, load_cuisine_database
+
+    selection = create_dish_selection_from_csv(load_cuisine_database(), "Veg", region="Mixed")
+    payload = {"user_profile": {"Diet type": "Veg", "Meal frequency in a day": 3}}
+    for encoding in ("json", "table"):
+        prompt = assemble_compact_prompt(payload, selection, 1800, encoding)
+        exact = len(enc.encode(prompt))
+        assert abs(approx_tokens(prompt) - exact) <= 0.15 * exact
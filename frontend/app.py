@@ -1,5 +1,5 @@
 # ─── frontend/app.py ──────────────────────────────────────────────────────
-import os, sys, re, time, tempfile
+import os, sys, re, time, asyncio, tempfile
 from datetime import datetime
 from pathlib import Path
 from zipfile import ZipFile
@@ -7,16 +7,17 @@ from zipfile import ZipFile
 # allow backend imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
 
-import pandas as pd
-from flask import Flask, request, redirect, url_for, render_template_string, flash, send_file
+from flask import Flask, Response, request, redirect, url_for, render_template_string, flash, send_file
 
 from ai_engine.batch_runner import row_to_user        # no COLUMN_MAP needed
-from ai_engine.planner      import generate_plan
+from ai_engine.planner      import generate_plan, generate_plans_async
 from ai_engine.pdf_generator import create_pdf
+from ai_engine.metrics      import prometheus_text
+from ai_engine.settings     import env
 
 # ── CONFIG ────────────────────────────────────────────────────────────────
-MAX_CALLS_PER_MIN = 3
-SAFETY_DELAY      = 60 / MAX_CALLS_PER_MIN + 2
+# OpenAI limits: OPENAI_TIER (or OPENAI_RPM / OPENAI_TPM) env vars (see ai_engine.rate_limiter)
+# PLAN_CONCURRENCY env var: >1 → async batch (read per request, see concurrency())
 OUT_ROOT          = Path("web_generated_plans")
 UPLOAD_FOLDER     = Path(tempfile.gettempdir()) / "diet_uploads"
 
@@ -77,6 +78,41 @@ RESULT_TPL = STYLE + """
 {% endif %}
 """
 
+# ── GENERATION ────────────────────────────────────────────────────────────
+def _generate_sequential(jobs):
+    results = []
+    for payload, name_raw, pdf_path in jobs.values():
+        t0, status = time.time(), "OK"
+        try:
+            plan = generate_plan(payload)
+            if plan is None: raise RuntimeError("No plan")
+            create_pdf(plan, str(pdf_path))
+        except Exception as e:
+            status = f"FAILED ({e})"
+        results.append((name_raw, status, time.time() - t0))
+    return results
+
+
+def concurrency():
+    return int(env("PLAN_CONCURRENCY", "1"))
+
+
+async def _generate_concurrent(jobs, concurrency):
+    done  = {}
+    users = [(idx, payload) for idx, (payload, _, _) in jobs.items()]
+    async for idx, plan, err, elapsed in generate_plans_async(users, concurrency):
+        _, name_raw, pdf_path = jobs[idx]
+        status = "OK"
+        try:
+            if err is not None: raise err
+            if plan is None: raise RuntimeError("No plan")
+            await asyncio.to_thread(create_pdf, plan, str(pdf_path))
+        except Exception as e:
+            status = f"FAILED ({e})"
+        done[idx] = (name_raw, status, elapsed)
+    return [done[idx] for idx in jobs]
+
+
 # ── ROUTES ────────────────────────────────────────────────────────────────
 @app.route("/", methods=["GET"])
 def index():
@@ -93,6 +129,7 @@ def upload():
     save_path = UPLOAD_FOLDER / f"upload_{datetime.now():%Y%m%d_%H%M%S}.csv"
     file.save(save_path)
 
+    import pandas as pd                 # first upload pays for it, not startup
     df = pd.read_csv(save_path)
     if df.empty:
         flash("CSV appears to have no rows"); return redirect(url_for("index"))
@@ -105,31 +142,25 @@ def generate():
     csv_path = Path(request.form["csv_path"])
     selected = request.form.getlist("rows")
 
+    import pandas as pd
     df_all = pd.read_csv(csv_path)
     df = df_all if ("ALL" in selected or not selected) else df_all.loc[[int(i) for i in selected]]
 
     out_dir = OUT_ROOT / csv_path.stem
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    results, last_call = [], 0.0
+    jobs = {}
     for idx, row in df.iterrows():
         payload   = row_to_user(row)
         name_raw  = payload.get("Name of the employee", f"user_{idx}")
         safe_name = re.sub(r"[^A-Za-z0-9_\\-]+", "_", name_raw) or f"user_{idx}"
-        pdf_path  = out_dir / f"{safe_name}.pdf"
+        jobs[idx] = (payload, name_raw, out_dir / f"{safe_name}.pdf")
 
-        wait = SAFETY_DELAY - (time.time() - last_call)
-        if wait > 0: time.sleep(wait)
-
-        t0, status = time.time(), "OK"
-        try:
-            plan = generate_plan(payload)
-            if plan is None: raise RuntimeError("No plan")
-            create_pdf(plan, str(pdf_path))
-        except Exception as e:
-            status = f"FAILED ({e})"
-        results.append((name_raw, status, time.time() - t0))
-        last_call = time.time()
+    workers = concurrency()
+    if workers > 1:
+        results = asyncio.run(_generate_concurrent(jobs, workers))
+    else:
+        results = _generate_sequential(jobs)
 
     zip_path = OUT_ROOT / f"{out_dir.name}.zip"
     with ZipFile(zip_path, "w") as zf:
@@ -146,6 +177,11 @@ def download(zip_name):
        flash("File not found – regenerate first."); return redirect(url_for("index"))
     return send_file(str(zip_path), as_attachment=True)
 
+@app.route("/metrics")
+def metrics():
+    """Stage timings and counters in the Prometheus text format."""
+    return Response(prometheus_text(), mimetype="text/plain; version=0.0.4")
+
 
 # ── RUN ───────────────────────────────────────────────────────────────────
 if __name__ == "__main__":